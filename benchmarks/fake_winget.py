@@ -0,0 +1,197 @@
+"""Stand-in for winget that prints realistic output at a chosen size and speed.
+
+Run it in place of winget by setting wpm.runner.winget_command to [sys.executable, this file].
+It is configured through environment variables so every process started by wpm sees the same
+settings:
+
+    WPM_FAKE_ROWS            packages in the list/upgrade/search tables (default 200)
+    WPM_FAKE_LATENCY         seconds before the first byte, like winget's source update (default 0)
+    WPM_FAKE_NAME_LENGTH     longest package name, longer names are cut with an ellipsis (default 40)
+    WPM_FAKE_SPINNER         spinner redraws in front of a table (default 20)
+    WPM_FAKE_LANG            display language, en, de, fr or es (default en)
+    WPM_FAKE_VERSIONS        versions listed by show --versions (default 50)
+    WPM_FAKE_INSTALL_SECONDS duration of an install, upgrade or uninstall (default 0), upgrade --all
+                             takes it for every package with an update
+    WPM_FAKE_PROGRESS        progress bar redraws during an install (default 20)
+    WPM_FAKE_CPU             fraction of the install time spent busy instead of sleeping (default 0)
+    WPM_FAKE_SEED            seed of the generated package names (default 1)
+    WPM_FAKE_ASCII           1 for package names without non-ASCII characters (default 0)
+    WPM_FAKE_MSI_PACKAGES    comma-separated IDs that show reports as msi installers, the rest are exe
+"""
+import os
+import random
+import sys
+import time
+import unicodedata
+
+# Column headers, footer and package dependencies label per display language
+languages = {
+    'en': {'headers': ["Name", "Id", "Version", "Available", "Source"], 'match': "Match",
+           'upgrades': "{count} upgrades available.", 'version': "Version",
+           'dependencies': "Package Dependencies", 'installer': "Installer Type",
+           'not_found': "No installed package found matching input criteria.",
+           'done': "Successfully installed"},
+    'de': {'headers': ["Name", "ID", "Version", "Verfügbar", "Quelle"], 'match': "Übereinstimmung",
+           'upgrades': "{count} Aktualisierungen verfügbar.", 'version': "Version",
+           'dependencies': "Paketabhängigkeiten", 'installer': "Installertyp",
+           'not_found': "Es wurde kein installiertes Paket gefunden, das den Eingabekriterien entspricht.",
+           'done': "Erfolgreich installiert"},
+    'fr': {'headers': ["Nom", "ID", "Version", "Disponible", "Source"], 'match': "Correspondance",
+           'upgrades': "{count} mises à niveau disponibles.", 'version': "Version",
+           'dependencies': "Dépendances du package", 'installer': "Type du programme d'installation",
+           'not_found': "Aucun package installé ne correspond aux critères d'entrée.",
+           'done': "Installation réussie"},
+    'es': {'headers': ["Nombre", "Id", "Versión", "Disponible", "Origen"], 'match': "Coincidencia",
+           'upgrades': "{count} actualizaciones disponibles.", 'version': "Versión",
+           'dependencies': "Dependencias de paquetes", 'installer': "Tipo de instalador",
+           'not_found': "No se encontró ningún paquete instalado que coincida con los criterios de entrada.",
+           'done': "Instalado correctamente"},
+}
+
+# Exit code of winget list when no installed package matches (APPINSTALLER_CLI_ERROR_NO_APPLICATIONS_FOUND)
+no_packages_found = 0x8A150014
+
+# Building blocks of the generated package names, with some non-ASCII names like real catalogs have
+words = ["Microsoft", "Visual", "Studio", "Code", "Runtime", "Redistributable", "Desktop", "Python",
+         "Git", "Node", "Terminal", "PowerToys", "Teams", "Edge", "WebView2", "SDK", "Tools", "Server",
+         "Client", "Driver", "Update", "Assistant", "Manager", "Viewer", "Editor", "Player", "Studio",
+         "Übersetzer", "Résumé", "Ärzte", "日本語", "日本語入力ツール", "Проводник"]
+id_words = [word for word in words if word.isascii()]  # Package IDs are ASCII
+publishers = ["Microsoft", "Google", "Mozilla", "Adobe", "Oracle", "JetBrains", "Valve", "Zoom",
+              "Python", "Git", "OpenJS", "Docker", "VideoLAN", "7zip", "Notepad++", "GIMP"]
+
+# Characters of the spinner winget draws while it works
+spinner_frames = '-\\|/'
+
+# Function to read an integer or float setting from the environment
+def setting(name, default, kind=int):
+    return kind(os.environ.get(f'WPM_FAKE_{name}', default))
+
+# Function to generate the installed packages: name, ID, version, available version
+def generate_packages(count, name_length, seed, ascii_only=False):
+    rng = random.Random(seed)
+    name_words = id_words if ascii_only else words
+    packages = []
+    for index in range(count):
+        name = ' '.join(rng.choice(name_words) for _ in range(rng.randint(1, 8)))
+        if len(name) > name_length:
+            name = name[:name_length - 1] + '…'  # winget cuts long names the same way
+        publisher = rng.choice(publishers)
+        package_id = f"{publisher}.{rng.choice(id_words)}{index}"
+        version = '.'.join(str(rng.randint(0, 40)) for _ in range(rng.randint(2, 4)))
+        available = f"{version}.{rng.randint(1, 9)}" if rng.random() < 0.3 else ''
+        packages.append((name, package_id, version, available))
+    return packages
+
+# Function to print a spinner the way winget redraws it in place
+def spin(count):
+    for index in range(count):
+        sys.stdout.write(f"\r   {spinner_frames[index % 4]} ")
+    sys.stdout.write("\r                                                      \r")
+
+# Function to get the console columns a text takes, East Asian wide characters take two
+def display_width(text):
+    return sum(2 if unicodedata.east_asian_width(char) in ('W', 'F') else 1 for char in text)
+
+# Function to pad a value to a display width the way winget does
+def pad(value, width):
+    return value + ' ' * (width - display_width(value))
+
+# Function to print a fixed-width table with a header, a dash separator and padded columns
+def print_table(headers, rows):
+    widths = [max(display_width(header), *(display_width(row[index]) for row in rows)) + 1 if rows
+              else display_width(header) + 1 for index, header in enumerate(headers)]
+    print(''.join(pad(header, width) for header, width in zip(headers, widths)).rstrip())
+    print('-' * sum(widths))
+    for row in rows:
+        print(''.join(pad(value, width) for value, width in zip(row, widths)).rstrip())
+
+# Function to get the value following an option, None when it is missing
+def option(arguments, name):
+    if name in arguments:
+        index = arguments.index(name) + 1
+        return arguments[index] if index < len(arguments) else None
+    return None
+
+# Function to emulate an install, upgrade or uninstall with progress bars
+def run_action(text, package_id='fake'):
+    seconds = setting('INSTALL_SECONDS', 0, float)
+    steps = max(1, setting('PROGRESS', 20))
+    busy = setting('CPU', 0, float)
+    print(f"Found package [{package_id}]")
+    for step in range(steps + 1):
+        filled = step * 30 // steps
+        sys.stdout.write(f"\r  {'█' * filled}{'▒' * (30 - filled)}  {step * 5 // steps}.00 MB / 5.00 MB")
+        sys.stdout.flush()
+        end = time.perf_counter() + seconds * busy / steps
+        while time.perf_counter() < end:
+            pass  # Installer work that keeps a CPU busy
+        time.sleep(seconds * (1 - busy) / steps)
+    print()
+    print(text)
+
+def main(arguments):
+    text = languages.get(os.environ.get('WPM_FAKE_LANG', 'en'), languages['en'])
+    rows = setting('ROWS', 200)
+    packages = generate_packages(rows, max(4, setting('NAME_LENGTH', 40)), setting('SEED', 1),
+                                 bool(setting('ASCII', 0)))
+    time.sleep(setting('LATENCY', 0, float))
+    command = arguments[0] if arguments else ''
+    spinner = setting('SPINNER', 20)
+
+    if command == 'upgrade' and '--all' in arguments:
+        # One package after the other, like winget upgrade --all does
+        upgrades = [package_id for _, package_id, _, available in packages if available]
+        for index, package_id in enumerate(upgrades, 1):
+            sys.stdout.write(f"({index}/{len(upgrades)}) ")
+            run_action(text['done'], package_id)
+    elif command in ('upgrade', 'install', 'uninstall') and len(arguments) > 1:
+        run_action(text['done'])
+    elif command == 'upgrade':
+        spin(spinner)
+        upgrades = [(name, package_id, version, available, 'winget')
+                    for name, package_id, version, available in packages if available]
+        print_table(text['headers'], upgrades)
+        print(text['upgrades'].format(count=len(upgrades)))
+    elif command == 'list':
+        spin(spinner)
+        package_id = option(arguments, '--id')
+        listed = [(name, listed_id, version, available, 'winget')
+                  for name, listed_id, version, available in packages
+                  if package_id is None or listed_id.lower() == package_id.lower()]
+        if not listed:
+            print(text['not_found'])
+            return no_packages_found
+        print_table(text['headers'], listed)
+    elif command == 'search':
+        spin(spinner)
+        query = arguments[1].lower() if len(arguments) > 1 else ''
+        headers = text['headers'][:3] + [text['match'], text['headers'][4]]
+        found = [(name, package_id, version, f"Tag: {query}" if index % 3 == 0 else '', 'winget')
+                 for index, (name, package_id, version, _) in enumerate(packages)
+                 if query in name.lower() or query in package_id.lower()]
+        print_table(headers, found)
+    elif command == 'show':
+        package_id = option(arguments, '--id') or (arguments[1] if len(arguments) > 1 else '')
+        print(f"Found {package_id} [{package_id}]")
+        if '--versions' in arguments:
+            print(text['version'])
+            print('-' * 7)
+            for index in range(setting('VERSIONS', 50), 0, -1):
+                print(f"{index // 10}.{index % 10}.0")
+        else:
+            print("Version: 1.0.0")
+            print("Installer:")
+            msi_packages = os.environ.get('WPM_FAKE_MSI_PACKAGES', '').lower().split(',')
+            print(f"  {text['installer']}: {'msi' if package_id.lower() in msi_packages else 'exe'}")
+            print("  Dependencies:")
+            print(f"    {text['dependencies']}:")
+            print("      Microsoft.VCRedist.2015+.x64")
+    else:
+        print(f"Unrecognized command: {command}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.stdout.reconfigure(encoding='utf-8')
+    sys.exit(main(sys.argv[1:]))
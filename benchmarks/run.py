@@ -0,0 +1,499 @@
+"""Benchmarks of the parsing, table and subprocess code paths against the fake winget.
+
+Run from the repository root:
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json --compare before.json
+
+Every benchmark reports min, median, mean, p95 and max seconds over its repeats, benchmarks that
+need a display report {"skipped": reason} without one. --compare prints the change of the medians
+against an earlier result file and exits with 1 when a benchmark got slower than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import fake_winget
+from wpm import inventory, parsers, runner, scheduler, timing
+from wpm.parsers import OutputCleaner, parse_versions, parse_winget_table
+from wpm.tables import SearchIndex, SortCache, columns
+
+# Queries typed one character at a time, like the debounced search field sees them
+typed_queries = ['m', 'mi', 'mic', 'micr', 'micro', 'microsoft', 'microsoft.v', 'microsoft.visual']
+
+# Queries that do not extend the previous one and use the trigram index
+fresh_queries = ['python', 'runtime 2', 'webview', 'ärzte', 'zoom.', 'tools', 'driver']
+
+# Rows in the main table for the virtual table benchmarks
+virtual_table_sizes = (1000, 10000, 50000)
+
+# Modules timed by the startup benchmarks: the headless core and the GUI on top of it
+startup_modules = {'core': 'wpm.cli', 'gui': 'updateapps'}
+
+# Started in a fresh interpreter: prints the seconds the import took
+import_script = '''
+import sys, time
+start = time.perf_counter()
+__import__(sys.argv[1])
+print(time.perf_counter() - start)
+'''
+
+# Started in a fresh interpreter: opens the main window against the fake winget and prints the
+# seconds from the first import until Tk painted it, or "skipped: <reason>" without a display
+paint_script = '''
+import os, sys, time
+start = time.perf_counter()
+import tkinter as tk
+try:
+    tk.Tk().destroy()
+except tk.TclError as e:
+    print(f"skipped: {e}")
+    sys.exit(0)
+import updateapps
+from wpm import runner
+runner.winget_command = sys.argv[1:]
+
+def first_paint(window, *args):
+    window.update()
+    print(time.perf_counter() - start, flush=True)
+    os._exit(0)  # The job queue and the refresh are left running, the process ends here
+
+tk.Tk.mainloop = first_paint
+updateapps.main()
+'''
+
+# Column values the old whitespace parsers are checked on: name, ID and version
+checked_columns = 3
+
+# Function to parse a table the way get_available_updates did before the column parser: split on whitespace
+def split_reference_parse(output):
+    rows = []
+    header_skipped = False
+    for line in output.splitlines():
+        if not header_skipped:
+            header_skipped = "Name" in line and "ID" in line and "Version" in line
+            continue
+        if "----" in line or not line.strip():
+            continue
+        values = line.split()
+        if len(values) >= 5:
+            rows.append(values[:5])
+    return rows
+
+# Function to parse a table the way list_all_packages did before the column parser: a two-space regex
+def regex_reference_parse(output, pattern=re.compile(r"^(.+?)\s{2,}(.+?)\s{2,}(.+?)\s{2,}(.+)$")):
+    rows = []
+    header_skipped = False
+    for line in output.splitlines():
+        if not header_skipped:
+            header_skipped = "Name" in line and "ID" in line and "Version" in line
+            continue
+        if "----" in line or not line.strip():
+            continue
+        match = pattern.match(line)
+        if match:
+            rows.append([value.strip() for value in match.groups()])
+    return rows
+
+# Function to count the parsed rows whose name, ID and version match the generated packages
+def correct_rows(rows, expected):
+    return sum(1 for row, package in zip(rows, expected) if row[:checked_columns] == list(package[:checked_columns]))
+
+# Function to time a function over a number of repeats
+def measure(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return summarize(times)
+
+# Function to summarize run times in seconds
+def summarize(times):
+    return {'repeat': len(times), 'min': round(min(times), 6), 'median': round(statistics.median(times), 6),
+            'mean': round(statistics.fmean(times), 6), 'p95': round(timing.percentile(times, 95), 6),
+            'max': round(max(times), 6)}
+
+# Function to set the fake winget settings for this process and the processes it starts
+def configure(**settings):
+    for name, value in settings.items():
+        os.environ[f'WPM_FAKE_{name.upper()}'] = str(value)
+
+# Function to capture the output of one fake winget command
+def fake_output(*arguments):
+    result = subprocess.run(runner.process_command(['winget', *arguments]), stdout=subprocess.PIPE, check=False)
+    return result.stdout
+
+# Function to forget the display language detected by the parsers
+def reset_session():
+    parsers.session_rules = None
+    inventory.queries.invalidate()
+
+# Function to benchmark the table and version parsers on output in each display language
+def bench_parsers(args):
+    results = {}
+    for language in fake_winget.languages:
+        configure(rows=args.rows, lang=language)
+        for name, command in (('list', ['list']), ('upgrade', ['upgrade'])):
+            output = runner.decode_output(fake_output(*command))
+
+            def parse():
+                reset_session()
+                return parse_winget_table(output)
+
+            rows = parse()
+            results[f'parse_{name}_{language}'] = dict(measure(parse, args.repeat), rows=len(rows))
+        output = runner.decode_output(fake_output('show', '--id', 'Fake.Package', '--versions'))
+        results[f'parse_versions_{language}'] = dict(measure(lambda: parse_versions(output), args.repeat),
+                                                     rows=len(parse_versions(output)))
+
+    # A large table in German, the language the old parsers were written for, checked against the
+    # generated packages. Names with two spaces or wide characters broke the old parsers. The same
+    # table with ASCII-only names measures the rows that take the parser's fast path.
+    parsers_by_name = {'columns': lambda output: (reset_session(), parse_winget_table(output))[1],
+                       'split': split_reference_parse, 'regex': regex_reference_parse}
+    for suffix, ascii_only in (('', False), ('_ascii', True)):
+        configure(rows=args.parser_rows, lang='de', ascii=int(ascii_only))
+        packages = fake_winget.generate_packages(args.parser_rows, args.name_length, 1, ascii_only)
+        expected = {'list': packages, 'upgrade': [package for package in packages if package[3]]}
+        for name, command in (('list', ['list']), ('upgrade', ['upgrade'])):
+            output = runner.decode_output(fake_output(*command))
+            for parser_name, parse in parsers_by_name.items():
+                rows = parse(output)
+                results[f'parse_{name}_{args.parser_rows}{suffix}_{parser_name}'] = dict(
+                    measure(lambda: parse(output), args.repeat), rows=len(rows),
+                    correct=correct_rows(rows, expected[name]), expected=len(expected[name]))
+    configure(rows=args.rows, lang='en', ascii=0)
+    return results
+
+# Function to benchmark the incremental cleaning of spinner and progress bar output
+def bench_cleaner(args):
+    results = {}
+    configure(rows=args.rows)
+    for name, command in (('list', ['list']), ('install', ['install', '--id', 'Fake.Package'])):
+        data = fake_output(*command).decode('utf-8', errors='replace')
+        chunks = [data[index:index + 4096] for index in range(0, len(data), 4096)]
+
+        def clean():
+            cleaner = OutputCleaner()
+            for chunk in chunks:
+                cleaner.feed(chunk)
+            cleaner.flush()
+
+        results[f'clean_{name}'] = dict(measure(clean, args.repeat), bytes=len(data))
+    return results
+
+# Function to benchmark the inventory queries end to end, including the winget process
+def bench_inventory(args):
+    results = {}
+    configure(rows=args.rows)
+    for name, query in (('list_all_packages', inventory.list_all_packages),
+                        ('get_available_updates', inventory.get_available_updates)):
+        def run():
+            reset_session()
+            return query()
+
+        rows = run()
+        results[name] = dict(measure(run, args.repeat), rows=len(rows))
+    # Per-phase medians of the runs above (spawn, first_byte, exit, parse, resolve)
+    for kind, summary in timing.stats().items():
+        if kind in ('list', 'updates'):
+            results[f'phases_{kind}'] = {phase: values['p50'] for phase, values in summary['phases'].items()}
+    return results
+
+# Function to benchmark the search index and the sort orders of the main table
+def bench_table(args):
+    rows = [[name, package_id, version, available, 'winget'] for name, package_id, version, available
+            in fake_winget.generate_packages(args.table_rows, 40, 1)]
+    results = {}
+
+    def build():
+        index = SearchIndex(rows)
+        index.build_trigrams()
+        return index
+
+    results['search_index_build'] = dict(measure(build, args.repeat), rows=len(rows))
+    index = build()
+
+    def typing():
+        for query in typed_queries:
+            index.search(query)
+        index.search('')
+
+    def fresh():
+        for query in fresh_queries:
+            index.last_query = ''  # No narrowing from the previous query
+            index.search(query)
+
+    results['search_typing'] = dict(measure(typing, args.repeat), queries=len(typed_queries) + 1)
+    results['search_fresh'] = dict(measure(fresh, args.repeat), queries=len(fresh_queries))
+
+    def sort_cold():
+        cache = SortCache(rows, columns)
+        for col in columns:
+            cache.order(col)
+
+    cache = SortCache(rows, columns)
+    for col in columns:
+        cache.order(col)
+
+    def sort_cached():
+        for col in columns:
+            cache.order(col, reverse=True)
+
+    results['sort_cold'] = dict(measure(sort_cold, args.repeat), rows=len(rows), columns=len(columns))
+    results['sort_cached'] = dict(measure(sort_cached, args.repeat), rows=len(rows), columns=len(columns))
+    return results
+
+# Function to benchmark filling the main table and sorting it again with a real Treeview
+def bench_virtual_table(args):
+    import tkinter as tk
+    from tkinter import ttk
+    try:
+        window = tk.Tk()
+    except tk.TclError as e:
+        return {f'virtual_table_{kind}_{size}': {'skipped': str(e)}
+                for size in virtual_table_sizes for kind in ('startup', 'resort')}
+    import updateapps
+    window.withdraw()
+    tree = ttk.Treeview(window, columns=columns, show='headings', height=30)
+    scrollbar = ttk.Scrollbar(window, orient='vertical')
+    view = updateapps.VirtualTable(tree, scrollbar)
+    results = {}
+    try:
+        for size in virtual_table_sizes:
+            rows = [[name, package_id, version, available, 'winget'] for name, package_id, version, available
+                    in fake_winget.generate_packages(size, 40, 1)]
+            sort = None
+
+            def startup():
+                # What a refresh does with its result: the sort orders, the data and the first render
+                nonlocal sort
+                sort = SortCache(rows, columns)
+                view.set_rows(rows)
+                window.update_idletasks()
+
+            def resort():
+                # A click on every column header, each sorted the other way round
+                for col in columns:
+                    view.set_view(sort.order(col, reverse=True))
+                    window.update_idletasks()
+                    view.set_view(sort.order(col))
+                    window.update_idletasks()
+
+            results[f'virtual_table_startup_{size}'] = dict(measure(startup, args.repeat), rows=size)
+            results[f'virtual_table_resort_{size}'] = dict(measure(resort, args.repeat), rows=size,
+                                                           sorts=2 * len(columns))
+    finally:
+        window.destroy()
+    return results
+
+# Function to run a command the way the log did before streaming: capture everything, then clean it
+def capture_then_clean(command, on_output):
+    result = runner.run_process(command)
+    cleaner = OutputCleaner()
+    lines, _ = cleaner.feed(result.stdout)
+    lines += cleaner.flush()
+    on_output('\n'.join(lines) + '\n')
+
+# Function to get the seconds until run delivers its first output and the peak memory it allocates
+def first_output_and_peak(run, command, repeat):
+    firsts = []
+    for _ in range(repeat):
+        first = []
+        start = time.perf_counter()
+        run(command, lambda text: first or first.append(time.perf_counter() - start))
+        firsts.append(first[0])
+    # A separate run, tracing the allocations slows the process down
+    tracemalloc.start()
+    try:
+        run(command, lambda text: None)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return summarize(firsts), peak
+
+# Function to benchmark streaming through stream_command against capturing the output and cleaning it
+def bench_stream(args):
+    configure(install_seconds=0)
+    lines = []
+    run = lambda: runner.stream_command(['winget', 'install', '--id', 'Fake.Package'], lines.append, lambda _: None)
+    results = {'stream_install': dict(measure(run, args.repeat), progress_redraws=args.progress)}
+
+    # An install that takes a while and a long listing, the old path shows nothing until the process exits
+    paths = {'stream': lambda command, on_output: runner.stream_command(command, on_output),
+             'capture': capture_then_clean}
+    for name, command, settings in (('install', ['winget', 'install', '--id', 'Fake.Package'],
+                                      {'install_seconds': args.install_seconds}),
+                                     ('list', ['winget', 'list'], {'rows': args.table_rows})):
+        configure(**settings)
+        for path, function in paths.items():
+            first, peak = first_output_and_peak(function, command, args.repeat)
+            results[f'{path}_first_output_{name}'] = first
+            results[f'{path}_peak_memory_{name}'] = {'bytes': peak}
+    configure(install_seconds=0, rows=args.rows)
+    return results
+
+# Function to get the fake winget rows that list exactly count packages with an update
+def rows_with_upgrades(count):
+    rows = count
+    while sum(1 for package in fake_winget.generate_packages(rows, 40, 1) if package[3]) < count:
+        rows += 1
+    return rows
+
+# Function to benchmark upgrade batches: one at a time, in parallel and tuned to the load, and a
+# single winget upgrade --all over as many packages for reference
+def bench_batches(args):
+    results = {}
+    # One publisher per package, and the same number of packages from a single publisher, which
+    # conflict with each other no more than packages of different publishers do
+    jobs = [(f'Publisher{index}.Package', ['winget', 'upgrade', '--id', f'Publisher{index}.Package'])
+            for index in range(args.jobs)]
+    publisher_jobs = [(f'Microsoft.Package{index}', ['winget', 'upgrade', '--id', f'Microsoft.Package{index}'])
+                      for index in range(args.jobs)]
+    log = lambda text: None
+    for workload, cpu in (('sleeping', 0), ('busy', 1)):
+        configure(install_seconds=args.install_seconds, cpu=cpu)
+        for name, batch_jobs, concurrency, adaptive in (
+                ('sequential', jobs, 1, False), ('parallel', jobs, args.concurrency, False),
+                ('adaptive', jobs, args.concurrency, True),
+                ('one_publisher', publisher_jobs, args.concurrency, False)):
+            runner.cancel_event.clear()
+            batch, elapsed = scheduler.run_upgrade_batch(batch_jobs, concurrency, 600, 0, log, adaptive)
+            results[f'batch_{workload}_{name}'] = {
+                'seconds': round(elapsed, 3), 'jobs': len(jobs), 'concurrency': concurrency,
+                'jobs_per_minute': round(len(jobs) / elapsed * 60, 1) if elapsed else None,
+                'failed': sum(1 for row in batch if row[1] != "Updated")}
+        configure(rows=rows_with_upgrades(len(jobs)))
+        start = time.perf_counter()
+        returncode, _ = runner.stream_command(['winget', 'upgrade', '--all'], log)
+        elapsed = time.perf_counter() - start
+        results[f'batch_{workload}_upgrade_all'] = {
+            'seconds': round(elapsed, 3), 'jobs': len(jobs), 'concurrency': 1,
+            'jobs_per_minute': round(len(jobs) / elapsed * 60, 1) if elapsed else None,
+            'failed': len(jobs) if returncode else 0}
+        configure(rows=args.rows)
+    configure(install_seconds=0, cpu=0)
+    return results
+
+# Function to run a startup script in a fresh interpreter, returns its output
+def run_startup_script(script, *arguments, environment=None):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(fake_winget.__file__)))
+    result = subprocess.run([sys.executable, '-c', script, *arguments], cwd=root, env=environment,
+                            capture_output=True, text=True, check=False)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return result.stdout.strip()
+
+# Function to benchmark the import of the core and the GUI and the time to the first window paint
+def bench_startup(args):
+    results = {}
+    for name, module in startup_modules.items():
+        # Every repeat is a new interpreter, nothing is imported yet
+        times = [float(run_startup_script(import_script, module)) for _ in range(args.repeat)]
+        results[f'startup_import_{name}'] = summarize(times)
+    with tempfile.TemporaryDirectory() as data_dir:
+        # Settings, queue and logs of the window go to a throwaway folder instead of the user's
+        environment = dict(os.environ, LOCALAPPDATA=data_dir)
+        times = []
+        for _ in range(args.repeat):
+            output = run_startup_script(paint_script, *runner.winget_command, environment=environment)
+            if output.startswith('skipped'):
+                results['startup_first_paint'] = {'skipped': output.partition(': ')[2]}
+                return results
+            times.append(float(output))
+    results['startup_first_paint'] = summarize(times)
+    return results
+
+# Benchmark groups by name, in the order they run
+groups = {'startup': bench_startup, 'parsers': bench_parsers, 'cleaner': bench_cleaner,
+          'inventory': bench_inventory, 'table': bench_table, 'virtual_table': bench_virtual_table,
+          'stream': bench_stream, 'batches': bench_batches}
+
+# Function to get the commit the benchmarks ran on, '' outside a git checkout
+def current_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=False)
+    except OSError:
+        return ''
+    return result.stdout.strip()
+
+# Function to print the median changes against an earlier result file, returns the regressions
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)['benchmarks']
+    regressions = []
+    print(f"{'Benchmark':<36}{'Before':>12}{'After':>12}{'Change':>10}")
+    for name, result in results.items():
+        before = baseline.get(name, {})
+        key = 'median' if 'median' in result else 'seconds'
+        if key not in result or not before.get(key):
+            continue
+        change = result[key] / before[key] - 1
+        print(f"{name:<36}{before[key]:>12.6f}{result[key]:>12.6f}{change:>+10.1%}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+# Function to build the argument parser
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description=__doc__.split('\n')[0])
+    parser.add_argument('--only', action='append', choices=list(groups), help="Run only these groups")
+    parser.add_argument('--repeat', type=int, default=20, help="Repeats per benchmark (default: 20)")
+    parser.add_argument('--rows', type=int, default=500, help="Packages printed by the fake winget (default: 500)")
+    parser.add_argument('--parser-rows', type=int, default=10000,
+                        help="Rows parsed by the old and the column parsers (default: 10000)")
+    parser.add_argument('--table-rows', type=int, default=20000, help="Rows in the table benchmarks (default: 20000)")
+    parser.add_argument('--latency', type=float, default=0, help="Seconds before the fake winget answers (default: 0)")
+    parser.add_argument('--spinner', type=int, default=20, help="Spinner redraws in front of a table (default: 20)")
+    parser.add_argument('--name-length', type=int, default=40, help="Longest package name (default: 40)")
+    parser.add_argument('--progress', type=int, default=200, help="Progress bar redraws per install (default: 200)")
+    parser.add_argument('--jobs', type=int, default=16, help="Packages per upgrade batch (default: 16)")
+    parser.add_argument('--concurrency', type=int, default=4, help="Parallel upgrades in a batch (default: 4)")
+    parser.add_argument('--install-seconds', type=float, default=0.5, help="Duration of one upgrade (default: 0.5)")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--compare', metavar='FILE', help="Compare the medians with an earlier --output file")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Slowdown reported as a regression by --compare (default: 0.1)")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    runner.winget_command = [sys.executable, fake_winget.__file__]
+    configure(latency=args.latency, spinner=args.spinner, name_length=args.name_length, progress=args.progress,
+              lang='en')
+
+    results = {}
+    for name, bench in groups.items():
+        if args.only and name not in args.only:
+            continue
+        print(f"Running {name} benchmarks...", file=sys.stderr)
+        results.update(bench(args))
+
+    report = {'commit': current_commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'python': platform.python_version(), 'platform': platform.platform(),
+              'settings': {name: value for name, value in vars(args).items() if name not in ('output', 'compare')},
+              'benchmarks': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"Slower than {args.threshold:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    elif not args.output:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,26 @@
+"""Shared fixtures: every test runs wpm against benchmarks/fake_winget.py instead of winget."""
+import sys
+
+import pytest
+
+from benchmarks import fake_winget as fake_winget_module
+from wpm import inventory, parsers, runner
+
+@pytest.fixture
+def fake_winget(monkeypatch):
+    """Run winget commands through the fake winget, returns a function that changes its settings."""
+    monkeypatch.setattr(runner, 'winget_command', [sys.executable, fake_winget_module.__file__])
+    monkeypatch.setattr(runner, 'command_log', None)
+    monkeypatch.setattr(parsers, 'session_rules', None)
+    inventory.queries.invalidate()
+    runner.cancel_event.clear()
+
+    def configure(**settings):
+        for name, value in settings.items():
+            monkeypatch.setenv(f'WPM_FAKE_{name.upper()}', str(value))
+
+    configure(rows=20, latency=0, spinner=5, progress=5, install_seconds=0, cpu=0, lang='en')
+    yield configure
+    runner.cancel_running_processes()
+    runner.cancel_event.clear()
+    inventory.queries.invalidate()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from wpm.catalog import LocalCatalog, read_manifest_fields
+
+fixtures = os.path.join(os.path.dirname(__file__), 'fixtures', 'catalog')
+
+@pytest.fixture
+def catalog(tmp_path):
+    return LocalCatalog(str(tmp_path / 'catalog.db'))
+
+@pytest.fixture
+def manifests(tmp_path):
+    """A copy of the manifest tree the tests can change."""
+    root = tmp_path / 'manifests'
+    shutil.copytree(os.path.join(fixtures, 'manifests'), root)
+    return root
+
+# Function to read the catalog rows as {ID: (name, moniker, version, tags, commands)}
+def packages(catalog):
+    conn = sqlite3.connect(catalog.path)
+    try:
+        return {row[0]: row[1:] for row in conn.execute("SELECT id, name, moniker, version, tags, commands FROM packages")}
+    finally:
+        conn.close()
+
+def test_read_manifest_fields():
+    fields = read_manifest_fields(os.path.join(fixtures, 'manifests', 'm', 'Mozilla', 'Firefox', '121.0',
+                                               'Mozilla.Firefox.yaml'))
+    assert fields == {'PackageIdentifier': 'Mozilla.Firefox', 'PackageVersion': '121.0',
+                      'PackageName': 'Mozilla Firefox', 'Moniker': 'firefox', 'Tags': ['browser', 'web'],
+                      'Commands': ['firefox']}
+
+def test_import_index_v1_keeps_the_latest_version(catalog):
+    summary = catalog.import_index(os.path.join(fixtures, 'index_v1.db'))
+    assert summary == "Local catalog: 4 packages, 4 updated, 0 removed"
+    rows = packages(catalog)
+    assert rows['Git.Git'] == ('Git', 'git', '2.10.1', 'vcs\ngit', 'git')
+    assert rows['Notepad++.Notepad++'] == ('Notepad++', '', '8.6', 'editor', '')
+
+def test_import_index_v2_replaces_v1(catalog):
+    catalog.import_index(os.path.join(fixtures, 'index_v1.db'))
+    summary = catalog.import_index(os.path.join(fixtures, 'index_v2.db'))
+    assert summary == "Local catalog: 3 packages, 3 updated, 2 removed"
+    rows = packages(catalog)
+    assert sorted(rows) == ['Git.Git', 'Microsoft.VisualStudioCode', 'Mozilla.Firefox']
+    assert rows['Git.Git'] == ('Git', 'git', '2.11.0', '', '')
+    assert rows['Mozilla.Firefox'][1] == ''
+    # Removed packages are gone from the search index too
+    assert catalog.search('notepad') == []
+
+def test_import_index_twice_changes_nothing(catalog):
+    catalog.import_index(os.path.join(fixtures, 'index_v2.db'))
+    assert catalog.import_index(os.path.join(fixtures, 'index_v2.db')) == \
+        "Local catalog: 3 packages, 0 updated, 0 removed"
+
+def test_import_manifests_merges_the_latest_version(catalog, manifests):
+    assert catalog.import_manifests(str(manifests)) == "Local catalog: 2 packages updated from 2 changed manifests"
+    rows = packages(catalog)
+    # The en-US locale wins over de-DE, and only files of the latest version count
+    assert rows['Microsoft.PowerToys'] == ('PowerToys (Preview)', 'powertoys', '0.76.0', 'utilities\nfancyzones', '')
+    assert rows['Mozilla.Firefox'] == ('Mozilla Firefox', 'firefox', '121.0', 'browser\nweb', 'firefox')
+
+def test_import_manifests_skips_unchanged_files(catalog, manifests):
+    catalog.import_manifests(str(manifests))
+    assert catalog.import_manifests(str(manifests)) == "Local catalog: 0 packages updated from 0 changed manifests"
+
+def test_import_manifests_picks_up_a_changed_file(catalog, manifests):
+    catalog.import_manifests(str(manifests))
+    path = manifests / 'm' / 'Mozilla' / 'Firefox' / '121.0' / 'Mozilla.Firefox.yaml'
+    path.write_text(path.read_text(encoding='utf-8').replace('- web', '- internet'), encoding='utf-8')
+    assert catalog.import_manifests(str(manifests)) == "Local catalog: 1 packages updated from 1 changed manifests"
+    assert packages(catalog)['Mozilla.Firefox'][3] == 'browser\ninternet'
+    assert [row[1] for row in catalog.search('internet')] == ['Mozilla.Firefox']
+
+def test_import_manifests_falls_back_when_a_version_is_deleted(catalog, manifests):
+    catalog.import_manifests(str(manifests))
+    shutil.rmtree(manifests / 'm' / 'Microsoft' / 'PowerToys' / '0.76.0')
+    catalog.import_manifests(str(manifests))
+    assert packages(catalog)['Microsoft.PowerToys'][:3] == ('PowerToys', 'powertoys', '0.75.0')
+
+def test_import_manifests_removes_a_deleted_package(catalog, manifests):
+    catalog.import_manifests(str(manifests))
+    shutil.rmtree(manifests / 'm' / 'Mozilla')
+    catalog.import_manifests(str(manifests))
+    assert sorted(packages(catalog)) == ['Microsoft.PowerToys']
+    assert catalog.search('firefox') == []
+
+def test_search_ranks_exact_before_substring_matches(catalog):
+    catalog.import_index(os.path.join(fixtures, 'index_v1.db'))
+    # Git is named git, GitHub CLI only has git as a tag and inside its ID, an exact tag ranks higher
+    assert [row[1] for row in catalog.search('git')] == ['Git.Git', 'GitHub.cli']
+    assert [row[1] for row in catalog.search('code')] == ['Microsoft.VisualStudioCode']
+
+def test_search_match_column(catalog):
+    catalog.import_index(os.path.join(fixtures, 'index_v1.db'))
+    matches = {row[1]: row[3] for row in catalog.search('git')}
+    # Matches on the ID or the name leave the Match column empty, like winget
+    assert matches == {'Git.Git': '', 'GitHub.cli': 'Tag: git'}
+    assert catalog.search('vscode') == [['Microsoft Visual Studio Code', 'Microsoft.VisualStudioCode', '1.85.0',
+                                         'Moniker: vscode', 'winget']]
+    assert catalog.search('editor')[0][3] == 'Tag: editor'
+
+def test_short_queries_use_like(catalog):
+    catalog.import_index(os.path.join(fixtures, 'index_v1.db'))
+    # Two characters are too short for the trigram index
+    assert catalog.search('gh') == [['GitHub CLI', 'GitHub.cli', '2.40.0', 'Moniker: gh', 'winget']]
+    assert catalog.search('') == []
+
+def test_search_limit(catalog):
+    catalog.import_index(os.path.join(fixtures, 'index_v1.db'))
+    assert len(catalog.search('t', limit=2)) == 2
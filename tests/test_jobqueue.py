@@ -0,0 +1,50 @@
+import time
+
+from wpm import runner
+from wpm.jobqueue import JobQueue
+from wpm.settings import Settings
+
+def test_active_packages(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.json'), Settings(), lambda text: None)
+    first = queue.add('upgrade', 'Alpha.Tool')
+    queue.add('install', 'Beta.Tool')
+    assert queue.add('upgrade', 'Alpha.Tool') is None  # Already queued
+    queue.cancel(first['id'])
+    assert queue.active_packages() == {'beta.tool'}
+
+# Function to wait until every job of a queue has finished
+def wait_for_jobs(queue, seconds=30):
+    deadline = time.monotonic() + seconds
+    while any(job['state'] in ('queued', 'running') for job in queue.snapshot()) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+def test_busy_group_does_not_hold_a_slot(fake_winget, tmp_path):
+    fake_winget(install_seconds=1, msi_packages='Alpha.One,Alpha.Two')
+    queue = JobQueue(str(tmp_path / 'jobs.json'), Settings(concurrency=2, adaptive_concurrency=False, retries=0),
+                     lambda text: None)
+    for package_id in ('Alpha.One', 'Alpha.Two', 'Beta.Three'):
+        queue.add('upgrade', package_id)
+    queue.start()
+    try:
+        wait_for_jobs(queue)
+    finally:
+        queue.stop()
+    jobs = {job['package']: job for job in queue.snapshot()}
+    assert [job['state'] for job in jobs.values()] == ['done'] * 3
+    first, second = sorted((jobs['Alpha.One'], jobs['Alpha.Two']), key=lambda job: job['started'])
+    assert second['started'] >= first['finished']
+    # Beta.Three starts next to the first one instead of waiting behind the second for the installer lock
+    assert jobs['Beta.Three']['started'] < first['finished']
+
+def test_jobs_fail_without_winget(fake_winget, monkeypatch, tmp_path):
+    monkeypatch.setattr(runner, 'winget_command', ['/nonexistent/winget'])
+    queue = JobQueue(str(tmp_path / 'jobs.json'), Settings(retries=0), lambda text: None)
+    queue.add('upgrade', 'Alpha.One')
+    queue.add('install', 'Beta.Two')
+    queue.start()
+    try:
+        wait_for_jobs(queue)
+    finally:
+        queue.stop()
+    assert [job['state'] for job in queue.snapshot()] == ['failed', 'failed']
+    assert queue.running == 0
@@ -0,0 +1,120 @@
+import os
+
+import pytest
+
+from wpm import parsers, runner
+from wpm.parsers import detect_rules, parse_dependencies, parse_installer_type, parse_versions, parse_winget_table
+
+# winget output in several display languages and winget versions, named <language>-<version>-<command>.txt
+fixtures = os.path.join(os.path.dirname(__file__), 'fixtures', 'output')
+
+# Function to read a fixture the way run_process decodes winget's output
+def output(name):
+    with open(os.path.join(fixtures, name), 'rb') as fixture:
+        return runner.decode_output(fixture.read())
+
+@pytest.fixture(autouse=True)
+def new_session(monkeypatch):
+    monkeypatch.setattr(parsers, 'session_rules', None)
+
+@pytest.mark.parametrize('header, language', [
+    ("Name  Id  Version  Available  Source", 'en'),
+    ("Name  Id  Version  Source", 'en'),
+    ("Name  Id  Version  Match  Source", 'en'),
+    ("Name  ID  Version  Verfügbar  Quelle", 'de'),
+    ("Name  ID  Version  Übereinstimmung  Quelle", 'de'),
+    ("Nom  ID  Version  Disponible  Source", 'fr'),
+    ("Nom  ID  Version  Source", 'fr'),
+    ("Nombre  Id  Versión  Disponible  Origen", 'es'),
+    ("Nombre  Id  Versión  Origen", 'es'),
+    ("Nome  ID  Versione  Disponibile  Origine", 'generic'),
+])
+def test_detect_rules(header, language):
+    assert detect_rules(header).language == language
+
+@pytest.mark.parametrize('name, language, ids', [
+    ('en-1.6-upgrade.txt', 'en', ['Git.Git', 'Microsoft.VisualStudioCode', 'Microsoft.PowerToys', '7zip.7zip',
+                                  'Contoso.JapaneseIME', 'Mozilla.Firefox']),
+    ('en-1.2-upgrade.txt', 'en', ['Git.Git', 'Microsoft.VisualStudioCode', 'Microsoft.PowerToys']),
+    ('de-1.6-upgrade.txt', 'de', ['Git.Git', 'Microsoft.VisualStudioCode', 'Microsoft.PowerToys', '7zip.7zip']),
+    ('fr-1.6-upgrade.txt', 'fr', ['Git.Git', 'Microsoft.VisualStudioCode', 'Microsoft.PowerToys']),
+    ('it-1.6-upgrade.txt', 'generic', ['Git.Git', 'Microsoft.VisualStudioCode']),
+])
+def test_upgrade_tables_without_footers(name, language, ids):
+    rows = parse_winget_table(output(name))
+    assert parsers.session_rules.language == language
+    # Footers and the header of the pinned packages table never become rows
+    assert [row[1] for row in rows] == ids
+    assert all(len(row) == 5 and row[4] == 'winget' for row in rows)
+
+def test_upgrade_table_values():
+    rows = parse_winget_table(output('en-1.6-upgrade.txt'))
+    assert rows[1] == ['Microsoft Visual Studio Code (User)', 'Microsoft.VisualStudioCode', '1.84.2', '1.85.1',
+                       'winget']
+    # East Asian wide characters take two columns
+    assert rows[4] == ['日本語入力 Tool', 'Contoso.JapaneseIME', '1.0', '1.1', 'winget']
+
+def test_rows_with_redraws_and_wide_names():
+    lines = ["Name         Id            Version  Source",
+             "------------------------------------------",
+             "Long name, …  Contoso.Long  1.0      winget",
+             "   - \r   \\ \rGit          Git.Git       2.42.0   winget",
+             "日本語 Tool  Contoso.Wide  1.0      winget",
+             "日本語 Too\x07l Contoso.Odd   1.0      winget",  # The wide name pushes the ID off its column
+             "Short        Contoso.Short 2.0"]
+    rows = parse_winget_table('\r\n'.join(lines))
+    assert rows == [['Long name, …', 'Contoso.Long', '1.0', 'winget'],
+                    ['Git', 'Git.Git', '2.42.0', 'winget'],
+                    ['日本語 Tool', 'Contoso.Wide', '1.0', 'winget'],
+                    ['Short', 'Contoso.Short', '2.0', '']]
+
+def test_list_table_with_empty_cells():
+    rows = parse_winget_table(output('es-1.6-list.txt'))
+    assert parsers.session_rules.language == 'es'
+    assert rows == [['Git', 'Git.Git', '2.42.0', '2.43.0', 'winget'],
+                    ['Microsoft Edge', 'Microsoft.Edge', '120.0.2210.91', '', 'winget'],
+                    ['Paquete sin origen', 'ARP\\Machine\\X64\\Sin origen', '1.0', '', '']]
+
+def test_search_table_match_column():
+    rows = parse_winget_table(output('de-1.6-search.txt'))
+    assert [row[3] for row in rows] == ['', 'Tag: git', 'Moniker: gitextensions']
+
+@pytest.mark.parametrize('name', ['en-1.6-list-not-found.txt', 'es-1.6-list-not-found.txt'])
+def test_no_packages_found(name):
+    assert parse_winget_table(output(name)) == []
+
+@pytest.mark.parametrize('rules_from, line', [
+    ('en-1.6-upgrade.txt', "12 upgrades available."),
+    ('en-1.6-upgrade.txt', "1 upgrade available."),
+    ('en-1.6-upgrade.txt', "2 package(s) have version numbers that cannot be determined."),
+    ('en-1.6-upgrade.txt', "The following packages have an upgrade available, but require explicit targeting"),
+    ('de-1.6-upgrade.txt', "4 Aktualisierungen verfügbar."),
+    ('de-1.6-upgrade.txt', "1 Paket(e) verfügt über Versionsnummern, die nicht ermittelt werden können."),
+    ('fr-1.6-upgrade.txt', "3 mises à niveau disponibles."),
+    ('es-1.6-list.txt', "2 actualizaciones disponibles."),
+    ('es-1.6-list.txt', "No se encontró ningún paquete instalado que coincida con los criterios de entrada."),
+])
+def test_footers(rules_from, line):
+    parse_winget_table(output(rules_from))
+    assert parsers.session_rules.is_footer(line)
+    assert not parsers.session_rules.is_footer("Git  Git.Git  2.42.0  2.43.0  winget")
+
+@pytest.mark.parametrize('name', ['en-1.6-show-versions.txt', 'de-1.6-show-versions.txt', 'fr-1.6-show-versions.txt',
+                                  'es-1.6-show-versions.txt', 'en-1.2-show-versions.txt'])
+def test_parse_versions(name):
+    assert parse_versions(output(name)) == ['2.43.0', '2.42.0.2', '2.42.0', '2.41.0.3']
+
+def test_parse_versions_without_a_list():
+    assert parse_versions(output('en-1.6-list-not-found.txt')) == []
+
+@pytest.mark.parametrize('label', ["Installer Type", "Installertyp", "Type du programme d'installation",
+                                   "Tipo de instalador"])
+def test_parse_installer_type(label):
+    assert parse_installer_type(f"Version: 1.0\nInstaller:\n  {label}: msi\n  Installer Url: https://x\n") == 'msi'
+
+@pytest.mark.parametrize('label', ["Package Dependencies", "Paketabhängigkeiten", "Dépendances du package",
+                                   "Dependencias de paquetes"])
+def test_parse_dependencies(label):
+    show = (f"Installer:\n  Dependencies:\n    {label}:\n      Microsoft.VCRedist.2015+.x64\n"
+            "      Microsoft.DotNet.Runtime.8 [>= 8.0.0]\n  Offline Distribution Supported: true\n")
+    assert parse_dependencies(show) == ['Microsoft.VCRedist.2015+.x64', 'Microsoft.DotNet.Runtime.8']
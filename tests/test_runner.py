@@ -0,0 +1,67 @@
+import subprocess
+import threading
+import time
+
+import pytest
+
+from wpm import runner
+
+def test_run_process_captures_output(fake_winget):
+    result = runner.run_process(['winget', 'show', '--id', 'Fake.Package'])
+    assert result.returncode == 0
+    assert "Found Fake.Package [Fake.Package]" in result.stdout
+    assert result.stderr == ''
+    assert not runner.running_processes
+
+def test_run_process_returns_the_exit_code(fake_winget):
+    result = runner.run_process(['winget', 'bogus'])
+    assert result.returncode == 1
+    assert "Unrecognized command: bogus" in result.stdout
+
+def test_process_command_only_replaces_winget(fake_winget):
+    assert runner.process_command(['winget', 'list'])[1:] == [runner.winget_command[1], 'list']
+    assert runner.process_command(['git', 'status']) == ['git', 'status']
+
+def test_stream_command_hands_out_clean_lines_and_status(fake_winget):
+    output, status = [], []
+    returncode, stderr = runner.stream_command(['winget', 'install', '--id', 'Fake.Package'], output.append,
+                                               status.append, prefix='[Fake.Package] ')
+    assert (returncode, stderr) == (0, '')
+    lines = ''.join(output).splitlines()
+    assert lines == ['[Fake.Package] Found package [fake]', '[Fake.Package] Successfully installed']
+    # The progress bar redraws go to the status line, never to the log
+    assert any('5.00 MB / 5.00 MB' in line for line in status)
+
+def test_stream_command_drops_the_spinner_in_front_of_a_table(fake_winget):
+    output = []
+    runner.stream_command(['winget', 'list'], output.append)
+    lines = ''.join(output).splitlines()
+    assert lines[0].startswith('Name')
+    assert len(lines) == 21  # The header and the packages
+
+def test_stream_command_times_out(fake_winget):
+    fake_winget(install_seconds=30)
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        runner.stream_command(['winget', 'install', '--id', 'Fake.Package'], lambda text: None, timeout=0.5)
+    assert time.monotonic() - start < 10
+    assert not runner.running_processes
+
+def test_cancel_stops_a_streamed_command(fake_winget):
+    fake_winget(install_seconds=30)
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(returncode=runner.stream_command(
+        ['winget', 'install', '--id', 'Fake.Package'], lambda text: None)[0]))
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not runner.running_processes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert runner.cancel_running_processes() == 1
+    thread.join(10)
+    assert not thread.is_alive()
+    assert result['returncode'] != 0
+    assert runner.cancel_event.is_set()
+    assert not runner.running_processes
+
+def test_cancel_without_running_commands(fake_winget):
+    assert runner.cancel_running_processes() == 0
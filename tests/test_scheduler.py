@@ -0,0 +1,134 @@
+import threading
+import time
+
+from wpm import runner, scheduler
+from wpm.jobqueue import JobQueue
+from wpm.scheduler import ConflictGroups, conflict_group
+from wpm.settings import Settings
+
+def test_conflict_group():
+    # A publisher alone is no conflict
+    assert conflict_group('Microsoft.PowerToys') != conflict_group('Microsoft.Edge')
+    assert conflict_group('Git.Git', 'exe') == 'git.git'
+    # Known conflicts share a group
+    assert conflict_group('Microsoft.VisualStudio.2022.Community') == \
+        conflict_group('Microsoft.VisualStudio.2022.BuildTools') == 'visual-studio-installer'
+    assert conflict_group('Microsoft.VisualStudioCode') == 'microsoft.visualstudiocode'
+    # Windows Installer packages share one group whatever their publisher
+    assert conflict_group('Git.Git', 'msi') == conflict_group('Oracle.JavaRuntime', 'wix') == \
+        conflict_group('Microsoft.PowerToys', 'burn') == 'windows-installer'
+
+def test_conflict_groups_look_up_the_installer(fake_winget):
+    fake_winget(msi_packages='Alpha.Tool,Beta.Tool')
+    groups = ConflictGroups()
+    assert groups.lock_for('Alpha.Tool') is groups.lock_for('Beta.Tool')
+    assert groups.lock_for('Gamma.App') is not groups.lock_for('Delta.App')
+    assert groups.lock_for('Gamma.App') is not groups.lock_for('Gamma.Other')
+    assert groups.lock_for('Gamma.App') is groups.lock_for('gamma.app')
+    assert groups.lock_for('Alpha.Tool') is not groups.lock_for('Alpha.Other')
+
+def test_conflict_groups_share_the_windows_installer_lock(fake_winget):
+    fake_winget(msi_packages='Alpha.Tool,Beta.Tool')
+    assert ConflictGroups().lock_for('Alpha.Tool') is ConflictGroups().lock_for('Beta.Tool') is \
+        scheduler.windows_installer_lock
+
+def test_conflict_groups_without_detection(fake_winget):
+    fake_winget(msi_packages='Alpha.Tool,Beta.Tool')
+    groups = ConflictGroups(detect_installers=False)
+    assert groups.lock_for('Alpha.Tool') is not groups.lock_for('Beta.Tool')
+
+# Function to record when each upgrade of the scheduler runs, returns {package ID: (start, end)}
+def trace_upgrades(monkeypatch):
+    intervals = {}
+
+    def timed_stream_command(command, *args, **kwargs):
+        start = time.monotonic()
+        try:
+            return runner.stream_command(command, *args, **kwargs)
+        finally:
+            intervals[command[command.index('--id') + 1]] = (start, time.monotonic())
+
+    monkeypatch.setattr(scheduler, 'stream_command', timed_stream_command)
+    return intervals
+
+# Function to upgrade packages through the fake winget, returns the result rows and when each upgrade ran
+def upgrade(package_ids, concurrency, monkeypatch, adaptive=False):
+    intervals = trace_upgrades(monkeypatch)
+    jobs = [(package_id, ['winget', 'upgrade', '--id', package_id]) for package_id in package_ids]
+    rows, _ = scheduler.run_upgrade_batch(jobs, concurrency, 60, 0, lambda text: None, adaptive)
+    return rows, intervals
+
+# Function to check whether two (start, end) intervals overlap
+def overlap(first, second):
+    return first[0] < second[1] and second[0] < first[1]
+
+def test_batch_runs_msi_packages_one_at_a_time(fake_winget, monkeypatch):
+    fake_winget(install_seconds=0.5, msi_packages='Alpha.Tool,Beta.Tool')
+    packages = ['Alpha.Tool', 'Beta.Tool', 'Gamma.App', 'Delta.App']
+    rows, intervals = upgrade(packages, 4, monkeypatch)
+    assert [row[1] for row in rows] == ["Updated"] * 4
+    assert not overlap(intervals['Alpha.Tool'], intervals['Beta.Tool'])
+    # Packages of other publishers run next to them
+    assert overlap(intervals['Gamma.App'], intervals['Delta.App'])
+
+def test_adaptive_batch_runs_msi_packages_one_at_a_time(fake_winget, monkeypatch):
+    fake_winget(install_seconds=0.5, msi_packages='Alpha.Tool,Beta.Tool')
+    rows, intervals = upgrade(['Alpha.Tool', 'Beta.Tool', 'Gamma.App', 'Delta.App'], 4, monkeypatch, adaptive=True)
+    assert [row[1] for row in rows] == ["Updated"] * 4
+    assert not overlap(intervals['Alpha.Tool'], intervals['Beta.Tool'])
+
+def test_batch_and_queue_share_the_windows_installer_lock(fake_winget, monkeypatch, tmp_path):
+    fake_winget(install_seconds=0.5, msi_packages='Alpha.Tool,Beta.Tool')
+    intervals = trace_upgrades(monkeypatch)
+    settings = Settings(concurrency=2, adaptive_concurrency=False, retries=0)
+    queue = JobQueue(str(tmp_path / 'jobs.json'), settings, lambda text: None)
+    queue.add('upgrade', 'Beta.Tool')
+    queue.start()
+    try:
+        jobs = [('Alpha.Tool', ['winget', 'upgrade', '--id', 'Alpha.Tool'])]
+        rows, _ = scheduler.run_upgrade_batch(jobs, 2, 60, 0, lambda text: None)
+        deadline = time.monotonic() + 30
+        while queue.snapshot()[0]['state'] in ('queued', 'running') and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        queue.stop()
+    assert rows[0][1] == "Updated"
+    assert queue.snapshot()[0]['state'] == 'done'
+    assert not overlap(intervals['Alpha.Tool'], intervals['Beta.Tool'])
+
+def test_batch_runs_other_publishers_in_parallel(fake_winget, monkeypatch):
+    fake_winget(install_seconds=0.5)
+    rows, intervals = upgrade(['Alpha.Tool', 'Beta.Tool'], 2, monkeypatch)
+    assert [row[1] for row in rows] == ["Updated"] * 2
+    assert overlap(intervals['Alpha.Tool'], intervals['Beta.Tool'])
+
+def test_batch_runs_packages_of_one_publisher_in_parallel(fake_winget, monkeypatch):
+    fake_winget(install_seconds=0.5)
+    rows, intervals = upgrade(['Alpha.Tool', 'Alpha.Other'], 2, monkeypatch)
+    assert overlap(intervals['Alpha.Tool'], intervals['Alpha.Other'])
+
+def test_batch_runs_known_conflicts_one_at_a_time(fake_winget, monkeypatch):
+    fake_winget(install_seconds=0.2)
+    packages = ['Microsoft.VisualStudio.2022.Community', 'Microsoft.VisualStudio.2022.BuildTools']
+    rows, intervals = upgrade(packages, 2, monkeypatch)
+    assert not overlap(intervals[packages[0]], intervals[packages[1]])
+
+def test_batch_reports_failures_without_winget(fake_winget, monkeypatch):
+    monkeypatch.setattr(runner, 'winget_command', ['/nonexistent/winget'])
+    rows, _ = upgrade(['Alpha.Tool', 'Beta.Tool'], 2, monkeypatch)
+    assert [row[1] for row in rows] == ["Failed", "Failed"]
+
+def test_job_reports_progress_redraws(fake_winget):
+    fake_winget(progress=5)
+    lines, status = [], []
+    row = scheduler.run_upgrade_job('Alpha.Tool', ['winget', 'upgrade', '--id', 'Alpha.Tool'], 60, 0,
+                                    threading.Lock(), lines.append, on_status=status.append)
+    assert row[1] == "Updated"
+    assert not any('MB' in line for line in ''.join(lines).splitlines())  # Redraws stay out of the log
+    assert "[Alpha.Tool] ██████████████████████████████  5.00 MB / 5.00 MB" in status
+
+def test_batch_reports_progress_redraws(fake_winget):
+    status = []
+    jobs = [(package_id, ['winget', 'upgrade', '--id', package_id]) for package_id in ('Alpha.Tool', 'Beta.Tool')]
+    scheduler.run_upgrade_batch(jobs, 2, 60, 0, lambda text: None, on_status=status.append)
+    assert {text.split(']')[0] + ']' for text in status} == {'[Alpha.Tool]', '[Beta.Tool]'}
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from wpm.singleflight import SingleFlight
+
+# Function to start calls on threads, returns the threads and the list their results go to
+def start_callers(call, count):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(call())) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+class BlockingQuery:
+    """Counts its calls, each call waits until release() lets it finish."""
+
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Semaphore(0)
+        self.finish = threading.Semaphore(0)
+
+    def __call__(self):
+        self.calls += 1
+        call = self.calls
+        self.started.release()
+        self.finish.acquire()
+        return call
+
+    def release(self, count=1):
+        for _ in range(count):
+            self.finish.release()
+
+def test_concurrent_calls_share_one_run():
+    flights = SingleFlight()
+    query = BlockingQuery()
+    threads, results = start_callers(lambda: flights.run(('list_all_packages',), query), 1)
+    query.started.acquire()
+    followers, follower_results = start_callers(lambda: flights.run(('list_all_packages',), query), 3)
+    time.sleep(0.2)  # Time for the followers to join the running call
+    query.release()
+    for thread in threads + followers:
+        thread.join(5)
+    assert query.calls == 1
+    assert results + follower_results == [1, 1, 1, 1]
+
+def test_errors_reach_every_caller():
+    flights = SingleFlight()
+
+    @flights.coalesced
+    def broken():
+        raise ValueError("no winget")
+
+    with pytest.raises(ValueError, match="no winget"):
+        broken()
+
+def test_stale_call_runs_once_more():
+    flights = SingleFlight()
+    query = BlockingQuery()
+    threads, results = start_callers(lambda: flights.run(('list_all_packages',), query), 1)
+    query.started.acquire()
+    flights.invalidate(['list_all_packages'])
+    query.release()
+    query.started.acquire()
+    # Invalidated again while the second run is going, its result is returned anyway
+    flights.invalidate(['list_all_packages'])
+    query.release()
+    threads[0].join(5)
+    assert query.calls == 2
+    assert results == [2]
+
+def test_invalidate_only_the_named_queries():
+    flights = SingleFlight()
+    listing, search = BlockingQuery(), BlockingQuery()
+    threads, results = start_callers(lambda: flights.run(('list_all_packages',), listing), 1)
+    searches, search_results = start_callers(lambda: flights.run(('search_packages', ('git',), ()), search), 1)
+    listing.started.acquire()
+    search.started.acquire()
+    flights.invalidate(['list_all_packages', 'get_available_updates'])
+    listing.release(2)
+    search.release()
+    for thread in threads + searches:
+        thread.join(5)
+    assert (listing.calls, results) == (2, [2])
+    assert (search.calls, search_results) == (1, [1])
+
+def test_callers_after_an_invalidation_do_not_join_the_stale_call():
+    flights = SingleFlight()
+    query = BlockingQuery()
+    threads, results = start_callers(lambda: flights.run(('get_available_updates',), query), 1)
+    query.started.acquire()
+    flights.invalidate()
+    late, late_results = start_callers(lambda: flights.run(('get_available_updates',), query), 1)
+    query.started.acquire()  # The late caller started its own run
+    query.release(3)  # A third run if the stale call is repeated after the late one finished
+    for thread in threads + late:
+        thread.join(5)
+    # The first caller's stale run is repeated once and joins the late caller's run or starts another
+    assert late_results == [2]
+    assert results[0] >= 2
@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from wpm import cli
+from wpm.settings import Settings, app_data_dir
+from wpm.snapshots import SnapshotStore, build_plan, compare_fleet, diff_snapshots
+
+# Snapshot folder of four machines: golden is the target, desk-01 has an older and a newer
+# inventory, desk-02 has the same newer one, lab-01 has no history yet
+fixtures = os.path.join(os.path.dirname(__file__), 'fixtures', 'snapshots')
+
+@pytest.fixture
+def store(tmp_path):
+    root = tmp_path / 'snapshots'
+    shutil.copytree(fixtures, root)
+    return SnapshotStore(str(root))
+
+def test_diff_snapshots(store):
+    diff = diff_snapshots(store.load('desk-01'), store.load('golden'))
+    assert [row[0] for row in diff['added']] == ['Legacy.App', 'Notepad++.Notepad++']
+    assert [row[0] for row in diff['removed']] == ['Extra.Thing']
+    assert diff['changed'] == [{'id': 'Contoso.Tool', 'from': '2.0.0', 'to': '1.5.0'},
+                               {'id': 'Git.Git', 'from': '2.42.0', 'to': '2.43.0'}]
+
+def test_diff_of_identical_snapshots(store):
+    assert diff_snapshots(store.load('desk-01'), store.load('desk-02')) == {'added': [], 'removed': [],
+                                                                           'changed': []}
+
+def test_load_by_time(store):
+    assert store.load('desk-01@2024-02-01').rows == [['Git.Git', '2.41.0', 'Git', 'winget'],
+                                                     ['Microsoft.Edge', '119.0', 'Microsoft Edge', 'winget']]
+    with pytest.raises(KeyError):
+        store.load('desk-01@2024-01-01')
+
+def test_compare_fleet(store):
+    target = store.load('golden')
+    report = compare_fleet(store, target)
+    assert report['lab-01'] is None
+    assert report['golden']['hash'] == target.hash and not report['golden']['changed']
+    # Machines with the same inventory share one diff
+    assert report['desk-01'] == report['desk-02']
+    assert [change['id'] for change in report['desk-01']['changed']] == ['Contoso.Tool', 'Git.Git']
+
+def test_compare_fleet_before(store):
+    report = compare_fleet(store, store.load('golden'), '2024-02-01')
+    assert report['desk-02'] is None and report['golden'] is None
+    assert [change['to'] for change in report['desk-01']['changed']] == ['2.43.0', '120.0.1']
+
+def test_build_plan(store):
+    steps, unmanaged = build_plan(store.load('desk-01'), store.load('golden'), Settings(accept_eula=False))
+    assert unmanaged == ['Legacy.App']
+    assert {step['id']: step['action'] for step in steps} == {'Notepad++.Notepad++': 'install',
+                                                              'Contoso.Tool': 'downgrade', 'Git.Git': 'upgrade'}
+    commands = {step['id']: step['command'] for step in steps}
+    assert commands['Notepad++.Notepad++'] == ['winget', 'install', '--id', 'Notepad++.Notepad++',
+                                               '--version', '8.6', '--exact', '--source', 'winget']
+    # winget upgrade never goes back, the older version is installed over the newer one
+    assert commands['Contoso.Tool'] == ['winget', 'install', '--id', 'Contoso.Tool', '--version', '1.5.0',
+                                        '--exact', '--force']
+    assert commands['Git.Git'] == ['winget', 'upgrade', '--id', 'Git.Git', '--force', '--version', '2.43.0',
+                                   '--exact']
+
+def test_build_plan_uninstall_extra(store):
+    steps, _ = build_plan(store.load('desk-01'), store.load('golden'), Settings(), uninstall_extra=True)
+    uninstalls = [step for step in steps if step['action'] == 'uninstall']
+    assert uninstalls == [{'action': 'uninstall', 'id': 'Extra.Thing', 'from': '1.0', 'to': None,
+                           'command': ['winget', 'uninstall', '--id', 'Extra.Thing', '--force', '--exact']}]
+
+def test_check_all_with_unreachable_snapshot_folder(fake_winget, monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv('LOCALAPPDATA', str(tmp_path))
+    blocked = tmp_path / 'not-a-folder'
+    blocked.write_text('')
+    Settings(os.path.join(app_data_dir(), 'settings.json'),
+             snapshot_dir=str(blocked / 'snapshots')).save()
+    assert cli.main(['--quiet', 'check', '--all']) == 0
+    output = capsys.readouterr()
+    assert len(json.loads(output.out)) == 20
+    assert "Could not save the inventory snapshot" in output.err
+
+def test_snapshot_errors_are_json_on_stdout(fake_winget, monkeypatch, tmp_path, capsys):
+    monkeypatch.setenv('LOCALAPPDATA', str(tmp_path))
+    assert cli.main(['plan', 'nowhere', '--dir', fixtures]) == 1
+    assert json.loads(capsys.readouterr().out) == {'error': "Unknown snapshot: nowhere"}
@@ -0,0 +1,153 @@
+import threading
+import time
+
+import pytest
+
+from wpm.throttle import ConcurrencyController
+
+class ScriptedSampler:
+    """Reports the given loads one after the other, then None."""
+
+    def __init__(self, *loads):
+        self.loads = list(loads)
+
+    def sample(self):
+        return self.loads.pop(0) if self.loads else None
+
+# Function to let a controller's measuring window pass and finish jobs in it
+def finish_jobs(controller, count, seconds=None):
+    controller.changed_at = time.monotonic() - (seconds or controller.min_window * 2)
+    for _ in range(count):
+        controller.job_finished()
+
+def test_fixed_limit_follows_the_maximum():
+    controller = ConcurrencyController(4, adaptive=False, sampler=ScriptedSampler(1.0))
+    assert controller.limit == 4
+    finish_jobs(controller, 10)
+    assert controller.limit == 4
+    controller.set_maximum(6, False)
+    assert controller.limit == 6
+
+def test_adaptive_starts_low():
+    assert ConcurrencyController(8, sampler=ScriptedSampler()).limit == 2
+    assert ConcurrencyController(1, sampler=ScriptedSampler()).limit == 1
+
+def test_grows_with_headroom_and_waiting_jobs():
+    controller = ConcurrencyController(8, sampler=ScriptedSampler(0.3))
+    controller.set_waiting(5)
+    finish_jobs(controller, 2)
+    assert controller.limit == 3
+    assert controller.completed == 0  # A new window starts at the new limit
+    assert 2 in controller.rates
+
+def test_grows_without_a_load_reading():
+    controller = ConcurrencyController(8, sampler=ScriptedSampler())
+    controller.set_waiting(1)
+    finish_jobs(controller, 2)
+    assert controller.limit == 3
+
+def test_does_not_grow_without_waiting_jobs():
+    controller = ConcurrencyController(8, sampler=ScriptedSampler(0.1))
+    finish_jobs(controller, 2)
+    assert controller.limit == 2
+
+def test_does_not_grow_past_the_maximum():
+    controller = ConcurrencyController(2, sampler=ScriptedSampler(0.1))
+    controller.set_waiting(5)
+    finish_jobs(controller, 2)
+    assert controller.limit == 2
+
+def test_shrinks_when_the_cpu_is_saturated():
+    controller = ConcurrencyController(8, sampler=ScriptedSampler(0.95))
+    controller.set_waiting(5)
+    finish_jobs(controller, 2)
+    assert controller.limit == 1
+
+def test_keeps_the_limit_between_the_thresholds():
+    controller = ConcurrencyController(8, sampler=ScriptedSampler(0.7))
+    controller.set_waiting(5)
+    finish_jobs(controller, 2)
+    assert controller.limit == 2
+
+def test_waits_for_a_full_window():
+    controller = ConcurrencyController(8, sampler=ScriptedSampler(0.1))
+    controller.set_waiting(5)
+    finish_jobs(controller, 10, seconds=controller.min_window / 2)
+    assert controller.limit == 2
+    finish_jobs(controller, 1)
+    assert controller.limit == 3
+
+def test_waits_for_enough_jobs():
+    controller = ConcurrencyController(8, sampler=ScriptedSampler(0.1))
+    controller.set_waiting(5)
+    finish_jobs(controller, 1)
+    assert controller.limit == 2
+
+def test_shrinks_when_more_jobs_made_the_batch_slower():
+    controller = ConcurrencyController(8, sampler=ScriptedSampler(0.3, 0.3))
+    controller.set_waiting(5)
+    finish_jobs(controller, 2, seconds=10)  # 0.2 jobs per second at 2
+    assert controller.limit == 3
+    finish_jobs(controller, 2, seconds=40)  # 0.05 jobs per second at 3
+    assert controller.limit == 2
+
+def test_climbs_back_to_a_faster_limit():
+    controller = ConcurrencyController(8, sampler=ScriptedSampler(0.7))
+    controller.rates[3] = 1.0  # Measured earlier
+    controller.set_waiting(5)
+    finish_jobs(controller, 2, seconds=20)  # 0.1 jobs per second at 2
+    assert controller.limit == 3
+
+def test_set_maximum_lowers_the_limit():
+    controller = ConcurrencyController(8, sampler=ScriptedSampler())
+    controller.limit = 6
+    controller.set_maximum(4, True)
+    assert controller.limit == 4
+    controller.set_maximum(8, False)
+    assert controller.limit == 8
+
+def test_acquire_blocks_at_the_limit():
+    controller = ConcurrencyController(1, adaptive=False, sampler=ScriptedSampler())
+    controller.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (controller.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.2)
+    assert controller.waiting == 1
+    controller.release()
+    assert acquired.wait(5)
+    thread.join(5)
+    assert (controller.active, controller.waiting) == (1, 0)
+
+def test_gate_takes_the_group_before_a_slot():
+    controller = ConcurrencyController(2, adaptive=False, sampler=ScriptedSampler())
+    first_group, second_group = threading.Lock(), threading.Lock()
+    entered = threading.Event()
+    blocked = controller.gate(first_group)
+
+    def run_blocked():
+        with blocked:
+            entered.set()
+
+    with controller.gate(first_group):
+        thread = threading.Thread(target=run_blocked)
+        thread.start()
+        time.sleep(0.2)
+        # The job waiting for its group holds no slot, a job of another group still runs
+        assert controller.active == 1
+        with controller.gate(second_group):
+            assert controller.active == 2
+        assert not entered.is_set()
+    assert entered.wait(5)
+    thread.join(5)
+    assert controller.active == 0
+    assert not first_group.locked() and not second_group.locked()
+
+def test_gate_releases_on_errors():
+    controller = ConcurrencyController(1, adaptive=False, sampler=ScriptedSampler())
+    group = threading.Lock()
+    with pytest.raises(RuntimeError):
+        with controller.gate(group):
+            raise RuntimeError("installer failed")
+    assert controller.active == 0
+    assert not group.locked()
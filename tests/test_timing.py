@@ -0,0 +1,19 @@
+import pytest
+
+from wpm.timing import percentile
+
+@pytest.mark.parametrize('values, q, expected', [
+    (list(range(1, 11)), 50, 5),
+    ([1, 2], 50, 1),
+    (list(range(1, 21)), 95, 19),
+    (list(range(1, 21)), 96, 20),
+    (list(range(1, 101)), 7, 7),
+    ([3, 1, 2], 100, 3),
+    ([3, 1, 2], 0, 1),
+    ([4], 50, 4),
+])
+def test_percentile_nearest_rank(values, q, expected):
+    assert percentile(values, q) == expected
+
+def test_percentile_of_nothing():
+    assert percentile([], 50) is None
@@ -1,83 +1,652 @@
-import subprocess
-import re
+import os
+import queue
+import time
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext, Menu
-
-# Function to handle winget command with spaces in package names
-def run_winget_command(command, action_desc):
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import ttk, messagebox, scrolledtext, filedialog, Menu
+
+from wpm import inventory, runner, scheduler, timing
+from wpm.cache import PackageCache, ResultCache
+from wpm.commandlog import CommandLog
+from wpm.commands import build_update_command
+from wpm.jobqueue import JobQueue
+from wpm.settings import Settings, app_data_dir
+from wpm.snapshots import save_inventory
+from wpm.tables import SearchIndex, SortCache, columns, columns_install
+
+# Worker pool for winget calls so the Tk mainloop never blocks on a subprocess
+executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="winget")
+
+# Callbacks posted by worker threads, drained on the Tk thread by process_ui_queue
+ui_queue = queue.Queue()
+
+# Number of background tasks that have not reported back yet
+pending_tasks = 0
+
+# Function to terminate every running winget process
+def cancel_running_commands():
+    cancelled = runner.cancel_running_processes()
+    if cancelled:
+        append_log(f"Cancelled {cancelled} running command(s)\n")
+
+# Function to hand a callback from a worker thread to the Tk thread
+def post_to_ui(callback, *args):
+    ui_queue.put((callback, args))
+
+# Function to run a task on the worker pool and deliver its result to on_done on the Tk thread
+def run_in_background(task, on_done=None):
+    global pending_tasks
+    pending_tasks += 1
+    update_busy_indicator()
+    future = executor.submit(task)
+    future.add_done_callback(lambda done: post_to_ui(finish_background_task, done, on_done))
+    return future
+
+# Function called on the Tk thread once a background task has finished
+def finish_background_task(future, on_done):
+    global pending_tasks
+    pending_tasks -= 1
+    update_busy_indicator()
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        append_log(f"Exception occurred: {error}\n")
+    elif on_done is not None:
+        on_done(future.result())
+
+# Function to drain the UI queue periodically from the Tk mainloop
+def process_ui_queue():
+    window.after(50, process_ui_queue)  # Reschedule first so a failing callback cannot stop the loop
+    while True:
+        try:
+            callback, args = ui_queue.get_nowait()
+        except queue.Empty:
+            break
+        callback(*args)
+
+# Function to show or hide the progress bar depending on pending work
+def update_busy_indicator():
+    if pending_tasks > 0:
+        status_label.config(text=f"Running {pending_tasks} task(s)...")
+        progress_bar.start(10)
+        cancel_button.config(state="normal")
+    else:
+        status_label.config(text="Ready")
+        progress_bar.stop()
+        cancel_button.config(state="disabled")
+
+# The log box keeps at most this many lines, older output stays in the command log files
+log_max_lines = 2000
+
+# Number of command records fetched by one click on Load Older
+log_page_size = 20
+
+# Start time of the oldest command record shown in the log box, Load Older fetches records before it
+log_oldest_shown = time.time()
+
+# Pieces of text in the log box, oldest first, as (mark at the piece's start, time). Loaded records
+# carry their start time, live output the time it was appended, which its command started before.
+log_pieces = deque()
+log_piece_count = 0
+
+# Function to check whether the log box is showing filtered records instead of live output
+def log_filter_active():
+    return bool(log_package_var.get().strip() or log_status_var.get())
+
+# Function to mark where a piece of text starts in the log box, marks move along with the text
+def mark_log_piece(index, started, at_top=False):
+    global log_piece_count
+    log_piece_count += 1
+    name = f'piece{log_piece_count}'
+    log_text.mark_set(name, index)  # Right gravity: text inserted at the mark pushes it along
+    if at_top:
+        log_pieces.appendleft((name, started))
+    else:
+        log_pieces.append((name, started))
+
+# Function to forget the pieces whose text the log box no longer shows
+def drop_log_pieces(from_top):
+    if from_top:
+        # Deleted marks move to the start of the deletion, only the last of those still has text
+        while len(log_pieces) > 1 and log_text.compare(log_pieces[1][0], '==', '1.0'):
+            log_text.mark_unset(log_pieces.popleft()[0])
+    else:
+        while log_pieces and log_text.compare(log_pieces[-1][0], '>=', 'end-1c'):
+            log_text.mark_unset(log_pieces.pop()[0])
+
+# Function to delete lines beyond log_max_lines from the top or the bottom of the log box
+def trim_log(from_top=True):
+    global log_oldest_shown
+    excess = int(log_text.index('end-1c').split('.')[0]) - log_max_lines
+    if excess > 0:
+        if from_top:
+            log_text.delete('1.0', f'{excess + 1}.0')
+        else:
+            log_text.delete(f'{log_max_lines + 1}.0', tk.END)
+        drop_log_pieces(from_top)
+        if from_top and log_pieces:
+            # Load Older continues before the oldest command still on screen
+            log_oldest_shown = log_pieces[0][1]
+
+# Function to append text to the read-only log box
+def append_log(text):
+    if log_filter_active():
+        return  # Live output is paused while filtered records are shown
     log_text.config(state="normal")  # Enable the log box to insert text
-    log_text.insert(tk.END, f"{action_desc}\n")
-    log_text.insert(tk.END, f"Executing command: {' '.join(command)}\n")
-    try:
-        result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8')
-        log_text.insert(tk.END, f"Return code: {result.returncode}\n")
-
-        # Remove control characters from stdout and stderr
-        stdout_clean = re.sub(r'[\x00-\x1F\x7F-\x9F]+', '', result.stdout)
-        stderr_clean = re.sub(r'[\x00-\x1F\x7F-\x9F]+', '', result.stderr)
-
-        # Remove progress indicators
-        progress_pattern = re.compile(r'[\-\|\/\\]+')
-        stdout_clean = progress_pattern.sub('', stdout_clean)
-
-        # Remove excessive empty lines
-        stdout_clean = re.sub(r'\n\s*\n', '\n', stdout_clean).strip()
-        stderr_clean = re.sub(r'\n\s*\n', '\n', stderr_clean).strip()
-
-        log_text.insert(tk.END, f"Standard Output:\n{stdout_clean}\n")
-        log_text.insert(tk.END, f"Standard Error:\n{stderr_clean}\n")
-    except Exception as e:
-        log_text.insert(tk.END, f"Exception occurred: {e}\n")
+    start = log_text.index('end-1c')
+    log_text.insert(tk.END, text)
+    mark_log_piece(start, time.time())
+    trim_log()
+    log_text.see(tk.END)
     log_text.config(state="disabled")  # Disable the log box to prevent editing
 
-# Function to uninstall a selected package
-def uninstall_package(package_id):
-    command = ['winget', 'uninstall', '--id', package_id]
-    if force_var.get():
-        command.append('--force')
-    # Remove the '-h' flag or replace it with '--silent' if you want silent mode
-    # command.append('-h')  # Remove or comment out this line
-    # If you want silent mode, uncomment the next line
-    # command.append('--silent')
-    run_winget_command(command, f"Uninstalling {package_id}...")
-
-
-# Function to update a selected package
-def update_package(package_id):
-    command = ['winget', 'upgrade', '--id', package_id]
-    if force_var.get():
-        command.append('--force')
-    if eula_var.get():
-        command.append('--accept-package-agreements')
-    run_winget_command(command, f"Updating {package_id}...")
+# Function to fetch the next page of older command records matching the log filter
+def load_older_log():
+    before = log_oldest_shown
+    package = log_package_var.get().strip()
+    status = log_status_var.get()
+    run_in_background(lambda: command_log.read(before, package, status, log_page_size), show_older_log)
+
+# Function to insert older command records at the top of the log box
+def show_older_log(records):
+    global log_oldest_shown
+    if not records:
+        set_command_status("No older log entries")
+        return
+    log_oldest_shown = records[0]['started']
+    log_text.config(state="normal")
+    for entry in reversed(records):
+        log_text.insert('1.0', CommandLog.format(entry))
+        mark_log_piece('1.0', entry['started'], at_top=True)
+    trim_log(from_top=False)  # Keep the page that was just loaded
+    log_text.see('1.0')
+    log_text.config(state="disabled")
+
+# Function to show the records matching the package and status filter, or live output again
+def apply_log_filter(*_):
+    clear_log()
+    if log_filter_active():
+        load_older_log()
+
+# Function to show winget's current spinner or progress bar in the status line
+def set_command_status(status):
+    status_label.config(text=status)
+
+# Function to add install, upgrade or uninstall jobs for packages to the job queue
+def queue_jobs(action, package_ids, version=None):
+    if batch_packages:
+        busy = [package_id for package_id in package_ids if package_id.lower() in batch_packages]
+        if busy:
+            append_log(f"Not queued, Update All is updating: {', '.join(busy)}\n")
+        package_ids = [package_id for package_id in package_ids if package_id.lower() not in batch_packages]
+    added = [job for job in (job_queue.add(action, package_id, version) for package_id in package_ids) if job]
+    if added:
+        append_log(f"Queued {len(added)} {action} job(s): {', '.join(job['package'] for job in added)}\n")
+    if job_queue.paused:
+        append_log("The job queue is paused, resume it in the Job Queue window\n")
+
+# Function to queue updates of the selected packages
+def update_packages(package_ids):
+    queue_jobs('upgrade', package_ids)
+
+# Function to queue uninstalls of the selected packages
+def uninstall_packages(package_ids):
+    if len(package_ids) > 1 and not messagebox.askyesno("Uninstall Packages", f"Uninstall {len(package_ids)} packages?"):
+        return
+    queue_jobs('uninstall', package_ids)
+
+# Function called on the Tk thread whenever a job was added, started or finished
+def on_job_changed(job):
+    refresh_job_panel()
+    if job is not None and job['state'] in ('done', 'failed'):
+        package_cache.invalidate()  # Install, upgrade and uninstall change the package lists
+        inventory.invalidate_installed()  # Queries still running saw the old packages
+        refresh_package_row(job['package'])
+        update_busy_indicator()  # Replaces the job's last progress bar in the status line
+
+# Job queue window and its widgets, None while the window is closed
+job_window = None
+
+# Function to open the job queue panel with progress, priorities and pause/resume
+def open_job_window():
+    global job_window, job_tree, job_progress, job_status_label, pause_button
+    if job_window is not None and job_window.winfo_exists():
+        job_window.lift()
+        return
+    job_window = tk.Toplevel(window)
+    job_window.title("Job Queue")
+
+    job_columns = ["#", "Action", "Package", "Priority", "State", "Result", "Attempts", "Duration"]
+    job_tree = ttk.Treeview(job_window, columns=job_columns, show="headings", selectmode="extended", height=12)
+    for col in job_columns:
+        job_tree.heading(col, text=col)
+        job_tree.column(col, width=220 if col == "Package" else 80)
+    job_tree.grid(row=0, column=0, columnspan=7, padx=10, pady=10, sticky="nsew")
+
+    job_progress = ttk.Progressbar(job_window, mode="determinate", maximum=100)
+    job_progress.grid(row=1, column=0, columnspan=4, padx=10, sticky="we")
+    job_status_label = tk.Label(job_window, text="")
+    job_status_label.grid(row=1, column=4, columnspan=3, padx=10, sticky="w")
+
+    # Function to get the job IDs selected in the panel
+    def selected_jobs():
+        return [int(item) for item in job_tree.selection()]
+
+    # Function to run a queue method for every selected job
+    def for_selected(method, *args):
+        for job_id in selected_jobs():
+            method(job_id, *args)
+
+    # Function to pause or resume starting new jobs
+    def toggle_pause():
+        if job_queue.paused or runner.cancel_event.is_set():
+            job_queue.resume()
+        else:
+            job_queue.pause()
+
+    pause_button = tk.Button(job_window, text="Pause", command=toggle_pause)
+    pause_button.grid(row=2, column=0, padx=5, pady=10)
+    tk.Button(job_window, text="Raise Priority", command=lambda: for_selected(job_queue.set_priority, 1)).grid(row=2, column=1, padx=5, pady=10)
+    tk.Button(job_window, text="Lower Priority", command=lambda: for_selected(job_queue.set_priority, -1)).grid(row=2, column=2, padx=5, pady=10)
+    tk.Button(job_window, text="Cancel", command=lambda: for_selected(job_queue.cancel)).grid(row=2, column=3, padx=5, pady=10)
+    tk.Button(job_window, text="Retry", command=lambda: for_selected(job_queue.retry)).grid(row=2, column=4, padx=5, pady=10)
+    tk.Button(job_window, text="Clear Finished", command=job_queue.clear_finished).grid(row=2, column=5, padx=5, pady=10)
+
+    concurrency_frame = tk.Frame(job_window)
+    concurrency_frame.grid(row=2, column=6, padx=10, pady=10, sticky="e")
+    tk.Label(concurrency_frame, text="Parallel jobs:").grid(row=0, column=0)
+    tk.Spinbox(concurrency_frame, from_=1, to=16, width=4, textvariable=concurrency_var).grid(row=0, column=1)
+
+    job_window.grid_columnconfigure(6, weight=1)
+    job_window.grid_rowconfigure(0, weight=1)
+    refresh_job_panel()
+
+# Function to show the current jobs and progress in the job queue panel
+def refresh_job_panel():
+    if job_window is None or not job_window.winfo_exists():
+        return
+    jobs = job_queue.snapshot()
+    selection = set(job_tree.selection())
+    job_tree.delete(*job_tree.get_children())
+    for job in jobs:
+        if job['finished'] and job['started']:
+            duration = f"{job['finished'] - job['started']:.1f}s"
+        else:
+            duration = ""
+        version = f" ({job['version']})" if job['version'] else ""
+        job_tree.insert("", tk.END, iid=str(job['id']), values=[
+            job['id'], job['action'], job['package'] + version, job['priority'], job['state'],
+            job['result'], job['attempts'], duration])
+    job_tree.selection_set([item for item in selection if job_tree.exists(item)])
+
+    counts = {}
+    for job in jobs:
+        counts[job['state']] = counts.get(job['state'], 0) + 1
+    finished = counts.get('done', 0) + counts.get('failed', 0)
+    total = finished + counts.get('running', 0) + counts.get('queued', 0)
+    job_progress.config(value=100 * finished / total if total else 0)
+    paused = job_queue.paused or runner.cancel_event.is_set()
+    job_status_label.config(text=f"{finished} of {total} finished, {counts.get('running', 0)} running, "
+                                 f"{counts.get('failed', 0)} failed" + (" (paused)" if paused else ""))
+    pause_button.config(text="Resume" if paused else "Pause")
+
+# Lowercase IDs of the packages the running Update All batch upgrades, None while no batch runs
+batch_packages = None
 
 # Function to update all packages
 def update_all_packages():
-    command = ['winget', 'upgrade', '--all']
-    if force_var.get():
-        command.append('--force')
-    if eula_var.get():
-        command.append('--accept-package-agreements')
-    run_winget_command(command, "Updating all packages...")
+    global batch_packages
+    if batch_packages is not None:
+        append_log("Update All is already running\n")
+        return
+    batch_packages = set()  # Taken while the updates are looked up, a second click does nothing
+    update_all_button.config(state="disabled")
+    append_log("Checking for available updates...\n")
+
+    def task():  # Runs on a worker thread
+        try:
+            return inventory.get_available_updates()
+        except Exception:
+            post_to_ui(end_upgrade_batch)
+            raise
+
+    run_in_background(task, start_upgrade_batch)
+
+# Function to allow the next Update All once a batch has finished or could not start
+def end_upgrade_batch():
+    global batch_packages
+    batch_packages = None
+    update_all_button.config(state="normal")
+
+# Function to start per-package upgrade jobs for the rows returned by get_available_updates
+def start_upgrade_batch(packages):
+    global batch_packages
+    if packages is None:
+        append_log("Could not get the available updates from winget\n")
+        end_upgrade_batch()
+        return
+    # Packages with a job in the queue are left to the queue, the same package must not upgrade twice at once
+    queued = job_queue.active_packages()
+    skipped = [package[1] for package in packages if package[1].lower() in queued]
+    if skipped:
+        append_log(f"Left to the job queue: {', '.join(skipped)}\n")
+    packages = [package for package in packages if package[1].lower() not in queued]
+    if not packages:
+        append_log("No updates available\n" if not skipped else "No other updates available\n")
+        end_upgrade_batch()
+        return
+    batch_packages = {package[1].lower() for package in packages}
+    jobs = [(package[1], build_update_command(package[1], settings)) for package in packages]
+    concurrency = max(1, settings.concurrency)
+    timeout = max(1, settings.timeout_minutes) * 60
+    retries = max(0, settings.retries)
+    runner.cancel_event.clear()
+    append_log(f"Updating {len(jobs)} packages, {'up to ' if settings.adaptive_concurrency else ''}{concurrency} at a time...\n")
+    log = lambda text: post_to_ui(append_log, text)
+    show_status = lambda status: post_to_ui(set_command_status, status)
+    adaptive = settings.adaptive_concurrency
+    ordered = settings.order_by_dependencies
+    versions = {package[1]: package[3] for package in packages}  # Dependencies of the versions being installed
+
+    def task():  # Runs on a worker thread
+        try:
+            return scheduler.run_upgrade_batch(jobs, concurrency, timeout, retries, log, adaptive, result_cache,
+                                               ordered, versions, show_status)
+        finally:
+            post_to_ui(end_upgrade_batch)
+
+    run_in_background(task, show_upgrade_summary)
+
+# Function to show the per-package pass/fail table once a batch has finished
+def show_upgrade_summary(batch_result):
+    results, elapsed = batch_result
+    succeeded = sum(1 for row in results if row[1] == "Updated")
+    append_log(f"Batch finished in {elapsed:.1f}s: {succeeded} of {len(results)} packages updated\n")
+
+    summary_window = tk.Toplevel(window)
+    summary_window.title("Update Summary")
+
+    summary_columns = ["ID", "Result", "Attempts", "Duration (s)", "Return Code"]
+    summary_table = ttk.Treeview(summary_window, columns=summary_columns, show='headings')
+    for col in summary_columns:
+        summary_table.heading(col, text=col, anchor="w")
+        summary_table.column(col, anchor="w", width=150 if col == "ID" else 90)
+    for row in results:
+        summary_table.insert("", "end", values=row)
+    summary_table.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
+
+    summary_label = tk.Label(summary_window, text=f"{succeeded} of {len(results)} packages updated in {elapsed:.1f}s")
+    summary_label.grid(row=1, column=0, padx=10, pady=5, sticky="w")
+
+    summary_window.grid_rowconfigure(0, weight=1)
+    summary_window.grid_columnconfigure(0, weight=1)
+
+    package_cache.invalidate()
+    inventory.invalidate_installed()
+    refresh_table(show_all_var.get())
+
+class VirtualTable:
+    """Treeview front end that keeps all rows in a store and only materializes the rows in view."""
+
+    # Rows kept above and below the visible ones so small scrolls do not need a re-render
+    buffer_rows = 30
+    row_height = 20
+
+    def __init__(self, tree, scrollbar):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.rows = []              # Full data
+        self.ids = array('i')       # Item ID of each row, kept for unchanged packages across updates
+        self.index_of = {}          # Item ID to row index
+        self.next_id = 0
+        self.view = array('i')      # Row indices in display order (filtered and sorted)
+        self.top = 0                # Position in view of the first visible row
+        self.first = self.last = 0  # Slice of view that is currently materialized
+        self.selected = set()       # Selected item IDs, kept while their items are not materialized
+        self.render_pending = False
+        tree.config(yscrollcommand=self.on_tree_scroll)
+        scrollbar.config(command=self.on_scrollbar)
+        tree.bind("<<TreeviewSelect>>", self.on_select, add="+")
+        tree.bind("<Configure>", lambda event: self.render(), add="+")
+
+    def set_rows(self, rows):
+        """Replace the data and show all rows in their original order."""
+        self.tree.delete(*self.tree.get_children())
+        self.rows = rows
+        self.ids = array('i', range(self.next_id, self.next_id + len(rows)))
+        self.next_id += len(rows)
+        self.index_of = {item_id: index for index, item_id in enumerate(self.ids)}
+        self.selected.clear()
+        self.top = 0
+        self.set_view(range(len(rows)))
+
+    def update_rows(self, rows, key):
+        """Replace the data keeping the items, selection and scroll position of rows whose key is unchanged.
+
+        Changed rows are updated in place and removed rows disappear on the next render. The caller
+        sets the view afterwards. Returns the number of added, removed and changed rows.
+        """
+        old_ids = {}
+        for row, item_id in zip(self.rows, self.ids):
+            old_ids.setdefault(key(row), []).append((item_id, row))
+
+        materialized = set(self.tree.get_children())
+        ids = array('i')
+        added = changed = 0
+        for row in rows:
+            matches = old_ids.get(key(row))
+            if matches:
+                item_id, old_row = matches.pop(0)
+                if list(old_row) != list(row):
+                    changed += 1
+                    if str(item_id) in materialized:
+                        self.tree.item(str(item_id), values=row)
+            else:
+                item_id = self.next_id
+                self.next_id += 1
+                added += 1
+            ids.append(item_id)
+
+        self.rows = rows
+        self.ids = ids
+        self.index_of = {item_id: index for index, item_id in enumerate(ids)}
+        self.selected &= self.index_of.keys()
+        removed = sum(len(matches) for matches in old_ids.values())
+        return added, removed, changed
+
+    def set_view(self, indices):
+        """Show the rows with the given indices, in the given order."""
+        self.view = array('i', indices)
+        self.top = min(self.top, max(0, len(self.view) - self.visible_count()))
+        self.render()
+
+    def row(self, item):
+        return self.rows[self.index_of[int(item)]]
+
+    def selected_rows(self):
+        return [self.rows[index] for index in sorted(self.index_of[item_id] for item_id in self.selected)]
+
+    def visible_count(self):
+        return max(int(self.tree.cget('height') or 10), self.tree.winfo_height() // self.row_height)
+
+    def render(self):
+        """Materialize the visible slice of the view plus the buffer, reusing existing items."""
+        self.render_pending = False
+        total = len(self.view)
+        self.first = max(0, self.top - self.buffer_rows)
+        self.last = min(total, self.top + self.visible_count() + self.buffer_rows)
+        indices = self.view[self.first:self.last]
+        wanted = [str(self.ids[index]) for index in indices]
+
+        existing = set(self.tree.get_children())
+        wanted_set = set(wanted)
+        stale = existing - wanted_set
+        if stale:
+            self.tree.delete(*stale)
+        for item, index in zip(wanted, indices):
+            if item not in existing:
+                self.tree.insert("", "end", iid=item, values=self.rows[index])
+        self.tree.set_children("", *wanted)  # Put the reused and new items in display order
+
+        selection = [item for item in wanted if int(item) in self.selected]
+        self.tree.selection_set(selection)
+        self.tree.yview_moveto((self.top - self.first) / max(1, self.last - self.first))
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        total = len(self.view)
+        if total == 0:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.visible_count()) / total))
+
+    def scroll_to(self, top):
+        self.top = max(0, min(top, len(self.view) - self.visible_count()))
+        self.render()
+
+    def on_scrollbar(self, action, amount, unit=None):
+        # Scrollbar positions refer to the whole view, not to the materialized slice
+        if action == 'moveto':
+            self.scroll_to(int(float(amount) * len(self.view)))
+        elif action == 'scroll':
+            step = self.visible_count() if unit == 'pages' else 1
+            self.scroll_to(self.top + int(amount) * step)
+
+    def on_tree_scroll(self, low, high):
+        # The tree scrolled inside the slice (mouse wheel, arrow keys), translate to a view position
+        self.top = self.first + round(float(low) * (self.last - self.first))
+        self.update_scrollbar()
+        margin = self.buffer_rows // 2
+        near_start = self.first > 0 and self.top - self.first < margin
+        near_end = self.last < len(self.view) and self.last - (self.top + self.visible_count()) < margin
+        if (near_start or near_end) and not self.render_pending:
+            self.render_pending = True
+            self.tree.after_idle(self.render)  # Not from inside the scroll callback
+
+    def on_select(self, event):
+        materialized = {int(item) for item in self.tree.get_children()}
+        current = {int(item) for item in self.tree.selection()}
+        self.selected = (self.selected - materialized) | current
+
+# Incremented on every refresh so results of superseded refreshes are dropped
+refresh_generation = 0
+
+# Unfiltered rows of the main table, the display order of their indices, their search index and sort orders
+original_data = []
+row_order = []
+search_index = None
+main_sort = None
+
+# Column and direction of the last heading click, kept across refreshes
+main_sort_order = None
+
+# Whether the main table shows all packages or the updates, None before the first load
+table_show_all = None
 
 # Function to refresh the table with available updates or all packages
-def refresh_table(show_all=False):
-    global original_data
-    update_table.delete(*update_table.get_children())  # Clear the table
+def refresh_table(show_all=False, force=False):
+    global refresh_generation
+    refresh_generation += 1
+    generation = refresh_generation
+    key = 'all' if show_all else 'updates'
+
+    # Paint from the cache right away and only go to winget when the entry is missing or stale
+    entry = package_cache.get(key)
+    if entry is not None:
+        populate_table(entry['packages'], show_all, cached=True)
+        if not force and not package_cache.is_stale(entry):
+            return
+
+    fetch = inventory.list_all_packages if show_all else inventory.get_available_updates
+    ttl = max(1, settings.cache_ttl_minutes) * 60
+    fetch_generation = package_cache.generation
+
+    def task():  # Runs on a worker thread
+        with timing.capture() as runs:
+            packages = fetch()
+        if packages is None:
+            return None, runs  # winget failed, keep showing what the table has
+        package_cache.store(key, packages, ttl, fetch_generation)
+        if show_all:
+            save_snapshot(packages)
+        return packages, runs
+
+    def apply(result):
+        packages, runs = result
+        if packages is None:
+            append_log("Could not get the package list from winget\n")
+        elif generation == refresh_generation:
+            start = time.perf_counter()
+            populate_table(packages, show_all)
+            if runs:
+                runs[-1].add('render', time.perf_counter() - start)
+
+    run_in_background(task, apply)
+
+# Function to keep a snapshot of the installed packages after a full refresh (runs on a worker thread)
+def save_snapshot(packages):
+    try:
+        saved = save_inventory(packages, settings)
+    except OSError as e:
+        post_to_ui(append_log, f"Could not save the inventory snapshot: {e}\n")
+        return
+    if saved is not None and saved[2]:
+        post_to_ui(append_log, f"Installed packages changed, saved snapshot {saved[0].hash}\n")
+
+# Function to fill the main table with freshly fetched packages
+def populate_table(packages, show_all, cached=False):
+    global original_data, row_order, search_index, main_sort, table_show_all
+    cached_note = " (cached)" if cached else ""
 
     if show_all:
-        packages = list_all_packages()  # Get all installed packages
         hide_columns(["Available Version", "Source"])  # Hide columns when showing all packages
-        updates_count_label.config(text="Available Updates: N/A")  # No updates shown when showing all packages
+        updates_count_label.config(text=f"Available Updates: N/A{cached_note}")  # No updates shown when showing all packages
     else:
-        packages = get_available_updates()  # Get available updates
         show_columns(["Available Version", "Source"])  # Show columns when showing available updates
-        updates_count_label.config(text=f"Available Updates: {len(packages)}")  # Update the label to show the number of updates
+        updates_count_label.config(text=f"Available Updates: {len(packages)}{cached_note}")  # Update the label to show the number of updates
 
     original_data = packages  # Store the original unfiltered data
+    main_sort = SortCache(packages, columns)
+    row_order = main_sort.order(*main_sort_order) if main_sort_order else list(range(len(packages)))
+    search_index = SearchIndex(packages)
+    executor.submit(search_index.build_trigrams)  # Built off the Tk thread, used once ready
+
+    if show_all == table_show_all:
+        # Same list as before: keep selection and scroll position, only touch rows that changed
+        main_view.update_rows(packages, key=lambda row: row[1])
+    else:
+        main_view.set_rows(packages)  # Only the rows in view are inserted into the Treeview
+        table_show_all = show_all
+
+    apply_search_filter()
+
+# Function to re-query one package after a command changed it and patch its row in the main table
+def refresh_package_row(package_id):
+    run_in_background(lambda: inventory.get_installed_package(package_id),
+                      lambda installed: patch_package_row(package_id, installed))
 
-    for package in packages:
-        update_table.insert("", "end", values=package)
+# Function to replace, add or remove the rows of one package without reloading the table
+def patch_package_row(package_id, installed):
+    if installed is None or table_show_all is None:
+        return  # winget failed or nothing loaded yet, the next refresh picks the change up
+
+    # Build a new list, the old rows may be shared with the cache and other callers
+    packages = []
+    found = False
+    for row in original_data:
+        if row[1] != package_id:
+            packages.append(row)
+            continue
+        if not found:
+            found = True
+            # In the updates list only packages that still have a newer version stay
+            packages.extend(new_row for new_row in installed if table_show_all or new_row[3])
+    if not found and table_show_all:
+        packages.extend(installed)  # Newly installed package
+    populate_table(packages, table_show_all)
 
 # Function to hide specific columns
 def hide_columns(columns_to_hide):
@@ -89,114 +658,69 @@ def show_columns(columns_to_show):
     for col in columns_to_show:
         update_table.column(col, width=150, stretch=True)  # Set the width back to a reasonable default
 
-# Function to get available updates using winget
-def get_available_updates():
-    result = subprocess.run(['winget', 'upgrade'], capture_output=True, text=True, encoding='utf-8')
-    if result.returncode != 0:
-        return []
-
-    updates = []
-    lines = result.stdout.splitlines()
-
-    # Track whether the header has been skipped
-    header_skipped = False
-
-    # Ignore first line (header) and parse the remaining lines
-    for line in lines:
-        if not header_skipped:
-            if "Name" in line and "ID" in line and "Version" in line:
-                header_skipped = True  # Skip the header row
-            continue
-
-        if "----" in line or len(line.strip()) == 0:
-            continue  # Skip separator lines and empty lines
-
-        # Check for footer keywords and skip those lines
-        if "Mindestens" in line or "Paket" in line or "verfügt" in line:
-            continue  # Skip the footer line
-
-        # Split the line based on multiple spaces
-        update_info = line.split()
-        if len(update_info) >= 5:
-            updates.append(update_info[:5])  # Append Name, ID, Version, Available Version, Source
-
-    return updates
-
-# Function to list all installed packages using regular expressions for robust parsing
-def list_all_packages():
-    result = subprocess.run(['winget', 'list'], capture_output=True, text=True, encoding='utf-8')
-    if result.returncode != 0:
-        return []
-
-    packages = []
-    lines = result.stdout.splitlines()
-
-    # Define the regex pattern to match the columns: Name, ID, Version, Source
-    pattern = re.compile(r"^(.+?)\s{2,}(.+?)\s{2,}(.+?)\s{2,}(.+)$")
-
-    # Track whether the header has been skipped
-    header_skipped = False
-
-    # Ignore the first line (header) and parse the remaining lines
-    for line in lines:
-        if not header_skipped:
-            if "Name" in line and "ID" in line and "Version" in line:
-                header_skipped = True  # Skip the header row
-            continue
-
-        if "----" in line or len(line.strip()) == 0:
-            continue  # Skip separator lines and empty lines
-
-        # Use regex to match the line
-        match = pattern.match(line)
-        if match:
-            name = match.group(1).strip()
-            package_id = match.group(2).strip()
-            version = match.group(3).strip()
-            source = match.group(4).strip()
-            packages.append([name, package_id, version, source])
-
-    return packages
+# Delay before filtering so fast typing only filters once
+search_debounce_ms = 150
+search_after_id = None
 
 # Function to filter the main table based on search input
 def search_table(event):
-    search_term = search_field.get().lower()  # Get the search term and convert to lowercase for case-insensitive comparison
-
-    # Clear current table entries
-    update_table.delete(*update_table.get_children())
-
-    # Filter and display the data from original_data (unfiltered data)
-    for package in original_data:
-        # Check if any column contains the search term
-        if any(search_term in str(value).lower() for value in package):
-            update_table.insert("", "end", values=package)
+    global search_after_id
+    if search_after_id is not None:
+        window.after_cancel(search_after_id)
+    search_after_id = window.after(search_debounce_ms, apply_search_filter)
+
+# Function to show only the matching rows in display order
+def apply_search_filter():
+    global search_after_id
+    search_after_id = None
+    if search_index is None:
+        return
+    query = search_field.get()
+    if query:
+        matches = set(search_index.search(query))
+        visible = [index for index in row_order if index in matches]
+    else:
+        visible = row_order
+    main_view.set_view(visible)
 
 # Function to handle right-click menu actions in main window
 def on_right_click(event):
     selected_item = update_table.identify_row(event.y)
     if selected_item:
-        update_table.selection_set(selected_item)
-        item = update_table.item(selected_item)
-        package_id = item['values'][1]  # Get the package ID from the selected row
+        # Keep a multi-row selection when clicking inside it, otherwise select the clicked row
+        if selected_item not in update_table.selection():
+            update_table.selection_set(selected_item)
+            main_view.on_select(None)
+        package_id = main_view.row(selected_item)[1]  # Get the package ID from the clicked row
+        package_ids = [row[1] for row in main_view.selected_rows()] or [package_id]
+        count = f" {len(package_ids)} Packages" if len(package_ids) > 1 else ""
         popup_menu = Menu(window, tearoff=0)
-        popup_menu.add_command(label="Update", command=lambda: update_package(package_id))
-        popup_menu.add_command(label="Uninstall", command=lambda: uninstall_package(package_id))
+        popup_menu.add_command(label=f"Update{count}", command=lambda: update_packages(package_ids))
+        popup_menu.add_command(label=f"Uninstall{count}", command=lambda: uninstall_packages(package_ids))
         popup_menu.add_command(label="Show Available Versions", command=lambda: show_available_versions(package_id))
         popup_menu.post(event.x_root, event.y_root)
 
 # Function to fetch and display available versions
 def show_available_versions(package_id):
-    # Create a new window
-    versions_window = tk.Toplevel(window)
-    versions_window.title(f"Available Versions for {package_id}")
+    # Prefetched or recently shown versions open without waiting for the worker pool
+    versions = result_cache.get(('versions', package_id, None))
+    if versions is not None:
+        open_versions_window(package_id, versions)
+        return
+    # Fetch available versions in the background and open the window once they arrive
+    run_in_background(lambda: inventory.get_available_versions(package_id, cache=result_cache),
+                      lambda versions: open_versions_window(package_id, versions))
 
-    # Fetch available versions
-    versions = get_available_versions(package_id)
+# Function to display the fetched versions of a package
+def open_versions_window(package_id, versions):
     if not versions:
         messagebox.showinfo("No Versions Found", f"No available versions found for {package_id}")
-        versions_window.destroy()
         return
 
+    # Create a new window
+    versions_window = tk.Toplevel(window)
+    versions_window.title(f"Available Versions for {package_id}")
+
     # Create a listbox to display versions
     versions_listbox = tk.Listbox(versions_window, height=15, width=50)
     for version in versions:
@@ -211,87 +735,35 @@ def show_available_versions(package_id):
     versions_window.grid_rowconfigure(0, weight=1)
     versions_window.grid_columnconfigure(0, weight=1)
 
-# Function to get available versions of a package
-def get_available_versions(package_id):
-    command = ['winget', 'show', '--id', package_id, '--versions']
-    try:
-        result = subprocess.run(command, capture_output=True, text=True, encoding='utf-8')
-        if result.returncode != 0:
-            return []
-        
-        output = result.stdout
-        lines = output.splitlines()
-        versions = []
-        
-        # Flags to control parsing
-        parsing_versions = False
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            # Check for the "Version" header
-            if line == "Version":
-                parsing_versions = True
-                continue
-            # Skip the line of dashes after the header
-            if parsing_versions and all(c == '-' for c in line):
-                continue
-            if parsing_versions:
-                # If we reach another section or the end, stop parsing
-                if ':' in line or line.startswith("Gefunden"):
-                    break
-                versions.append(line)
-        return versions
-    except Exception as e:
-        print(f"Error fetching versions: {e}")
-        return []
-
 # Function to install a specific version of a package
 def install_specific_version(package_id, version):
     if not version:
         messagebox.showwarning("No Version Selected", "Please select a version to install.")
         return
-    command = ['winget', 'install', '--id', package_id, '--version', version]
-    if eula_var.get():
-        command.append('--accept-package-agreements')
-    run_winget_command(command, f"Installing {package_id} Version {version}...")
+    queue_jobs('install', [package_id], version)
 
 # Function to handle right-click menu actions in install window
-def on_install_right_click(event, install_table):
-    selected_item = install_table.identify_row(event.y)
+def on_install_right_click(event, install_view):
+    selected_item = install_view.tree.identify_row(event.y)
     if selected_item:
-        install_table.selection_set(selected_item)
-        item = install_table.item(selected_item)
-        package_id = item['values'][1]
+        if selected_item not in install_view.tree.selection():
+            install_view.tree.selection_set(selected_item)
+            install_view.on_select(None)
+        package_id = install_view.row(selected_item)[1]
+        count = len(install_view.selected_rows())
         popup_menu = Menu(install_window, tearoff=0)
-        popup_menu.add_command(label="Install", command=lambda: install_selected_package(install_table))
+        popup_menu.add_command(label=f"Install {count} Packages" if count > 1 else "Install",
+                               command=lambda: install_selected_package(install_view))
         popup_menu.add_command(label="Show Available Versions", command=lambda: show_available_versions(package_id))
         popup_menu.post(event.x_root, event.y_root)
 
 # Function to handle sorting for the install window table
-def sort_install_table(col, reverse, install_table):
-    global install_table_data, columns_install  # Use global data
-
-    col_idx = columns_install.index(col)  # Get the index of the selected column
-
-    # Function to ensure everything is converted to string for safe comparison
-    def convert(value):
-        try:
-            return str(value).lower()  # Convert all values to strings for comparison
-        except Exception:
-            return ''  # Handle cases where conversion fails
-
-    # Sort the install table data by the selected column
-    install_table_data.sort(key=lambda row: convert(row[col_idx]), reverse=reverse)
-
-    # Clear and re-populate the table with sorted data
-    install_table.delete(*install_table.get_children())
-    for package in install_table_data:
-        install_table.insert("", "end", values=package)
+def sort_install_table(col, reverse, install_view):
+    # Sort orders are cached per search result, the items are only reordered
+    install_view.set_view(install_sort.order(col, reverse))
 
     # Toggle sorting order for the next click
-    install_table.heading(col, command=lambda: sort_install_table(col, not reverse, install_table))
+    install_view.tree.heading(col, command=lambda: sort_install_table(col, not reverse, install_view))
 
 # Function to open the installation search window
 def open_install_window():
@@ -306,9 +778,9 @@ def open_install_window():
     search_entry.grid(row=0, column=1, padx=5, pady=5, sticky="we")
 
     # Bind the Enter key to trigger the search_package function
-    search_entry.bind("<Return>", lambda event: search_package(search_entry.get(), install_table))
+    search_entry.bind("<Return>", lambda event: search_package(search_entry.get(), install_view))
 
-    search_button = tk.Button(install_window, text="Search", command=lambda: search_package(search_entry.get(), install_table))
+    search_button = tk.Button(install_window, text="Search", command=lambda: search_package(search_entry.get(), install_view))
     search_button.grid(row=0, column=2, padx=5, pady=5)
 
     # Scrollbar for the install table
@@ -318,19 +790,19 @@ def open_install_window():
     install_table_scrollbar = tk.Scrollbar(install_table_frame, orient="vertical")
     install_table_scrollbar.grid(row=0, column=1, sticky='ns')
 
-    install_table = ttk.Treeview(install_table_frame, columns=columns_install, show='headings', yscrollcommand=install_table_scrollbar.set)
-    install_table_scrollbar.config(command=install_table.yview)
+    install_table = ttk.Treeview(install_table_frame, columns=columns_install, show='headings', selectmode='extended')
+    install_view = VirtualTable(install_table, install_table_scrollbar)  # Wires up the scrollbar
 
     for col in columns_install:
-        install_table.heading(col, text=col, command=lambda _col=col: sort_install_table(_col, False, install_table))
+        install_table.heading(col, text=col, command=lambda _col=col: sort_install_table(_col, False, install_view))
         install_table.column(col, anchor="w")
 
     install_table.grid(row=0, column=0, padx=5, pady=5, sticky="nsew")
 
     # Right-click binding for install_table
-    install_table.bind("<Button-3>", lambda event: on_install_right_click(event, install_table))
+    install_table.bind("<Button-3>", lambda event: on_install_right_click(event, install_view))
 
-    install_button = tk.Button(install_window, text="Install Selected", command=lambda: install_selected_package(install_table))
+    install_button = tk.Button(install_window, text="Install Selected", command=lambda: install_selected_package(install_view))
     install_button.grid(row=2, column=1, padx=5, pady=5)
 
     # Configure grid weights for resizing
@@ -342,79 +814,160 @@ def open_install_window():
     install_table_frame.grid_rowconfigure(0, weight=1)
     install_table_frame.grid_columnconfigure(0, weight=1)
 
-# Define the global install_table_data
+# Define the global install_table_data and its cached sort orders
 install_table_data = []
-
-# Define columns globally for the install table
-columns_install = ["Name", "ID", "Version", "Match", "Source"]
+install_sort = SortCache(install_table_data, columns_install)
+
+# Number of search results whose version lists are fetched ahead of time
+prefetch_count = 5
+
+# Local mirror of the winget catalog, created on first use so startup does not load SQLite
+local_catalog = None
+
+# Function to get the local catalog used by the Install window when enabled in Settings
+def get_local_catalog():
+    global local_catalog
+    if local_catalog is None:
+        from wpm.catalog import LocalCatalog
+        local_catalog = LocalCatalog(os.path.join(app_data_dir(), 'catalog.db'))
+    return local_catalog
+
+# Function to download the winget source and refresh the local catalog in the background
+def update_local_catalog():
+    append_log("Updating local catalog from the winget source...\n")
+    run_in_background(lambda: get_local_catalog().update_from_source(), lambda summary: append_log(summary + "\n"))
+
+# Function to import a manifest folder (e.g. a winget-pkgs checkout) into the local catalog
+def import_manifest_folder():
+    folder = filedialog.askdirectory(title="Select manifest folder")
+    if folder:
+        append_log(f"Importing manifests from {folder}...\n")
+        run_in_background(lambda: get_local_catalog().import_manifests(folder), lambda summary: append_log(summary + "\n"))
 
 # Function to search for packages using winget in the install window
-def search_package(package_name, install_table):
-    result = subprocess.run(['winget', 'search', package_name], capture_output=True, text=True, encoding='utf-8')
-    if result.returncode != 0:
+def search_package(package_name, install_view):
+    if settings.use_local_catalog and get_local_catalog().package_count():
+        # Answer from the local catalog without starting winget
+        show_search_results(get_local_catalog().search(package_name), install_view)
+        return
+    def task():  # Runs on a worker thread
+        with timing.capture() as runs:
+            results = inventory.search_packages(package_name, cache=result_cache)
+        return results, runs
+
+    def apply(result):
+        results, runs = result
+        start = time.perf_counter()
+        show_search_results(results, install_view)
+        if runs:
+            runs[-1].add('render', time.perf_counter() - start)
+
+    run_in_background(task, apply)
+
+# Function to show search results in the install table
+def show_search_results(results, install_view):
+    global install_table_data, install_sort
+    if results is None:
         messagebox.showerror("Error", "Failed to search for packages")
         return
+    if not install_view.tree.winfo_exists():
+        return  # The install window was closed while searching
 
-    lines = result.stdout.splitlines()
-
-    # Skip header rows and separator lines
-    global install_table_data
-    install_table_data = []
-    header_skipped = False
-    for line in lines:
-        if not header_skipped:
-            if "Name" in line and "ID" in line and "Version" in line:
-                header_skipped = True  # Skip the header row
-            continue
+    install_table_data = results
+    install_sort = SortCache(install_table_data, columns_install)
 
-        if "----" in line or len(line.strip()) == 0:
-            continue  # Skip separator lines and empty lines
+    # Replace the table contents, only the rows in view are materialized
+    install_view.set_rows(install_table_data)
 
-        package_info = line.split()
-        if len(package_info) >= 5:  # Ensure we have at least 5 columns
-            install_table_data.append(package_info[:5])  # Name, ID, Version, Match, Source
-
-    # Clear and add new search results to the table
-    install_table.delete(*install_table.get_children())
-    for package in install_table_data:
-        install_table.insert("", "end", values=package)
+    # Warm the version cache so "Show Available Versions" opens instantly
+    executor.submit(inventory.prefetch_versions, [package[1] for package in results[:prefetch_count]], result_cache)
 
 # Function to install the selected package
-def install_selected_package(search_table):
-    selected_item = search_table.selection()
-    if selected_item:
-        item = search_table.item(selected_item)
-        package_id = item['values'][1]
-        command = ['winget', 'install', package_id]
-        if eula_var.get():
-            command.append('--accept-package-agreements')
-        run_winget_command(command, f"Installing {package_id}...")
+def install_selected_package(install_view):
+    selected_rows = install_view.selected_rows()
+    if selected_rows:
+        queue_jobs('install', [row[1] for row in selected_rows])
 
 # Function to clear the log
 def clear_log():
+    global log_oldest_shown
+    log_oldest_shown = time.time()  # Load Older continues from here
     log_text.config(state="normal")  # Enable the log box to clear text
     log_text.delete(1.0, tk.END)
+    while log_pieces:
+        log_text.mark_unset(log_pieces.pop()[0])
     log_text.config(state="disabled")  # Disable it again after clearing
 
+# Phases shown in the timing stats window
+stats_phases = ["spawn", "first_byte", "exit", "parse", "render"]
+
+# Function to format a p50/p95 pair of seconds for the stats table
+def format_timing(p50, p95):
+    if p50 is None:
+        return ""
+    return f"{p50:.2f} / {p95:.2f}"
+
+# Function to open the window with p50/p95 timings per winget command type
+def open_stats_window():
+    stats_window = tk.Toplevel(window)
+    stats_window.title("Timing Stats")
+
+    stats_columns = ["Command", "Runs", "Total"] + [phase.replace('_', ' ').title() for phase in stats_phases] + ["Slowest"]
+    stats_table = ttk.Treeview(stats_window, columns=stats_columns, show="headings", height=12)
+    for col in stats_columns:
+        stats_table.heading(col, text=col)
+        stats_table.column(col, width=90 if col != "Slowest" else 220)
+    stats_table.grid(row=0, column=0, columnspan=3, padx=10, pady=10, sticky="nsew")
+
+    tk.Label(stats_window, text="Seconds as p50 / p95 over the recent runs of each command").grid(
+        row=1, column=0, columnspan=3, padx=10, sticky="w")
+
+    # Function to fill the table from the current history
+    def refresh_stats():
+        stats_table.delete(*stats_table.get_children())
+        for kind, summary in timing.stats().items():
+            phases = [format_timing(**summary['phases'][phase]) if phase in summary['phases'] else ""
+                      for phase in stats_phases]
+            slowest = ", ".join(f"{run['label'] or kind} {run['total']:.1f}s" for run in summary['slowest'][:3])
+            stats_table.insert("", tk.END, values=[kind, summary['runs'], format_timing(summary['p50'], summary['p95'])]
+                               + phases + [slowest])
+
+    # Function to save the stats and the run history as JSON
+    def export_stats():
+        path = filedialog.asksaveasfilename(parent=stats_window, defaultextension=".json",
+                                            filetypes=[("JSON", "*.json")], initialfile="winget-timings.json")
+        if path:
+            timing.export(path)
+            append_log(f"Timing stats exported to {path}\n")
+
+    # Function to turn cProfile output for every measured run on or off
+    def toggle_profiling():
+        timing.profile_dir = os.path.join(app_data_dir(), 'profiles') if profile_var.get() else None
+        if timing.profile_dir:
+            append_log(f"Profiling winget runs to {timing.profile_dir}\n")
+
+    profile_var = tk.BooleanVar(value=timing.profile_dir is not None)
+    tk.Checkbutton(stats_window, text="Profile runs with cProfile", variable=profile_var,
+                   command=toggle_profiling).grid(row=2, column=0, padx=10, pady=10, sticky="w")
+    tk.Button(stats_window, text="Refresh", command=refresh_stats).grid(row=2, column=1, padx=5, pady=10, sticky="e")
+    tk.Button(stats_window, text="Export JSON", command=export_stats).grid(row=2, column=2, padx=10, pady=10, sticky="e")
+
+    stats_window.grid_columnconfigure(0, weight=1)
+    stats_window.grid_rowconfigure(0, weight=1)
+    refresh_stats()
+
 # Function to handle sorting columns
 def sort_column(col, reverse):
-    global original_data, columns  # Ensure we're using the correct columns reference
-    col_idx = columns.index(col)
+    global row_order, main_sort_order
+    if main_sort is None:
+        return  # Nothing loaded yet
 
-    # Function to ensure everything is converted to string for safe comparison
-    def convert(value):
-        try:
-            return str(value).lower()  # Convert all values to strings, ensuring case-insensitive comparison
-        except Exception:
-            return ''  # Handle cases where the value can't be converted
-
-    # Sort the original data
-    original_data.sort(key=lambda row: convert(row[col_idx]), reverse=reverse)
+    # The sort keys are computed once per data load, the rows keep their indices and item IDs
+    main_sort_order = (col, reverse)
+    row_order = main_sort.order(col, reverse)
 
-    # Clear the table and re-populate with sorted data
-    update_table.delete(*update_table.get_children())
-    for package in original_data:
-        update_table.insert("", "end", values=package)
+    # Reorder the existing items, keeping the current filter
+    apply_search_filter()
 
     # Toggle sorting order for the next click
     update_table.heading(col, command=lambda: sort_column(col, not reverse))
@@ -436,126 +989,266 @@ def open_settings_window():
     eula_checkbox = tk.Checkbutton(settings_window, variable=eula_var)
     eula_checkbox.grid(row=1, column=1, padx=5, pady=5, sticky="w")
 
+    # Parallel upgrade options used by "Update All Packages"
+    concurrency_label = tk.Label(settings_window, text="Parallel updates:")
+    concurrency_label.grid(row=2, column=0, padx=5, pady=5, sticky="e")
+    concurrency_spinbox = tk.Spinbox(settings_window, from_=1, to=16, width=5, textvariable=concurrency_var)
+    concurrency_spinbox.grid(row=2, column=1, padx=5, pady=5, sticky="w")
+
+    adaptive_label = tk.Label(settings_window, text="Tune to system load:")
+    adaptive_label.grid(row=3, column=0, padx=5, pady=5, sticky="e")
+    adaptive_checkbox = tk.Checkbutton(settings_window, variable=adaptive_var)
+    adaptive_checkbox.grid(row=3, column=1, padx=5, pady=5, sticky="w")
+
+    ordered_label = tk.Label(settings_window, text="Dependencies first:")
+    ordered_label.grid(row=4, column=0, padx=5, pady=5, sticky="e")
+    ordered_checkbox = tk.Checkbutton(settings_window, variable=ordered_var)
+    ordered_checkbox.grid(row=4, column=1, padx=5, pady=5, sticky="w")
+
+    timeout_label = tk.Label(settings_window, text="Timeout per package (min):")
+    timeout_label.grid(row=5, column=0, padx=5, pady=5, sticky="e")
+    timeout_spinbox = tk.Spinbox(settings_window, from_=1, to=240, width=5, textvariable=timeout_var)
+    timeout_spinbox.grid(row=5, column=1, padx=5, pady=5, sticky="w")
+
+    retries_label = tk.Label(settings_window, text="Retries:")
+    retries_label.grid(row=6, column=0, padx=5, pady=5, sticky="e")
+    retries_spinbox = tk.Spinbox(settings_window, from_=0, to=5, width=5, textvariable=retries_var)
+    retries_spinbox.grid(row=6, column=1, padx=5, pady=5, sticky="w")
+
+    # How long cached package lists are shown before winget is asked again
+    cache_ttl_label = tk.Label(settings_window, text="Cache lifetime (min):")
+    cache_ttl_label.grid(row=7, column=0, padx=5, pady=5, sticky="e")
+    cache_ttl_spinbox = tk.Spinbox(settings_window, from_=1, to=1440, width=5, textvariable=cache_ttl_var)
+    cache_ttl_spinbox.grid(row=7, column=1, padx=5, pady=5, sticky="w")
+
+    # Local catalog options for the Install window search
+    local_catalog_label = tk.Label(settings_window, text="Search local catalog:")
+    local_catalog_label.grid(row=8, column=0, padx=5, pady=5, sticky="e")
+    local_catalog_checkbox = tk.Checkbutton(settings_window, variable=local_catalog_var)
+    local_catalog_checkbox.grid(row=8, column=1, padx=5, pady=5, sticky="w")
+
+    update_catalog_button = tk.Button(settings_window, text="Update Local Catalog", command=update_local_catalog)
+    update_catalog_button.grid(row=9, column=0, padx=5, pady=5, sticky="e")
+    import_manifests_button = tk.Button(settings_window, text="Import Manifests...", command=import_manifest_folder)
+    import_manifests_button.grid(row=9, column=1, padx=5, pady=5, sticky="w")
+
     # Close button
     close_button = tk.Button(settings_window, text="Close", command=settings_window.destroy)
-    close_button.grid(row=2, column=0, columnspan=2, pady=10)
-
-# GUI Main Window Setup
-window = tk.Tk()
-window.title("Windows Package Manager")
-
-# Now we can define the BooleanVars after initializing the root window
-force_var = tk.BooleanVar(value=True)
-eula_var = tk.BooleanVar(value=True)
+    close_button.grid(row=10, column=0, columnspan=2, pady=10)
 
-# Define columns for the main table
-columns = ["Name", "ID", "Version", "Available Version", "Source"]
+# Function to create a Tk variable that mirrors a setting and saves it when changed
+def setting_var(var_type, name):
+    var = var_type(value=getattr(settings, name))
 
-# Scrollable frame for main table
-main_table_frame = tk.Frame(window)
-main_table_frame.grid(row=1, column=0, columnspan=5, padx=10, pady=10, sticky="nsew")
-
-# Scrollbar for main table
-main_table_scrollbar = tk.Scrollbar(main_table_frame, orient="vertical")
-main_table_scrollbar.grid(row=0, column=1, sticky='ns')
-
-# Treeview with scrollbar
-update_table = ttk.Treeview(main_table_frame, columns=columns, show='headings', yscrollcommand=main_table_scrollbar.set)
-main_table_scrollbar.config(command=update_table.yview)
-
-for col in columns:
-    update_table.heading(col, text=col, anchor="w", command=lambda _col=col: sort_column(_col, False))
-    update_table.column(col, anchor="w")
-
-update_table.grid(row=0, column=0, sticky="nsew")
-
-# Right-click binding for update_table
-update_table.bind("<Button-3>", on_right_click)
-
-# Configure grid weight for table resizing
-main_table_frame.grid_columnconfigure(0, weight=1)
-main_table_frame.grid_rowconfigure(0, weight=1)
-
-# Search field and label
-search_label = tk.Label(window, text="Search:")
-search_label.grid(row=0, column=0, padx=(10, 5), pady=10, sticky="e")
-
-search_field = tk.Entry(window)
-search_field.grid(row=0, column=1, padx=5, pady=10, sticky="we")
-
-# Bind the search function to the search field
-search_field.bind("<KeyRelease>", search_table)
-
-# Install New Package button
-install_button = tk.Button(window, text="Install New Package", command=open_install_window)
-install_button.grid(row=0, column=2, padx=(5, 5), pady=10, sticky="we")
-
-# Settings button
-settings_button = tk.Button(window, text="Settings", command=open_settings_window)
-settings_button.grid(row=0, column=3, padx=(5, 5), pady=10, sticky="we")
-
-# Remove the Log button since the log is now integrated
-# Alternatively, add a Toggle Log button (code provided below)
-
-# Configure grid weight for main window resizing
-window.grid_columnconfigure(1, weight=1)
-window.grid_rowconfigure(1, weight=1)
-
-# Create a LabelFrame to group the Update All Packages button and checkboxes
-frame = tk.LabelFrame(window, text="Package Actions", bg="lightgrey", padx=5, pady=5)
-frame.grid(row=2, column=0, columnspan=5, padx=10, pady=10, sticky="we")
-
-# Update all button
-update_all_button = tk.Button(frame, text="Update All Packages", command=update_all_packages)
-update_all_button.grid(row=0, column=0, padx=5, pady=5, sticky="w")
-
-# Show all packages checkbox
-show_all_var = tk.BooleanVar()
-show_all_checkbox = tk.Checkbutton(frame, text="Show all packages", variable=show_all_var, command=lambda: refresh_table(show_all_var.get()), bg="lightgrey")
-show_all_checkbox.grid(row=0, column=1, padx=5, pady=5, sticky="w")
-
-# Refresh button
-refresh_button = tk.Button(window, text="Refresh", command=lambda: refresh_table(show_all_var.get()))
-refresh_button.grid(row=3, column=0, padx=5, pady=10, sticky="w")
-
-# Available updates count label (right aligned)
-updates_count_label = tk.Label(window, text="Available Updates: 0")
-updates_count_label.grid(row=3, column=4, padx=10, pady=10, sticky="e")
-
-# Log frame at the bottom
-log_frame = tk.Frame(window)
-log_frame.grid(row=4, column=0, columnspan=5, padx=10, pady=5, sticky="nsew")
-
-# Log label
-log_label = tk.Label(log_frame, text="Log Output:")
-log_label.grid(row=0, column=0, padx=5, pady=5, sticky="w")
-
-# Create the scrolled text widget for the log
-log_text = scrolledtext.ScrolledText(log_frame, width=80, height=10)
-log_text.grid(row=1, column=0, columnspan=5, padx=5, pady=5, sticky="nsew")
-log_text.config(state="disabled")
-
-# Clear log button
-clear_log_button = tk.Button(log_frame, text="Clear Log", command=clear_log)
-clear_log_button.grid(row=0, column=1, padx=5, pady=5, sticky="e")
-
-# Configure grid weights to allow resizing
-window.grid_rowconfigure(4, weight=1)  # Allow the log frame to expand vertically
-window.grid_columnconfigure(0, weight=1)
-
-log_frame.grid_columnconfigure(0, weight=1)
-log_frame.grid_rowconfigure(1, weight=1)
-
-# Optionally, add a Toggle Log button
-def toggle_log():
-    if log_frame.winfo_viewable():
-        log_frame.grid_remove()
-    else:
-        log_frame.grid()
-        
-toggle_log_button = tk.Button(window, text="Toggle Log", command=toggle_log)
-toggle_log_button.grid(row=3, column=1, padx=5, pady=10, sticky="w")
-
-# Start application
-refresh_table()
-window.mainloop()
+    def write(*_):
+        try:
+            setattr(settings, name, var.get())
+        except tk.TclError:
+            return  # Half-typed spinbox value
+        settings.save()
+
+    var.trace_add('write', write)
+    return var
+
+# Function to build the main window and run the Tk mainloop
+def main():
+    global settings, package_cache, result_cache
+    global window, force_var, eula_var, concurrency_var, timeout_var, retries_var, cache_ttl_var, local_catalog_var
+    global adaptive_var, ordered_var
+    global update_table, main_view, search_field, show_all_var, updates_count_label, update_all_button
+    global log_frame, log_text, status_label, progress_bar, cancel_button
+    global command_log, log_package_var, log_status_var, job_queue
+
+    # Settings and caches are loaded here so importing this module has no side effects
+    settings = Settings.load()
+    package_cache = PackageCache(os.path.join(app_data_dir(), 'package_cache.json'))
+    result_cache = ResultCache(os.path.join(app_data_dir(), 'results'))
+    command_log = CommandLog(os.path.join(app_data_dir(), 'logs'))
+    runner.command_log = command_log
+    job_queue = JobQueue(os.path.join(app_data_dir(), 'jobs.json'), settings,
+                         lambda text: post_to_ui(append_log, text),
+                         lambda job: post_to_ui(on_job_changed, job), result_cache,
+                         lambda status: post_to_ui(set_command_status, status))
+
+    # GUI Main Window Setup
+    window = tk.Tk()
+    window.title("Windows Package Manager")
+
+    # Now we can define the Tk variables for the settings after initializing the root window
+    force_var = setting_var(tk.BooleanVar, 'force')
+    eula_var = setting_var(tk.BooleanVar, 'accept_eula')
+    concurrency_var = setting_var(tk.IntVar, 'concurrency')
+    timeout_var = setting_var(tk.IntVar, 'timeout_minutes')
+    retries_var = setting_var(tk.IntVar, 'retries')
+    cache_ttl_var = setting_var(tk.IntVar, 'cache_ttl_minutes')
+    local_catalog_var = setting_var(tk.BooleanVar, 'use_local_catalog')
+    adaptive_var = setting_var(tk.BooleanVar, 'adaptive_concurrency')
+    ordered_var = setting_var(tk.BooleanVar, 'order_by_dependencies')
+
+    # Scrollable frame for main table
+    main_table_frame = tk.Frame(window)
+    main_table_frame.grid(row=1, column=0, columnspan=5, padx=10, pady=10, sticky="nsew")
+
+    # Scrollbar for main table
+    main_table_scrollbar = tk.Scrollbar(main_table_frame, orient="vertical")
+    main_table_scrollbar.grid(row=0, column=1, sticky='ns')
+
+    # Treeview with scrollbar
+    update_table = ttk.Treeview(main_table_frame, columns=columns, show='headings', selectmode='extended')
+    main_view = VirtualTable(update_table, main_table_scrollbar)  # Wires up the scrollbar
+
+    for col in columns:
+        update_table.heading(col, text=col, anchor="w", command=lambda _col=col: sort_column(_col, False))
+        update_table.column(col, anchor="w")
+
+    update_table.grid(row=0, column=0, sticky="nsew")
+
+    # Right-click binding for update_table
+    update_table.bind("<Button-3>", on_right_click)
+
+    # Configure grid weight for table resizing
+    main_table_frame.grid_columnconfigure(0, weight=1)
+    main_table_frame.grid_rowconfigure(0, weight=1)
+
+    # Search field and label
+    search_label = tk.Label(window, text="Search:")
+    search_label.grid(row=0, column=0, padx=(10, 5), pady=10, sticky="e")
+
+    search_field = tk.Entry(window)
+    search_field.grid(row=0, column=1, padx=5, pady=10, sticky="we")
+
+    # Bind the search function to the search field
+    search_field.bind("<KeyRelease>", search_table)
+
+    # Install New Package button
+    install_button = tk.Button(window, text="Install New Package", command=open_install_window)
+    install_button.grid(row=0, column=2, padx=(5, 5), pady=10, sticky="we")
+
+    # Settings button
+    settings_button = tk.Button(window, text="Settings", command=open_settings_window)
+    settings_button.grid(row=0, column=3, padx=(5, 5), pady=10, sticky="we")
+
+    # Timing stats button
+    stats_button = tk.Button(window, text="Timing Stats", command=open_stats_window)
+    stats_button.grid(row=0, column=4, padx=(5, 10), pady=10, sticky="we")
+
+    # Remove the Log button since the log is now integrated
+    # Alternatively, add a Toggle Log button (code provided below)
+
+    # Configure grid weight for main window resizing
+    window.grid_columnconfigure(1, weight=1)
+    window.grid_rowconfigure(1, weight=1)
+
+    # Create a LabelFrame to group the Update All Packages button and checkboxes
+    frame = tk.LabelFrame(window, text="Package Actions", bg="lightgrey", padx=5, pady=5)
+    frame.grid(row=2, column=0, columnspan=5, padx=10, pady=10, sticky="we")
+
+    # Update all button
+    update_all_button = tk.Button(frame, text="Update All Packages", command=update_all_packages)
+    update_all_button.grid(row=0, column=0, padx=5, pady=5, sticky="w")
+
+    # Show all packages checkbox
+    show_all_var = tk.BooleanVar()
+    show_all_checkbox = tk.Checkbutton(frame, text="Show all packages", variable=show_all_var, command=lambda: refresh_table(show_all_var.get()), bg="lightgrey")
+    show_all_checkbox.grid(row=0, column=1, padx=5, pady=5, sticky="w")
+
+    # Job queue button
+    job_queue_button = tk.Button(frame, text="Job Queue", command=open_job_window)
+    job_queue_button.grid(row=0, column=2, padx=5, pady=5, sticky="w")
+
+    # Refresh button
+    refresh_button = tk.Button(window, text="Refresh", command=lambda: refresh_table(show_all_var.get(), force=True))
+    refresh_button.grid(row=3, column=0, padx=5, pady=10, sticky="w")
+
+    # Available updates count label (right aligned)
+    updates_count_label = tk.Label(window, text="Available Updates: 0")
+    updates_count_label.grid(row=3, column=4, padx=10, pady=10, sticky="e")
+
+    # Log frame at the bottom
+    log_frame = tk.Frame(window)
+    log_frame.grid(row=4, column=0, columnspan=5, padx=10, pady=5, sticky="nsew")
+
+    # Log label
+    log_label = tk.Label(log_frame, text="Log Output:")
+    log_label.grid(row=0, column=0, padx=5, pady=5, sticky="w")
+
+    # Create the scrolled text widget for the log
+    log_text = scrolledtext.ScrolledText(log_frame, width=80, height=10)
+    log_text.grid(row=1, column=0, columnspan=7, padx=5, pady=5, sticky="nsew")
+    log_text.config(state="disabled")
+
+    # Filter the command records by package ID and result, live output resumes when both are empty
+    tk.Label(log_frame, text="Package:").grid(row=0, column=1, padx=5, pady=5, sticky="e")
+    log_package_var = tk.StringVar()
+    log_package_entry = tk.Entry(log_frame, textvariable=log_package_var, width=20)
+    log_package_entry.grid(row=0, column=2, padx=5, pady=5)
+    log_package_entry.bind("<Return>", apply_log_filter)
+
+    tk.Label(log_frame, text="Status:").grid(row=0, column=3, padx=5, pady=5, sticky="e")
+    log_status_var = tk.StringVar()
+    log_status_box = ttk.Combobox(log_frame, textvariable=log_status_var, width=8, state="readonly",
+                                  values=("", "success", "failed", "timeout"))
+    log_status_box.grid(row=0, column=4, padx=5, pady=5)
+    log_status_box.bind("<<ComboboxSelected>>", apply_log_filter)
+
+    # Load older command records from the log files
+    load_older_button = tk.Button(log_frame, text="Load Older", command=load_older_log)
+    load_older_button.grid(row=0, column=5, padx=5, pady=5, sticky="e")
+
+    # Clear log button
+    clear_log_button = tk.Button(log_frame, text="Clear Log", command=clear_log)
+    clear_log_button.grid(row=0, column=6, padx=5, pady=5, sticky="e")
+
+    # Configure grid weights to allow resizing
+    window.grid_rowconfigure(4, weight=1)  # Allow the log frame to expand vertically
+    window.grid_columnconfigure(0, weight=1)
+
+    log_frame.grid_columnconfigure(0, weight=1)
+    log_frame.grid_rowconfigure(1, weight=1)
+
+    # Optionally, add a Toggle Log button
+    def toggle_log():
+        if log_frame.winfo_viewable():
+            log_frame.grid_remove()
+        else:
+            log_frame.grid()
+
+    toggle_log_button = tk.Button(window, text="Toggle Log", command=toggle_log)
+    toggle_log_button.grid(row=3, column=1, padx=5, pady=10, sticky="w")
+
+    # Progress indicator for background winget calls
+    progress_frame = tk.Frame(window)
+    progress_frame.grid(row=3, column=2, columnspan=2, padx=5, pady=10, sticky="we")
+
+    status_label = tk.Label(progress_frame, text="Ready")
+    status_label.grid(row=0, column=0, padx=5, sticky="w")
+
+    progress_bar = ttk.Progressbar(progress_frame, mode="indeterminate", length=120)
+    progress_bar.grid(row=0, column=1, padx=5, sticky="we")
+
+    # Cancel button terminates the running winget processes
+    cancel_button = tk.Button(progress_frame, text="Cancel", command=cancel_running_commands, state="disabled")
+    cancel_button.grid(row=0, column=2, padx=5)
+
+    progress_frame.grid_columnconfigure(1, weight=1)
+
+    # Function to stop running winget processes before closing the window
+    def on_close():
+        job_queue.stop()  # Jobs that are still running are queued again on the next start
+        runner.cancel_running_processes()
+        executor.shutdown(wait=False, cancel_futures=True)
+        window.destroy()
+
+    window.protocol("WM_DELETE_WINDOW", on_close)
+
+    # Start application, the first refresh runs once the window has been drawn
+    window.after(50, process_ui_queue)
+    window.after_idle(refresh_table)
+    pending = sum(1 for job in job_queue.snapshot() if job['state'] == 'queued')
+    if pending:
+        append_log(f"{pending} job(s) restored from the last session" + (" (queue paused)\n" if job_queue.paused else "\n"))
+    job_queue.start()
+    window.mainloop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""Headless core of the Windows Package Manager GUI: winget runner, parsers, inventory model and settings.
+
+Submodules only import the standard library and are imported on demand, the Tk front end lives in
+updateapps.py.
+"""
@@ -0,0 +1,5 @@
+import sys
+
+from wpm.cli import main
+
+sys.exit(main())
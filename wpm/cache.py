@@ -0,0 +1,132 @@
+"""On-disk caches for the package lists and for winget query results."""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class PackageCache:
+    """Last update list and inventory, persisted so the window can paint before winget answers.
+
+    Entries are {'time', 'ttl', 'packages'} keyed by 'updates' or 'all'.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()  # Worker threads and the Tk thread must not share the temp file
+        self.generation = 0  # Incremented on invalidation so in-flight fetches do not store stale data
+        self.entries = self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as cache:
+                return json.load(cache)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        with self.save_lock:
+            with self.lock:
+                data = json.dumps(self.entries, separators=(',', ':'))
+            temp_file = self.path + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as cache:
+                cache.write(data)
+            os.replace(temp_file, self.path)  # Never leave a half-written cache behind
+
+    def get(self, key):
+        """Return the cache entry for key or None."""
+        with self.lock:
+            return self.entries.get(key)
+
+    @staticmethod
+    def is_stale(entry):
+        return time.time() - entry['time'] > entry['ttl']
+
+    def store(self, key, packages, ttl, generation):
+        """Store freshly fetched packages unless the cache was invalidated since generation was read."""
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = {'time': time.time(), 'ttl': ttl, 'packages': packages}
+        self.save()
+
+    def invalidate(self):
+        """Drop all cached package lists after a command changed the installed packages."""
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+        self.save()
+
+class ResultCache:
+    """LRU cache of winget query results that spills evicted entries to disk instead of dropping them."""
+
+    def __init__(self, directory, max_entries=64, max_files=512, max_age=6 * 3600):
+        self.directory = directory
+        self.max_entries = max_entries  # Entries kept in memory
+        self.max_files = max_files      # Entries kept on disk
+        self.max_age = max_age          # Seconds before an entry is fetched again
+        self.entries = OrderedDict()    # key -> (time, value), least recently used first
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        """Return the cached value for key, or None when it is missing or too old."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is None:
+            entry = self.load_spilled(key)
+            if entry is not None:
+                self.put(key, entry[1], entry[0])
+        if entry is None or time.time() - entry[0] > self.max_age:
+            return None
+        return entry[1]
+
+    def put(self, key, value, stored_at=None):
+        with self.lock:
+            self.entries[key] = (stored_at or time.time(), value)
+            self.entries.move_to_end(key)
+            evicted = []
+            while len(self.entries) > self.max_entries:
+                evicted.append(self.entries.popitem(last=False))
+        for evicted_key, entry in evicted:
+            self.spill(evicted_key, entry)
+
+    def spill_path(self, key):
+        digest = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.json')
+
+    def spill(self, key, entry):
+        stored_at, value = entry
+        if time.time() - stored_at > self.max_age:
+            return  # Not worth keeping
+        try:
+            with open(self.spill_path(key), 'w', encoding='utf-8') as spill_file:
+                json.dump({'time': stored_at, 'value': value}, spill_file)
+            self.prune()
+        except OSError:
+            pass  # The cache is best effort
+
+    def load_spilled(self, key):
+        try:
+            with open(self.spill_path(key), encoding='utf-8') as spill_file:
+                data = json.load(spill_file)
+        except (OSError, ValueError):
+            return None
+        return data['time'], data['value']
+
+    def prune(self):
+        # Drop expired files, then the oldest ones while there are too many
+        files = []
+        for entry in os.scandir(self.directory):
+            age = time.time() - entry.stat().st_mtime
+            if age > self.max_age:
+                os.remove(entry.path)
+            else:
+                files.append((age, entry.path))
+        files.sort()
+        for _, path in files[self.max_files:]:
+            os.remove(path)
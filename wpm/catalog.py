@@ -0,0 +1,279 @@
+"""Local mirror of the winget community catalog for offline, indexed search."""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import urllib.request
+import zipfile
+
+from wpm.tables import version_sort_key
+
+# Community source published by winget, index.db inside is the catalog winget itself searches
+winget_source_url = 'https://cdn.winget.microsoft.com/cache/source.msix'
+
+# Manifest keys the local catalog indexes
+manifest_fields = ('PackageIdentifier', 'PackageVersion', 'PackageName', 'Moniker', 'Tags', 'Commands')
+
+# Function to read the indexed keys from a winget YAML manifest without a YAML library
+def read_manifest_fields(path):
+    fields = {}
+    list_key = None
+    with open(path, encoding='utf-8-sig') as manifest:
+        for raw in manifest:
+            line = raw.split(' #')[0].strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('- '):
+                if list_key is not None:
+                    fields[list_key].append(line[2:].strip().strip('"\''))
+                continue
+            list_key = None
+            key, _, value = line.partition(':')
+            if key in manifest_fields and key not in fields:
+                value = value.strip().strip('"\'')
+                if value:
+                    fields[key] = value
+                else:
+                    fields[key] = []  # A list follows
+                    list_key = key
+    return fields
+
+class LocalCatalog:
+    """SQLite mirror of the winget community catalog with a trigram full-text index for substring search."""
+
+    def __init__(self, path):
+        self.path = path
+        conn = self.connect()
+        try:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS packages(
+                    rowid INTEGER PRIMARY KEY, id TEXT UNIQUE, name TEXT, moniker TEXT,
+                    version TEXT, tags TEXT, commands TEXT, hash TEXT);
+                CREATE TABLE IF NOT EXISTS manifest_files(
+                    path TEXT PRIMARY KEY, mtime REAL, size INTEGER, package_id TEXT, version TEXT, fields TEXT);
+                CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value TEXT);
+            ''')
+            try:
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS packages_fts USING fts5("
+                             "id, name, moniker, tags, commands, tokenize='trigram')")
+                self.fts = True
+            except sqlite3.OperationalError:
+                self.fts = False  # Older SQLite without FTS5 trigrams, search falls back to LIKE
+            conn.commit()
+        finally:
+            conn.close()
+
+    def connect(self):
+        # One short-lived connection per call, the catalog is used from worker threads
+        return sqlite3.connect(self.path)
+
+    def package_count(self):
+        conn = self.connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM packages").fetchone()[0]
+        finally:
+            conn.close()
+
+    def apply_packages(self, conn, packages, replace_all):
+        """Write changed packages only, returns (changed, removed) counts."""
+        existing = dict(conn.execute("SELECT id, hash FROM packages"))
+        changed = 0
+        for package_id, (name, moniker, version, tags, commands) in packages.items():
+            row_hash = hashlib.sha1('\x1f'.join((name, moniker, version, tags, commands)).encode('utf-8')).hexdigest()
+            if existing.get(package_id) == row_hash:
+                continue
+            changed += 1
+            conn.execute("INSERT INTO packages(id, name, moniker, version, tags, commands, hash) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                         "ON CONFLICT(id) DO UPDATE SET name=excluded.name, moniker=excluded.moniker, "
+                         "version=excluded.version, tags=excluded.tags, commands=excluded.commands, hash=excluded.hash",
+                         (package_id, name, moniker, version, tags, commands, row_hash))
+            if self.fts:
+                rowid = conn.execute("SELECT rowid FROM packages WHERE id = ?", (package_id,)).fetchone()[0]
+                conn.execute("DELETE FROM packages_fts WHERE rowid = ?", (rowid,))
+                conn.execute("INSERT INTO packages_fts(rowid, id, name, moniker, tags, commands) VALUES (?, ?, ?, ?, ?, ?)",
+                             (rowid, package_id, name, moniker, tags, commands))
+        removed = [package_id for package_id in existing if package_id not in packages] if replace_all else []
+        for package_id in removed:
+            self.remove_package(conn, package_id)
+        return changed, len(removed)
+
+    def remove_package(self, conn, package_id):
+        row = conn.execute("SELECT rowid FROM packages WHERE id = ?", (package_id,)).fetchone()
+        if row is None:
+            return
+        conn.execute("DELETE FROM packages WHERE rowid = ?", row)
+        if self.fts:
+            conn.execute("DELETE FROM packages_fts WHERE rowid = ?", row)
+
+    def update_from_source(self, url=winget_source_url):
+        """Download source.msix and apply the packages whose entries changed, returns a summary."""
+        fd, msix_path = tempfile.mkstemp(suffix='.msix')
+        os.close(fd)
+        try:
+            urllib.request.urlretrieve(url, msix_path)
+            with open(msix_path, 'rb') as msix:
+                digest = hashlib.sha256(msix.read()).hexdigest()
+            if digest == self.get_meta('source_hash'):
+                return "Local catalog is up to date"
+            with zipfile.ZipFile(msix_path) as msix, tempfile.TemporaryDirectory() as temp_dir:
+                index_path = msix.extract('Public/index.db', temp_dir)
+                summary = self.import_index(index_path)
+            self.set_meta('source_hash', digest)
+            return summary
+        finally:
+            os.remove(msix_path)
+
+    def import_index(self, index_path):
+        """Import winget's index.db (schema v1 manifest tables or v2 packages table)."""
+        source = sqlite3.connect(index_path)
+        try:
+            tables = {row[0] for row in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            packages = {}
+            if 'manifest' in tables:
+                extras = {}
+                for kind, table in (('tags', 'tags'), ('commands', 'commands')):
+                    query = f"SELECT m.manifest, t.{table[:-1]} FROM {table}_map m JOIN {table} t ON m.{table[:-1]} = t.rowid"
+                    for manifest_rowid, value in source.execute(query):
+                        extras.setdefault((kind, manifest_rowid), []).append(value)
+                query = ("SELECT m.rowid, i.id, n.name, COALESCE(mo.moniker, ''), v.version FROM manifest m "
+                         "JOIN ids i ON m.id = i.rowid JOIN names n ON m.name = n.rowid "
+                         "LEFT JOIN monikers mo ON m.moniker = mo.rowid JOIN versions v ON m.version = v.rowid")
+                for manifest_rowid, package_id, name, moniker, version in source.execute(query):
+                    current = packages.get(package_id)
+                    if current is None or version_sort_key(version) > version_sort_key(current[2]):
+                        tags = '\n'.join(extras.get(('tags', manifest_rowid), []))
+                        commands = '\n'.join(extras.get(('commands', manifest_rowid), []))
+                        packages[package_id] = (name, moniker, version, tags, commands)
+            else:
+                query = "SELECT id, name, COALESCE(moniker, ''), latest_version FROM packages"
+                for package_id, name, moniker, version in source.execute(query):
+                    packages[package_id] = (name, moniker, version, '', '')
+        finally:
+            source.close()
+
+        conn = self.connect()
+        try:
+            changed, removed = self.apply_packages(conn, packages, replace_all=True)
+            conn.commit()
+        finally:
+            conn.close()
+        return f"Local catalog: {len(packages)} packages, {changed} updated, {removed} removed"
+
+    def import_manifests(self, root):
+        """Import a winget-pkgs style manifest tree, parsing only files that changed since the last import."""
+        conn = self.connect()
+        try:
+            known = {path: (mtime, size) for path, mtime, size in conn.execute("SELECT path, mtime, size FROM manifest_files")}
+            seen = set()
+            affected = set()
+            for directory, _, files in os.walk(root):
+                for file_name in files:
+                    if not file_name.endswith('.yaml'):
+                        continue
+                    path = os.path.join(directory, file_name)
+                    stat = os.stat(path)
+                    seen.add(path)
+                    if known.get(path) == (stat.st_mtime, stat.st_size):
+                        continue
+                    fields = read_manifest_fields(path)
+                    package_id = fields.get('PackageIdentifier')
+                    if not package_id:
+                        continue
+                    old = conn.execute("SELECT package_id FROM manifest_files WHERE path = ?", (path,)).fetchone()
+                    if old:
+                        affected.add(old[0])
+                    affected.add(package_id)
+                    conn.execute("INSERT OR REPLACE INTO manifest_files VALUES (?, ?, ?, ?, ?, ?)",
+                                 (path, stat.st_mtime, stat.st_size, package_id, fields.get('PackageVersion', ''), json.dumps(fields)))
+            for path in known.keys() - seen:
+                old = conn.execute("SELECT package_id FROM manifest_files WHERE path = ?", (path,)).fetchone()
+                affected.add(old[0])
+                conn.execute("DELETE FROM manifest_files WHERE path = ?", (path,))
+
+            # Rebuild the catalog rows of the affected packages from their latest version's files
+            packages = {}
+            for package_id in affected:
+                files = conn.execute("SELECT path, version, fields FROM manifest_files WHERE package_id = ?", (package_id,)).fetchall()
+                if not files:
+                    self.remove_package(conn, package_id)
+                    continue
+                latest = max((version for _, version, _ in files), key=version_sort_key)
+                # Prefer the version/singleton manifest and the en-US locale when files disagree
+                files.sort(key=lambda file: ('.locale.' in file[0] and '.locale.en-US.' not in file[0], file[0]))
+                merged = {}
+                for _, version, fields in files:
+                    if version == latest:
+                        for key, value in json.loads(fields).items():
+                            merged.setdefault(key, value)
+                packages[package_id] = (merged.get('PackageName', package_id), merged.get('Moniker', ''), latest,
+                                        '\n'.join(merged.get('Tags', [])), '\n'.join(merged.get('Commands', [])))
+            changed, _ = self.apply_packages(conn, packages, replace_all=False)
+            conn.commit()
+        finally:
+            conn.close()
+        return f"Local catalog: {changed} packages updated from {len(affected)} changed manifests"
+
+    def get_meta(self, key):
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def set_meta(self, key, value):
+        conn = self.connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def search(self, query, limit=500):
+        """Return [Name, ID, Version, Match, Source] rows ranked the way winget orders its matches."""
+        needle = query.casefold()
+        if not needle:
+            return []
+        conn = self.connect()
+        try:
+            columns = "p.id, p.name, p.moniker, p.version, p.tags, p.commands"
+            if self.fts and len(needle) >= 3:
+                phrase = '"' + query.replace('"', '""') + '"'
+                rows = conn.execute(f"SELECT {columns} FROM packages_fts f JOIN packages p ON p.rowid = f.rowid "
+                                    "WHERE packages_fts MATCH ?", (phrase,)).fetchall()
+            else:
+                pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                rows = conn.execute(f"SELECT {columns} FROM packages p WHERE p.id LIKE ?1 ESCAPE '\\' OR p.name LIKE ?1 ESCAPE '\\' "
+                                    "OR p.moniker LIKE ?1 ESCAPE '\\' OR p.tags LIKE ?1 ESCAPE '\\' OR p.commands LIKE ?1 ESCAPE '\\'",
+                                    (pattern,)).fetchall()
+        finally:
+            conn.close()
+
+        ranked = []
+        for package_id, name, moniker, version, tags, commands in rows:
+            rank, match = self.match_rank(needle, package_id, name, moniker, tags.split('\n'), commands.split('\n'))
+            if rank is not None:
+                ranked.append((rank, name.casefold(), [name, package_id, version, match, 'winget']))
+        ranked.sort(key=lambda entry: entry[:2])
+        return [row for _, _, row in ranked[:limit]]
+
+    @staticmethod
+    def match_rank(needle, package_id, name, moniker, tags, commands):
+        # Exact matches before substring matches, ID and name before moniker, command and tag,
+        # only matches outside ID and name are shown in the Match column, like winget does
+        fields = [('', package_id), ('', name), ('Moniker', moniker)]
+        fields += [('Command', command) for command in commands if command]
+        fields += [('Tag', tag) for tag in tags if tag]
+        best = None
+        for position, (label, value) in enumerate(fields):
+            folded = value.casefold()
+            if folded == needle:
+                rank = position if position < 3 else 3
+            elif needle in folded:
+                rank = 10 + (position if position < 3 else 3)
+            else:
+                continue
+            if best is None or rank < best[0]:
+                best = (rank, f"{label}: {value}" if label else '')
+        return best if best is not None else (None, '')
@@ -0,0 +1,329 @@
+"""Command line and daemon entry points for unattended, GUI-less package maintenance."""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from wpm import inventory, runner, scheduler, timing
+from wpm.cache import PackageCache, ResultCache
+from wpm.commandlog import CommandLog
+from wpm.commands import build_update_command
+from wpm.settings import Settings, app_data_dir
+from wpm.snapshots import SnapshotStore, build_plan, compare_fleet, diff_snapshots, save_inventory, snapshot_root
+
+# Function to format a timestamp for the JSON output
+def timestamp(seconds=None):
+    return datetime.fromtimestamp(seconds or time.time(), timezone.utc).isoformat(timespec='seconds')
+
+# Function to run upgrades for the given update rows and build the JSON report
+def run_upgrades(packages, settings, log):
+    jobs = [(package[1], build_update_command(package[1], settings)) for package in packages]
+    started = time.time()
+    runner.cancel_event.clear()
+    results, elapsed = scheduler.run_upgrade_batch(jobs, max(1, settings.concurrency),
+                                                   max(1, settings.timeout_minutes) * 60,
+                                                   max(0, settings.retries), log, settings.adaptive_concurrency,
+                                                   ResultCache(os.path.join(app_data_dir(), 'results')),
+                                                   settings.order_by_dependencies,
+                                                   {package[1]: package[3] for package in packages})
+    if results:
+        # The GUI's cached package lists no longer match what is installed
+        PackageCache(os.path.join(app_data_dir(), 'package_cache.json')).invalidate()
+        inventory.invalidate_installed()
+
+    latencies = [float(row[3]) for row in results]
+    succeeded = sum(1 for row in results if row[1] == "Updated")
+    return {
+        'started': timestamp(started),
+        'elapsed_seconds': round(elapsed, 2),
+        'packages': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'throughput_per_minute': round(len(results) / elapsed * 60, 2) if elapsed else None,
+        'latency_seconds': {
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            'p50': timing.percentile(latencies, 50),
+            'p95': timing.percentile(latencies, 95),
+            'max': max(latencies, default=None),
+        },
+        'results': [{'id': package_id, 'result': result, 'attempts': attempts,
+                     'duration_seconds': float(duration), 'return_code': returncode}
+                    for package_id, result, attempts, duration, returncode in results],
+        'timings': timing.stats(),
+    }
+
+# Function to save a snapshot of freshly listed packages, returns None when winget listed nothing
+def save_snapshot(packages, settings):
+    saved = save_inventory(packages, settings)
+    if saved is None:
+        return None
+    snapshot, path, changed = saved
+    return {'hash': snapshot.hash, 'machine': snapshot.machine, 'packages': len(snapshot.rows),
+            'path': path, 'changed': changed}
+
+# Function to print why a command failed as JSON on stdout, returns the exit code of failed commands
+def print_error(message):
+    print(json.dumps({'error': message}, indent=2))
+    return 1
+
+# Function to turn a diff into JSON objects with the counts in front of the package lists
+def diff_report(diff):
+    records = lambda rows: [dict(zip(('id', 'version', 'name', 'source'), row)) for row in rows]
+    return {'added_count': len(diff['added']), 'removed_count': len(diff['removed']),
+            'changed_count': len(diff['changed']), 'added': records(diff['added']),
+            'removed': records(diff['removed']), 'changed': diff['changed']}
+
+# Function to turn update rows into JSON objects
+def package_records(packages):
+    return [dict(zip(('name', 'id', 'version', 'available', 'source'), package)) for package in packages]
+
+class Daemon:
+    """Checks for updates on a schedule, optionally upgrades, and reports its status over HTTP."""
+
+    def __init__(self, settings, interval, upgrade, log):
+        self.settings = settings
+        self.interval = interval  # Seconds between checks
+        self.upgrade = upgrade
+        self.log = log
+        self.lock = threading.Lock()
+        self.wake = threading.Event()  # Set by POST /run to check right away
+        self.status = {'state': 'idle', 'started': timestamp(), 'last_check': None,
+                       'next_check': None, 'updates': [], 'last_run': None}
+
+    def update_status(self, **values):
+        with self.lock:
+            self.status.update(values)
+
+    def snapshot(self):
+        with self.lock:
+            status = json.loads(json.dumps(self.status))
+        status['timings'] = timing.stats()
+        return status
+
+    def run_once(self):
+        self.update_status(state='checking')
+        packages = inventory.get_available_updates()
+        if packages is None:
+            self.log("Check failed: winget upgrade failed\n")
+            self.update_status(state='idle', last_check=timestamp(), last_error="winget upgrade failed")
+            return
+        self.update_status(last_check=timestamp(), updates=package_records(packages), last_error=None)
+        if self.upgrade and packages:
+            self.update_status(state='upgrading')
+            self.update_status(last_run=run_upgrades(packages, self.settings, self.log))
+        self.update_status(state='idle')
+
+    def run_forever(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                self.log(f"Check failed: {e}\n")
+                self.update_status(state='idle', last_error=str(e))
+            next_check = time.time() + self.interval
+            self.update_status(next_check=timestamp(next_check))
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+    def serve(self, port):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # Only the daemon needs it
+
+        daemon = self
+
+        class StatusHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if not self.trusted_host():
+                    self.send_json(403, {'error': 'forbidden'})
+                elif self.path.rstrip('/') in ('', '/status'):
+                    self.send_json(200, daemon.snapshot())
+                else:
+                    self.send_json(404, {'error': 'not found'})
+
+            def do_POST(self):
+                if not self.trusted_request():
+                    self.send_json(403, {'error': 'forbidden'})
+                elif self.path.rstrip('/') == '/run':
+                    daemon.wake.set()
+                    self.send_json(202, {'state': 'scheduled'})
+                else:
+                    self.send_json(404, {'error': 'not found'})
+
+            def trusted_host(self):
+                # A page that rebinds its own domain to 127.0.0.1 still sends its own Host header
+                host = (self.headers.get('Host') or '').rsplit(':', 1)[0]
+                return host in ('127.0.0.1', 'localhost', '[::1]')
+
+            def trusted_request(self):
+                # Browsers send Origin with cross-site requests, and a JSON content type cannot be
+                # sent from a page without a CORS preflight, which this server never answers
+                content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+                return (self.trusted_host() and self.headers.get('Origin') is None
+                        and content_type == 'application/json')
+
+            def send_json(self, code, data):
+                body = json.dumps(data, indent=2).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep stderr for winget output
+
+        # Only reachable from the machine itself
+        server = ThreadingHTTPServer(('127.0.0.1', port), StatusHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+# Function to build the argument parser
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m wpm', description="Headless winget package maintenance.")
+    parser.add_argument('--force', action=argparse.BooleanOptionalAction, default=None,
+                        help="Pass --force to winget (default: saved setting)")
+    parser.add_argument('--accept-eula', action=argparse.BooleanOptionalAction, default=None,
+                        help="Accept package agreements (default: saved setting)")
+    parser.add_argument('--concurrency', type=int, help="Parallel upgrades (default: saved setting)")
+    parser.add_argument('--adaptive', action=argparse.BooleanOptionalAction, default=None,
+                        help="Tune the parallel upgrades up to --concurrency to system load (default: saved setting)")
+    parser.add_argument('--ordered', action=argparse.BooleanOptionalAction, default=None,
+                        help="Upgrade dependencies before the packages that need them (default: saved setting)")
+    parser.add_argument('--timeout', type=int, help="Per-package timeout in minutes (default: saved setting)")
+    parser.add_argument('--retries', type=int, help="Retries of a failed upgrade (default: saved setting)")
+    parser.add_argument('--quiet', action='store_true', help="Do not echo winget output to stderr")
+    parser.add_argument('--profile', metavar='DIR', help="Write a cProfile .prof file per winget run to DIR")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    check = commands.add_parser('check', help="Print the available updates as JSON")
+    check.add_argument('--all', action='store_true', help="List all installed packages instead")
+
+    upgrade = commands.add_parser('upgrade', help="Upgrade packages in parallel and print a JSON report")
+    upgrade.add_argument('--id', action='append', dest='ids', metavar='ID', help="Only upgrade these package IDs")
+
+    daemon = commands.add_parser('daemon', help="Check on a schedule and serve the status over HTTP")
+    daemon.add_argument('--interval', type=int, default=240, help="Minutes between checks (default: 240)")
+    daemon.add_argument('--port', type=int, default=8765, help="Status port on 127.0.0.1 (default: 8765)")
+    daemon.add_argument('--upgrade', action='store_true', help="Upgrade everything after each check")
+
+    # Snapshot references are a file, a hash, a machine name or machine@ISO-time (latest before it)
+    snapshot = commands.add_parser('snapshot', help="Save a snapshot of the installed packages")
+    snapshot.add_argument('--dir', help="Snapshot folder, e.g. a fleet share (default: saved setting)")
+
+    diff = commands.add_parser('diff', help="Print the packages added, removed and changed between two snapshots")
+    diff.add_argument('old', help="Snapshot file, hash, machine or machine@time")
+    diff.add_argument('new', nargs='?', help="Snapshot to compare with (default: installed packages now)")
+    diff.add_argument('--dir', help="Snapshot folder (default: saved setting)")
+
+    fleet = commands.add_parser('fleet', help="Compare the latest snapshot of every machine with a target")
+    fleet.add_argument('target', help="Snapshot file, hash, machine or machine@time")
+    fleet.add_argument('--before', metavar='TIME', help="Use each machine's snapshot in effect before TIME")
+    fleet.add_argument('--dir', help="Snapshot folder (default: saved setting)")
+
+    plan = commands.add_parser('plan', help="Print the winget commands that bring this machine to a target snapshot")
+    plan.add_argument('target', help="Snapshot file, hash, machine or machine@time")
+    plan.add_argument('--uninstall-extra', action='store_true', help="Also uninstall packages the target lacks")
+    plan.add_argument('--dir', help="Snapshot folder (default: saved setting)")
+    return parser
+
+# Function to apply command line overrides on top of the saved settings
+def load_settings(args):
+    settings = Settings.load()
+    settings.path = None  # Overrides are for this run only
+    overrides = {'force': args.force, 'accept_eula': args.accept_eula, 'concurrency': args.concurrency,
+                 'adaptive_concurrency': args.adaptive, 'order_by_dependencies': args.ordered,
+                 'timeout_minutes': args.timeout, 'retries': args.retries}
+    for name, value in overrides.items():
+        if value is not None:
+            setattr(settings, name, value)
+    return settings
+
+# Function to run the snapshot, diff, fleet and plan commands, returns the process exit code
+def run_snapshot_command(args, settings):
+    if args.dir:
+        settings.snapshot_dir = args.dir
+    store = SnapshotStore(snapshot_root(settings))
+
+    def current():
+        packages = inventory.list_all_packages()
+        if not packages:
+            raise KeyError("winget list failed")
+        return store.save(packages)[0]
+
+    try:
+        if args.command == 'snapshot':
+            saved = save_snapshot(inventory.list_all_packages(), settings)
+            if saved is None:
+                raise KeyError("winget list failed")
+            print(json.dumps(saved, indent=2))
+        elif args.command == 'diff':
+            old = store.load(args.old)
+            new = store.load(args.new) if args.new else current()
+            print(json.dumps(dict({'old': old.hash, 'new': new.hash}, **diff_report(diff_snapshots(old, new))),
+                             indent=2, ensure_ascii=False))
+        elif args.command == 'fleet':
+            target = store.load(args.target)
+            machines = compare_fleet(store, target, args.before)
+            groups = {}
+            for machine, diff in machines.items():
+                if diff is not None:
+                    groups.setdefault(diff['hash'], []).append(machine)
+            report = {'target': target.hash, 'in_sync': groups.get(target.hash, []), 'groups': groups,
+                      'machines': {machine: diff and diff_report(diff) for machine, diff in machines.items()}}
+            print(json.dumps(report, indent=2, ensure_ascii=False))
+        else:
+            target = store.load(args.target)
+            steps, unmanaged = build_plan(current(), target, settings, args.uninstall_extra)
+            print(json.dumps({'target': target.hash, 'steps': steps, 'unmanaged': unmanaged},
+                             indent=2, ensure_ascii=False))
+    except (KeyError, OSError) as e:
+        return print_error(e.args[0] if isinstance(e, KeyError) else str(e))
+    return 0
+
+# Function to run the command line interface, returns the process exit code
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    settings = load_settings(args)
+    runner.command_log = CommandLog(os.path.join(app_data_dir(), 'logs'))
+    timing.profile_dir = args.profile
+    log = (lambda text: None) if args.quiet else (lambda text: (sys.stderr.write(text), sys.stderr.flush()))
+
+    if args.command == 'check':
+        if args.all:
+            packages = inventory.list_all_packages()
+            try:
+                save_snapshot(packages, settings)
+            except OSError as e:
+                # An unreachable share must not cost the package list
+                sys.stderr.write(f"Could not save the inventory snapshot: {e}\n")
+        else:
+            packages = inventory.get_available_updates()
+        if packages is None:
+            return print_error(f"winget {'list' if args.all else 'upgrade'} failed")
+        print(json.dumps(package_records(packages), indent=2))
+        return 0
+
+    if args.command in ('snapshot', 'diff', 'fleet', 'plan'):
+        return run_snapshot_command(args, settings)
+
+    if args.command == 'upgrade':
+        packages = inventory.get_available_updates()
+        if packages is None:
+            return print_error("winget upgrade failed")
+        if args.ids:
+            wanted = set(args.ids)
+            packages = [package for package in packages if package[1] in wanted]
+        report = run_upgrades(packages, settings, log)
+        print(json.dumps(report, indent=2))
+        return 0 if report['failed'] == 0 else 1
+
+    daemon = Daemon(settings, args.interval * 60, args.upgrade, log)
+    daemon.serve(args.port)
+    log(f"Serving status on http://127.0.0.1:{args.port}/status\n")
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        runner.cancel_running_processes()
+    return 0
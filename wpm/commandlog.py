@@ -0,0 +1,116 @@
+"""Structured record of every winget command, written as JSON lines to size-rotated files."""
+import json
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+# Only the end of very long command output is kept in a record
+output_limit = 64 * 1024
+
+# Function to get the package a winget command acts on, '' when it has none
+def package_id_from_command(command):
+    if '--id' in command:
+        index = command.index('--id') + 1
+        return command[index] if index < len(command) else ''
+    if len(command) > 2 and not command[2].startswith('-'):
+        return command[2]
+    return ''
+
+class OutputTail:
+    """The last lines of a running command's output, about output_limit characters, for its record."""
+
+    def __init__(self, limit=None):
+        self.limit = limit or output_limit
+        self.lines = deque()
+        self.size = 0
+
+    def extend(self, lines):
+        for line in lines:
+            self.lines.append(line)
+            self.size += len(line) + 1
+        while self.size > self.limit and len(self.lines) > 1:
+            self.size -= len(self.lines.popleft()) + 1
+
+    def text(self):
+        return '\n'.join(self.lines)
+
+class CommandLog:
+    """Appends one JSON object per finished command and reads them back newest first."""
+
+    def __init__(self, directory, max_bytes=1024 * 1024, backup_count=5):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, 'commands.log')
+        self.backup_count = backup_count
+        # A private logger so records never reach the root logger's handlers
+        self.logger = logging.Logger(f'wpm.commands.{id(self)}')
+        handler = RotatingFileHandler(self.path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.logger.addHandler(handler)
+
+    def record(self, command, started, returncode, output, stderr='', timed_out=False):
+        if timed_out:
+            status = 'timeout'
+        else:
+            status = 'success' if returncode == 0 else 'failed'
+        finished = time.time()
+        entry = {
+            'time': datetime.fromtimestamp(started).isoformat(timespec='seconds'),
+            'started': round(started, 3),
+            'duration': round(finished - started, 3),
+            'command': command,
+            'package': package_id_from_command(command),
+            'status': status,
+            'returncode': returncode,
+            'output': output[-output_limit:],
+            'stderr': stderr[-output_limit:],
+        }
+        self.logger.info(json.dumps(entry, ensure_ascii=False))
+        return entry
+
+    def files(self):
+        # Newest file first: commands.log, commands.log.1, ...
+        paths = [self.path] + [f'{self.path}.{number}' for number in range(1, self.backup_count + 1)]
+        return [path for path in paths if os.path.exists(path)]
+
+    def read(self, before=None, package='', status='', limit=50):
+        """Return up to limit records that started before the given time, oldest first.
+
+        package matches case-insensitively anywhere in the package ID, status must match exactly.
+        """
+        package = package.lower()
+        records = []
+        for path in self.files():
+            try:
+                with open(path, encoding='utf-8') as log_file:
+                    lines = log_file.readlines()
+            except OSError:
+                continue  # Rotated away while reading
+            for line in reversed(lines):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Partly written or foreign line
+                if before is not None and entry['started'] >= before:
+                    continue
+                if package and package not in entry['package'].lower():
+                    continue
+                if status and entry['status'] != status:
+                    continue
+                records.append(entry)
+                if len(records) >= limit:
+                    return records[::-1]
+        return records[::-1]
+
+    @staticmethod
+    def format(entry):
+        text = (f"[{entry['time']}] {entry['package'] or ' '.join(entry['command'])}: {entry['status']} "
+                f"({entry['duration']:.1f}s, return code {entry['returncode']})\n"
+                f"Executing command: {' '.join(entry['command'])}\n")
+        if entry['output']:
+            text += entry['output'].rstrip('\n') + '\n'
+        if entry['stderr']:
+            text += f"Standard Error:\n{entry['stderr']}\n"
+        return text
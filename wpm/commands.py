@@ -0,0 +1,31 @@
+"""Builders for the winget install, upgrade and uninstall command lines."""
+
+# Function to build the uninstall command for a package from the settings
+def build_uninstall_command(package_id, settings):
+    command = ['winget', 'uninstall', '--id', package_id]
+    if settings.force:
+        command.append('--force')
+    # Remove the '-h' flag or replace it with '--silent' if you want silent mode
+    # command.append('-h')  # Remove or comment out this line
+    # If you want silent mode, uncomment the next line
+    # command.append('--silent')
+    return command
+
+# Function to build the upgrade command for a package from the settings
+def build_update_command(package_id, settings):
+    command = ['winget', 'upgrade', '--id', package_id]
+    if settings.force:
+        command.append('--force')
+    if settings.accept_eula:
+        command.append('--accept-package-agreements')
+    return command
+
+# Function to build the install command for a package, optionally pinned to a version
+def build_install_command(package_id, settings, version=None):
+    if version:
+        command = ['winget', 'install', '--id', package_id, '--version', version]
+    else:
+        command = ['winget', 'install', package_id]
+    if settings.accept_eula:
+        command.append('--accept-package-agreements')
+    return command
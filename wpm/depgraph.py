@@ -0,0 +1,41 @@
+"""Dependency graph of an upgrade batch, built from the Dependencies of the winget manifests."""
+from concurrent.futures import ThreadPoolExecutor
+
+from wpm import inventory
+
+# winget show calls run at the same time while the graph is built
+lookup_workers = 4
+
+# Function to map every package of a batch to the packages of the same batch it depends on
+def build_dependency_graph(package_ids, versions=None, cache=None):
+    """versions maps package IDs to the version being installed, details are cached per version.
+
+    Dependencies outside the batch are left out, winget installs missing ones itself.
+    """
+    versions = versions or {}
+    in_batch = {package_id.lower(): package_id for package_id in package_ids}  # winget IDs ignore case
+    with ThreadPoolExecutor(max_workers=lookup_workers, thread_name_prefix="show") as pool:
+        details = list(pool.map(lambda package_id: inventory.get_package_details(package_id, versions.get(package_id), cache),
+                                package_ids))
+    graph = {}
+    for package_id, package_details in zip(package_ids, details):
+        dependencies = (in_batch.get(dependency.lower()) for dependency in package_details['dependencies'])
+        graph[package_id] = {dependency for dependency in dependencies if dependency and dependency != package_id}
+    return graph
+
+# Function to split a dependency graph into waves that only depend on earlier waves
+def topological_waves(graph):
+    """Each wave can run in parallel. Packages in a dependency cycle share the last wave."""
+    remaining = {package_id: set(dependencies) for package_id, dependencies in graph.items()}
+    waves = []
+    while remaining:
+        ready = [package_id for package_id, dependencies in remaining.items() if not dependencies]
+        if not ready:
+            waves.append(list(remaining))
+            break
+        waves.append(ready)
+        for package_id in ready:
+            del remaining[package_id]
+        for dependencies in remaining.values():
+            dependencies.difference_update(ready)
+    return waves
@@ -0,0 +1,207 @@
+"""winget queries that return the installed, upgradable and searchable packages as table rows."""
+import bisect
+import json
+import os
+import sys
+import tempfile
+
+from wpm import timing
+from wpm.parsers import normalize_row, parse_dependencies, parse_installer_type, parse_versions, parse_winget_table
+from wpm.runner import cancel_event, run_process
+from wpm.singleflight import SingleFlight
+
+# Identical queries running at the same time share one winget process, the returned rows are
+# shared too and must not be modified by callers. Call invalidate_installed() after a command
+# changed the installed packages.
+queries = SingleFlight()
+
+# Queries whose answers change when a package is installed, upgraded or uninstalled. Searches,
+# versions and package details come from the sources and stay valid.
+installed_state_queries = ('get_available_updates', 'list_all_packages', 'get_installed_package')
+
+# Function to make the running queries of the installed packages start over after a command changed them
+def invalidate_installed():
+    queries.invalidate(installed_state_queries)
+
+# Exit code of winget list when no installed package matches (APPINSTALLER_CLI_ERROR_NO_APPLICATIONS_FOUND)
+no_packages_found = 0x8A150014
+
+# Function to run a winget query, None when winget could not be started
+def run_query(command):
+    try:
+        return run_process(command)
+    except OSError as e:
+        sys.stderr.write(f"Could not run {' '.join(command)}: {e}\n")
+        return None
+
+# Function to get available updates using winget, None when winget failed
+@queries.coalesced
+def get_available_updates():
+    with timing.measure('updates'):
+        result = run_query(['winget', 'upgrade'])
+        if result is None:
+            return None
+        if result.returncode & 0xFFFFFFFF == no_packages_found:
+            return []
+        if result.returncode != 0:
+            return None
+
+        # Name, ID, Version, Available Version, Source
+        updates = [row[:5] for row in parse_winget_table(result.stdout) if len(row) >= 5]
+        timing.mark('parse')
+        updates = resolve_truncated_ids(updates)
+        timing.mark('resolve')
+        return updates
+
+# Function to list all installed packages by parsing the fixed-width winget list table, None when winget failed
+@queries.coalesced
+def list_all_packages():
+    with timing.measure('list'):
+        result = run_query(['winget', 'list'])
+        if result is None or result.returncode != 0:
+            return None
+
+        # Name, ID, Version, Available Version, Source
+        packages = [normalize_row(row) for row in parse_winget_table(result.stdout) if len(row) >= 3]
+        timing.mark('parse')
+        packages = resolve_truncated_ids(packages)
+        timing.mark('resolve')
+        return packages
+
+# Function to get the installed rows of one package, [] when it is not installed, None when winget failed
+@queries.coalesced
+def get_installed_package(package_id):
+    with timing.measure('list', package_id):
+        result = run_query(['winget', 'list', '--id', package_id, '--exact'])
+        if result is None:
+            return None
+        if result.returncode & 0xFFFFFFFF == no_packages_found:
+            return []
+        if result.returncode != 0:
+            return None
+
+        # Name, ID, Version, Available Version, Source
+        packages = [normalize_row(row) for row in parse_winget_table(result.stdout) if len(row) >= 3]
+        timing.mark('parse')
+    # winget shortens long IDs even in a single-row table
+    return [row[:1] + [package_id] + row[2:] for row in packages
+            if row[1] == package_id or (row[1].endswith('\u2026') and package_id.startswith(row[1][:-1]))]
+
+# Function to read installed packages from winget export JSON as {package id: (version, source)}
+def export_installed_packages():
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        with timing.measure('export'):
+            run_process(['winget', 'export', '-o', path, '--include-versions', '--accept-source-agreements'])
+            with open(path, encoding='utf-8') as export_file:
+                data = json.load(export_file)
+            timing.mark('parse')
+    except (OSError, ValueError):
+        return {}
+    finally:
+        os.remove(path)
+
+    packages = {}
+    for source in data.get('Sources', []):
+        source_name = source.get('SourceDetails', {}).get('Name', '')
+        for package in source.get('Packages', []):
+            packages[package['PackageIdentifier']] = (package.get('Version', ''), source_name)
+    return packages
+
+# Function to replace IDs that winget truncated with "…" by the full IDs from winget export
+def resolve_truncated_ids(rows):
+    truncated = [row for row in rows if row[1].endswith('\u2026')]
+    if not truncated:
+        return rows  # Only pay for the export when the table actually needs it
+
+    exported_ids = sorted(export_installed_packages())
+    for row in truncated:
+        prefix = row[1][:-1]
+        index = bisect.bisect_left(exported_ids, prefix)
+        matches = exported_ids[index:index + 2]
+        matches = [package_id for package_id in matches if package_id.startswith(prefix)]
+        if len(matches) == 1:  # Leave ambiguous prefixes alone
+            row[1] = matches[0]
+    return rows
+
+# Function to get available versions of a package, cache is an optional ResultCache
+@queries.coalesced
+def get_available_versions(package_id, source=None, cache=None):
+    cache_key = ('versions', package_id, source)
+    versions = cache.get(cache_key) if cache is not None else None
+    if versions is not None:
+        return versions
+
+    command = ['winget', 'show', '--id', package_id, '--versions']
+    if source:
+        command.extend(['--source', source])
+    try:
+        with timing.measure('versions', package_id):
+            result = run_process(command)
+            if result.returncode != 0:
+                return []
+            versions = parse_versions(result.stdout)
+            timing.mark('parse')
+        if cache is not None:
+            cache.put(cache_key, versions)
+        return versions
+    except Exception as e:
+        sys.stderr.write(f"Error fetching versions: {e}\n")  # stdout carries the CLI's JSON
+        return []
+
+# Function to get the installer type (msi, exe, ...) and package dependencies of a package version
+@queries.coalesced
+def get_package_details(package_id, version=None, cache=None):
+    """Return {'installer_type', 'dependencies'}, for the latest version when version is None.
+
+    Details are cached per package version; an unknown installer type is ''.
+    """
+    cache_key = ('show', package_id, version)
+    details = cache.get(cache_key) if cache is not None else None
+    if details is not None:
+        return details
+
+    command = ['winget', 'show', '--id', package_id, '--exact']
+    if version:
+        command.extend(['--version', version])
+    with timing.measure('show', package_id):
+        result = run_query(command)
+        if result is None or result.returncode != 0:
+            return {'installer_type': '', 'dependencies': []}  # Not cached, may work next time
+        details = {'installer_type': parse_installer_type(result.stdout),
+                   'dependencies': parse_dependencies(result.stdout)}
+        timing.mark('parse')
+    if cache is not None:
+        cache.put(cache_key, details)
+    return details
+
+# Function to run winget search and parse the result rows, None when the search failed
+@queries.coalesced
+def search_packages(package_name, source=None, cache=None):
+    cache_key = ('search', package_name, source)
+    results = cache.get(cache_key) if cache is not None else None
+    if results is not None:
+        return results
+
+    command = ['winget', 'search', package_name]
+    if source:
+        command.extend(['--source', source])
+    with timing.measure('search', package_name):
+        result = run_process(command)
+        if result.returncode != 0:
+            return None
+
+        # Name, ID, Version, Match, Source
+        results = [normalize_row(row) for row in parse_winget_table(result.stdout) if len(row) >= 4]
+        timing.mark('parse')
+    if cache is not None:
+        cache.put(cache_key, results)
+    return results
+
+# Function to fetch the version lists of packages ahead of time so later lookups hit the cache
+def prefetch_versions(package_ids, cache):
+    for package_id in package_ids:
+        if cancel_event.is_set():
+            return
+        get_available_versions(package_id, cache=cache)
@@ -0,0 +1,256 @@
+"""Persistent queue of install, upgrade and uninstall jobs with priorities and a concurrency limit."""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from wpm import runner, scheduler
+from wpm.commands import build_install_command, build_uninstall_command, build_update_command
+from wpm.depgraph import lookup_workers
+from wpm.throttle import ConcurrencyController
+
+# Log wording and result of each action
+action_verbs = {'install': "Installing", 'upgrade': "Updating", 'uninstall': "Uninstalling"}
+
+# Finished jobs kept in the queue file for the panel, the oldest are dropped first
+max_finished = 200
+
+class JobQueue:
+    """Runs queued jobs on their own threads, at most settings.concurrency at a time.
+
+    With settings.adaptive_concurrency the number of parallel jobs follows the system load and
+    throughput. Windows Installer based packages always run one at a time. cache is an optional
+    ResultCache for the installer types.
+
+    Jobs are dicts with the keys id, action, package, version, priority, state, result, attempts,
+    returncode, added, started and finished. state is queued, running, done, failed or cancelled.
+    The queue is saved after every change; jobs that were running when the app exited are queued
+    again on the next start. on_change is called with the job and on_status with winget's current
+    spinner or progress bar, both from worker threads.
+
+    A job starts only once its conflict group is known and free, so a job waiting for a package of
+    the same group never holds a slot that a job of another group could use.
+    """
+
+    def __init__(self, path, settings, log, on_change=None, cache=None, on_status=None):
+        self.path = path
+        self.settings = settings
+        self.log = log
+        self.on_change = on_change
+        self.on_status = on_status
+        self.condition = threading.Condition()
+        self.save_lock = threading.Lock()  # Jobs finishing at the same time must not share the temp file
+        self.controller = ConcurrencyController(settings.concurrency, settings.adaptive_concurrency)
+        self.groups = scheduler.ConflictGroups(cache=cache)
+        self.lookups = ThreadPoolExecutor(max_workers=lookup_workers, thread_name_prefix="job-group")
+        self.group_lookups = {}  # Job ID -> future of its conflict group lock
+        self.busy = set()  # Group locks of the running jobs
+        self.running = 0
+        self.stopping = False
+        self.jobs, self.paused = self.load()
+        self.next_id = max((job['id'] for job in self.jobs), default=0) + 1
+        self.dispatcher = None
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as queue_file:
+                data = json.load(queue_file)
+        except (OSError, ValueError):
+            return [], False
+        jobs = data.get('jobs', [])
+        for job in jobs:
+            if job['state'] == 'running':
+                job['state'] = 'queued'  # Interrupted by the last exit, run it again
+                job['started'] = None
+        return jobs, data.get('paused', False)
+
+    def save(self):
+        with self.condition:
+            finished = [job for job in self.jobs if job['state'] not in ('queued', 'running')]
+            for job in finished[:max(0, len(finished) - max_finished)]:
+                self.jobs.remove(job)
+            data = json.dumps({'paused': self.paused, 'jobs': self.jobs}, indent=1)
+        with self.save_lock:
+            temp_file = self.path + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as queue_file:
+                queue_file.write(data)
+            os.replace(temp_file, self.path)
+
+    def snapshot(self):
+        """Return copies of the jobs, safe to read on another thread."""
+        with self.condition:
+            return [dict(job) for job in self.jobs]
+
+    def active_packages(self):
+        """Return the lowercase IDs of the packages with a queued or running job."""
+        with self.condition:
+            return {job['package'].lower() for job in self.jobs if job['state'] in ('queued', 'running')}
+
+    def changed(self, job=None):
+        self.save()
+        if self.on_change is not None:
+            self.on_change(job)
+
+    def add(self, action, package_id, version=None, priority=0):
+        """Queue a job unless the same action for the package is already waiting or running."""
+        with self.condition:
+            for job in self.jobs:
+                if (job['action'], job['package'], job['version']) == (action, package_id, version) \
+                        and job['state'] in ('queued', 'running'):
+                    return None
+            job = {'id': self.next_id, 'action': action, 'package': package_id, 'version': version,
+                   'priority': priority, 'state': 'queued', 'result': '', 'attempts': 0, 'returncode': '',
+                   'added': time.time(), 'started': None, 'finished': None}
+            self.next_id += 1
+            self.jobs.append(job)
+            self.condition.notify_all()
+        self.changed(job)
+        return job
+
+    def find(self, job_id):
+        return next((job for job in self.jobs if job['id'] == job_id), None)
+
+    def set_priority(self, job_id, delta):
+        with self.condition:
+            job = self.find(job_id)
+            if job is None or job['state'] != 'queued':
+                return
+            job['priority'] += delta
+        self.changed(job)
+
+    def cancel(self, job_id):
+        """Cancel a job that has not started yet."""
+        with self.condition:
+            job = self.find(job_id)
+            if job is None or job['state'] != 'queued':
+                return
+            job['state'], job['result'] = 'cancelled', "Cancelled"
+        self.changed(job)
+
+    def retry(self, job_id):
+        """Queue a failed or cancelled job again."""
+        with self.condition:
+            job = self.find(job_id)
+            if job is None or job['state'] not in ('failed', 'cancelled'):
+                return
+            job.update(state='queued', result='', started=None, finished=None)
+            self.condition.notify_all()
+        self.changed(job)
+
+    def clear_finished(self):
+        with self.condition:
+            self.jobs = [job for job in self.jobs if job['state'] in ('queued', 'running')]
+        self.changed()
+
+    def pause(self):
+        with self.condition:
+            self.paused = True
+        self.changed()
+
+    def resume(self):
+        runner.cancel_event.clear()  # A Cancel also stops the queue until it is resumed
+        with self.condition:
+            self.paused = False
+            self.condition.notify_all()
+        self.changed()
+
+    def start(self):
+        self.dispatcher = threading.Thread(target=self.dispatch, name="job-dispatcher", daemon=True)
+        self.dispatcher.start()
+
+    def stop(self):
+        """Stop starting jobs, running jobs stay queued in the file for the next start."""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        self.lookups.shutdown(wait=False, cancel_futures=True)
+
+    def lookup_group(self, job):
+        # Runs on a lookup thread: winget show tells the installer type
+        try:
+            return self.groups.lock_for(job['package'], job['version'])
+        except Exception as e:
+            self.log(f"[{job['package']}] {e}\n")
+            return threading.Lock()  # Unknown group, conflicts with nothing
+
+    def request_groups(self):
+        # Called with the condition held, the dispatcher is woken when a lookup finishes
+        for job in self.jobs:
+            if job['state'] == 'queued' and job['id'] not in self.group_lookups:
+                lookup = self.lookups.submit(self.lookup_group, job)
+                self.group_lookups[job['id']] = lookup
+                lookup.add_done_callback(lambda _: self.wake())
+
+    def wake(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def group_free(self, job):
+        lookup = self.group_lookups.get(job['id'])
+        return lookup is not None and lookup.done() and not lookup.cancelled() and lookup.result() not in self.busy
+
+    def next_job(self):
+        # Highest priority first, then in the order the jobs were added, skipping jobs whose group is busy
+        queued = [job for job in self.jobs if job['state'] == 'queued' and self.group_free(job)]
+        return min(queued, key=lambda job: (-job['priority'], job['id']), default=None)
+
+    def can_start(self):
+        # Pick up changed settings, the panel and the Settings window edit them while jobs run
+        self.controller.set_maximum(self.settings.concurrency, self.settings.adaptive_concurrency)
+        self.controller.set_waiting(sum(1 for job in self.jobs if job['state'] == 'queued'))
+        return (not self.paused and not runner.cancel_event.is_set()
+                and self.running < self.controller.limit and self.next_job() is not None)
+
+    def dispatch(self):
+        while True:
+            with self.condition:
+                while not self.stopping:
+                    self.request_groups()
+                    if self.can_start():
+                        break
+                    self.condition.wait(1)  # Also picks up a changed concurrency setting
+                if self.stopping:
+                    return
+                job = self.next_job()
+                group_lock = self.group_lookups.pop(job['id']).result()
+                self.busy.add(group_lock)
+                job['state'] = 'running'
+                job['started'] = time.time()
+                self.running += 1
+            self.changed(job)
+            threading.Thread(target=self.run_job, args=(job, group_lock), daemon=True).start()
+
+    def build_command(self, job):
+        if job['action'] == 'install':
+            return build_install_command(job['package'], self.settings, job['version'])
+        if job['action'] == 'uninstall':
+            return build_uninstall_command(job['package'], self.settings)
+        return build_update_command(job['package'], self.settings)
+
+    def run_job(self, job, group_lock):
+        package_id = job['package']
+        result, attempts, returncode = "Failed", job['attempts'], ''
+        try:
+            _, result, attempts, _, returncode = scheduler.run_upgrade_job(
+                package_id, self.build_command(job), max(1, self.settings.timeout_minutes) * 60,
+                max(0, self.settings.retries), group_lock, self.log, action_verbs[job['action']], self.on_status)
+        except Exception as e:
+            # The slot must be given back or the queue stalls, and the job must not be retried forever
+            result = f"Failed: {e}"
+            self.log(f"[{package_id}] {e}\n")
+        finally:
+            self.controller.job_finished()
+            with self.condition:
+                self.running -= 1
+                self.busy.discard(group_lock)
+                self.condition.notify_all()
+                if not self.stopping:
+                    job['state'] = {'Updated': 'done', 'Cancelled': 'cancelled'}.get(result, 'failed')
+                    job['result'] = "Done" if result == "Updated" else result
+                    job['attempts'] = attempts
+                    job['returncode'] = returncode
+                    job['finished'] = time.time()
+            # While the app is closing the job stays queued in the file
+            if not self.stopping:
+                self.changed(job)
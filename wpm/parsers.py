@@ -0,0 +1,319 @@
+"""Parsers for winget's console output."""
+import bisect
+import operator
+import re
+import unicodedata
+from functools import lru_cache
+from itertools import accumulate
+
+# Control characters other than the carriage returns and newlines used for line handling
+control_char_pattern = re.compile(r'[\x00-\x09\x0B\x0C\x0E-\x1F\x7F-\x9F]+')
+
+# Lines made only of spinner or separator characters carry no information
+spinner_line_pattern = re.compile(r'^[\s\-\|/\\]*$')
+
+# Characters winget draws its download/install progress bars with
+progress_bar_chars = ('\u2588', '\u2592')
+
+# Characters that may not take one console column: combining marks and wide characters come after
+# U+0300, the ellipsis winget cuts long names with is one column wide
+non_narrow_pattern = re.compile('[^\x00-\u02ff\u2026]')
+# Text up to and including the last character of a line that may not be one console column wide
+wide_prefix_pattern = re.compile('.*[^\x00-\u02ff\u2026]')
+
+class OutputCleaner:
+    """Incrementally splits raw winget output into clean log lines and a progress status line."""
+
+    def __init__(self):
+        self.partial = ''  # Text after the last newline, i.e. the line winget is still redrawing
+
+    def feed(self, chunk):
+        """Return (lines, status) for a chunk: completed log lines and the current redraw, if any."""
+        *complete, partial = (self.partial + chunk).split('\n')
+        lines = []
+        status = None
+        for raw in complete:
+            line = self.last_segment(raw)
+            if self.is_progress(line):
+                status = line.strip()
+            elif line:
+                lines.append(line)
+        # Only the last carriage-return segment of the unfinished line is visible, drop the rest. The
+        # text after the last carriage return is kept as it is, the next chunk continues it.
+        if '\r' in partial:
+            drawn, redraw = partial.rsplit('\r', 1)
+            self.partial = self.last_segment(drawn) + '\r' + redraw
+        else:
+            self.partial = partial
+        current = self.last_segment(self.partial).strip()
+        if current:
+            status = current
+        return lines, status
+
+    def flush(self):
+        """Return whatever is left in the buffer once the process has exited."""
+        line = self.last_segment(self.partial)
+        self.partial = ''
+        return [line] if line and not self.is_progress(line) else []
+
+    @staticmethod
+    def last_segment(raw):
+        # winget redraws spinners and progress bars in place with carriage returns
+        for segment in reversed(raw.split('\r')):
+            segment = control_char_pattern.sub('', segment).rstrip()
+            if segment.strip():
+                return segment
+        return ''
+
+    @staticmethod
+    def is_progress(line):
+        return bool(spinner_line_pattern.match(line)) or any(c in line for c in progress_bar_chars)
+
+class OutputRules:
+    """Words winget prints in one display language, compiled into the patterns the parsers need.
+
+    The table layout itself is read from the header and separator lines, so languages without
+    registered rules still parse. The rules only add footer filtering and the version header.
+    Footer patterns are matched at the start of a line.
+    """
+
+    def __init__(self, language, headers, version_header, footers, package_dependencies='Package Dependencies'):
+        self.language = language
+        self.headers = {header.lower() for header in headers}
+        self.version_header = version_header
+        self.package_dependencies = package_dependencies.lower()  # Label of the list in winget show
+        self.footer_pattern = re.compile('|'.join(f'(?:{footer})' for footer in footers), re.IGNORECASE) if footers else None
+
+    def is_footer(self, line):
+        return self.footer_pattern is not None and self.footer_pattern.match(line) is not None
+
+# Registered display languages, detect_rules picks one from the first table header it sees
+output_rules = []
+
+# Rules used when the display language is not registered: layout only, plus the English version header
+generic_rules = OutputRules('generic', [], 'Version', [])
+
+# Rules detected for this session, None until the first table header has been seen
+session_rules = None
+
+# Function to add the rules for a winget display language
+def register_rules(language, headers, version_header, footers, package_dependencies='Package Dependencies'):
+    rules = OutputRules(language, headers, version_header, footers, package_dependencies)
+    output_rules.append(rules)
+    return rules
+
+register_rules('en', ['Name', 'Id', 'Version', 'Available', 'Match', 'Source'], 'Version', [
+    r'^\d+ upgrades? available',
+    r'^\d+ package\(s\) (?:have|has) ',
+    r'^The following packages have an upgrade available',
+    r'^No installed package found',
+    r'^No package found',
+])
+register_rules('de', ['Name', 'ID', 'Version', 'Verfügbar', 'Übereinstimmung', 'Quelle'], 'Version', [
+    r'^\d+ Aktualisierungen verfügbar',
+    r'^Mindestens ',
+    r'^\d+ Paket\(e\) verfügt',
+    r'^Es wurde kein installiertes Paket gefunden',
+], 'Paketabhängigkeiten')
+register_rules('fr', ['Nom', 'ID', 'Version', 'Disponible', 'Correspondance', 'Source'], 'Version', [
+    r'^\d+ mises? à niveau disponibles?',
+    r'^\d+ package\(s\) ont des numéros de version',
+    r'^Aucun package installé ne correspond',
+    r'^Aucun package ne correspond',
+], 'Dépendances du package')
+register_rules('es', ['Nombre', 'Id', 'Versión', 'Disponible', 'Coincidencia', 'Origen'], 'Versión', [
+    r'^\d+ actualizaciones? disponibles?',
+    r'^\d+ paquete\(s\) tienen números de versión',
+    r'^No se encontró ningún paquete',
+], 'Dependencias de paquetes')
+
+# Function to pick the rules whose column headers match a table header line
+def detect_rules(header):
+    words = {word.lower() for word in header.split()}
+    best = max(output_rules, key=lambda rules: len(rules.headers & words))
+    # Name, Id and Version alone are shared by several languages, require one more match
+    return best if len(best.headers & words) >= 4 else generic_rules
+
+# Function to get the session's rules, detected once from the first table header
+def rules_for_header(header):
+    global session_rules
+    if session_rules is None:
+        session_rules = detect_rules(header)
+    return session_rules
+
+# Function to get the number of console columns a character takes, East Asian wide characters take two
+@lru_cache(maxsize=None)
+def char_width(char):
+    if unicodedata.combining(char):
+        return 0
+    return 2 if unicodedata.east_asian_width(char) in ('W', 'F') else 1
+
+# Function to get the display column each character of a line starts at, plus the line's width at the end
+def display_columns(line):
+    return list(accumulate(map(char_width, line), initial=0))
+
+# Function to check whether every character of a line takes one console column
+def is_narrow(line):
+    return line.isascii() or non_narrow_pattern.search(line) is None
+
+# Function to map display columns to character offsets of a line, None when a column starts inside a
+# wide character or right after text. Past wide_end all characters are one column wide.
+def column_offsets(line, starts, wide_end):
+    columns = display_columns(line[:wide_end])
+    width = columns[-1]
+    offsets = []
+    for start in starts:
+        if start <= width:
+            offset = bisect.bisect_left(columns, start)
+            if 0 < offset < len(line) and (line[offset - 1] != ' ' or columns[offset] != start):
+                return None
+        else:
+            offset = wide_end + start - width
+            if offset < len(line) and line[offset - 1] != ' ':
+                return None
+        offsets.append(offset)
+    return offsets
+
+# Function to split output into the lines a console would show: no control characters and only the
+# last carriage-return redraw of each line
+def console_lines(output):
+    if control_char_pattern.search(output):
+        output = control_char_pattern.sub('', output)
+    lines = output.split('\n')
+    if '\r' in output:
+        lines = [OutputCleaner.last_segment(line) if '\r' in line else line for line in lines]
+    return lines
+
+# Function to split winget table output into rows using the column offsets of the header line
+def parse_winget_table(output):
+    rows = []
+    rules = session_rules or generic_rules
+    starts = None
+    previous = ''
+    previous_row = None
+    for line in console_lines(output):  # Spinner redraws in front of the header are dropped here
+        stripped = line.strip()
+        if not stripped:
+            previous = line
+            continue
+        if stripped[0] == '-' and len(stripped) >= 3 and stripped.strip('-') == '':
+            # The separator follows the header: take the column offsets from the header words once
+            starts = [match.start() for match in re.finditer(r'\S+', previous)]
+            if not is_narrow(previous):
+                header_columns = display_columns(previous)
+                starts = [header_columns[start] for start in starts]
+            # Characters in front of the column starts, a row lines up when all of them are spaces
+            gaps = [start - 1 for start in starts if start > 0]
+            gap_chars = operator.itemgetter(*gaps) if gaps else None
+            spaces = tuple(' ' * len(gaps)) if len(gaps) > 1 else ' '
+            last_start = max(starts)
+            slices = [slice(start, end) for start, end in zip(starts, starts[1:] + [None])]
+            rules = rules_for_header(previous)
+            if rows and rows[-1] is previous_row:
+                rows.pop()  # The header of a second table was parsed as a row of the first one
+            previous = line
+            continue
+        previous = line
+        previous_row = None
+        if starts is None:
+            continue
+        # winget pads columns to a display width, starts are display columns and East Asian wide
+        # characters take two of them, so map the starts to character offsets of this line
+        wide_prefix = None if line.isascii() else wide_prefix_pattern.match(line)
+        if wide_prefix is None and len(line) > last_start:
+            # A full row of one-column characters, the common case: one lookup for all the gaps
+            if gap_chars is not None and gap_chars(line) != spaces:
+                continue
+            row = [line[columns].strip() for columns in slices]
+        else:
+            if wide_prefix is None:
+                offsets = starts
+                if not all(not 0 < start < len(line) or line[start - 1] == ' ' for start in starts):
+                    offsets = None
+            else:
+                offsets = column_offsets(line, starts, wide_prefix.end())
+            # Rows have to line up with the columns, footer text like "3 upgrades available." does not
+            if offsets is None:
+                continue
+            row = [line[start:end].strip() for start, end in zip(offsets, offsets[1:] + [None])]
+        if len(row) >= 2 and row[1] and not rules.is_footer(stripped):  # Footers that happen to line up
+            rows.append(row)
+            previous_row = row
+    return rows
+
+# Function to pad rows without the optional 4th column (Available/Match) to the five table columns
+def normalize_row(row):
+    if len(row) == 4:
+        return row[:3] + [''] + row[3:]
+    return row[:5]
+
+# Function to extract the version list from winget show --versions output
+def parse_versions(output):
+    """Return the versions listed under the one-column table, whatever the display language.
+
+    The output is a "Found <name> [<id>]" line, the localized column header, a line of dashes
+    and one version per line.
+    """
+    rules = session_rules or generic_rules
+    versions = []
+    parsing_versions = False
+    previous = ''
+    for raw in output.split('\n'):
+        line = OutputCleaner.last_segment(raw).strip()
+        if not parsing_versions:
+            # The dashes under the header, or the header itself when the separator is missing
+            if (len(line) >= 2 and line.strip('-') == '' and previous) or (line and line == rules.version_header):
+                parsing_versions = True
+            if line:
+                previous = line
+            continue
+        if not line or line.strip('-') == '':
+            continue
+        # Another section or a footer ends the list, versions are single words without a colon
+        if ':' in line or len(line.split()) != 1:
+            break
+        versions.append(line)
+    return versions
+
+# Installer technologies winget reports in the Installer Type field
+installer_types = {'msi', 'wix', 'burn', 'exe', 'inno', 'nullsoft', 'msix', 'appx', 'zip', 'portable', 'pwa', 'font'}
+
+# Function to find the installer type in winget show output, '' when it is not listed
+def parse_installer_type(output):
+    # The label is localized, so look for a "label: value" line whose value is a known type,
+    # preferring labels that mention the installer
+    fallback = ''
+    for line in output.split('\n'):
+        label, colon, value = OutputCleaner.last_segment(line).partition(':')
+        value = value.strip().lower()
+        if colon and value in installer_types:
+            if 'install' in label.lower():
+                return value
+            fallback = fallback or value
+    return fallback
+
+# Function to list the package IDs under "Package Dependencies" in winget show output
+def parse_dependencies(output):
+    # winget show has no table header to detect the language from, so accept the label of any
+    # registered language
+    labels = {rules.package_dependencies for rules in output_rules + [generic_rules]}
+    dependencies = []
+    header_indent = None
+    for raw in output.split('\n'):
+        line = OutputCleaner.last_segment(raw)
+        stripped = line.strip()
+        if not stripped:
+            continue
+        indent = len(line) - len(line.lstrip())
+        if header_indent is not None:
+            if indent <= header_indent:
+                header_indent = None  # End of the list
+            else:
+                # "Microsoft.VCRedist.2015+.x64" or "Microsoft.DotNet.Runtime.8 [>= 8.0.0]"
+                package_id = stripped.lstrip('- ').split()[0]
+                if ':' not in package_id and package_id not in dependencies:
+                    dependencies.append(package_id)
+                continue
+        if stripped.endswith(':') and stripped.lstrip('- ')[:-1].strip().lower() in labels:
+            header_indent = indent
+    return dependencies
@@ -0,0 +1,155 @@
+"""Runs winget in subprocesses that can be streamed, timed out and cancelled from any thread."""
+import codecs
+import subprocess
+import threading
+import time
+
+from wpm import timing
+from wpm.commandlog import OutputTail, package_id_from_command
+from wpm.parsers import OutputCleaner
+
+# winget processes that are currently running (used by the Cancel button)
+running_processes = set()
+process_lock = threading.Lock()
+
+# Set on cancel so batch jobs stop retrying and starting new work
+cancel_event = threading.Event()
+
+# Streamed output is handed out in batches of at most this many lines or this many seconds
+output_batch_lines = 200
+output_batch_interval = 0.1
+
+# CommandLog that receives a record of every streamed command, set by the GUI and the CLI
+command_log = None
+
+# Program run in place of winget, e.g. [sys.executable, 'benchmarks/fake_winget.py'], None runs winget
+winget_command = None
+
+# Function to get the command line actually started for a winget command
+def process_command(command):
+    if winget_command is not None and command and command[0] == 'winget':
+        return list(winget_command) + list(command[1:])
+    return command
+
+# Function to decode captured output the way text mode would, with universal newlines
+def decode_output(data):
+    return data.decode('utf-8', errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+
+# Function to run a command in a subprocess that can be cancelled
+def run_process(command):
+    process = subprocess.Popen(process_command(command), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    timing.mark('spawn')
+    with process_lock:
+        running_processes.add(process)
+    try:
+        stderr_chunks = []
+        stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+        stderr_thread.start()
+        first = process.stdout.read1(4096)  # Separates winget's source update from the table output
+        timing.mark('first_byte')
+        stdout = first + process.stdout.read()
+        process.wait()
+        stderr_thread.join()
+        timing.mark('exit')
+    finally:
+        with process_lock:
+            running_processes.discard(process)
+    return subprocess.CompletedProcess(command, process.returncode, decode_output(stdout),
+                                       decode_output(b''.join(stderr_chunks)))
+
+# Function to terminate every running winget process, returns how many were running
+def cancel_running_processes():
+    cancel_event.set()
+    with process_lock:
+        processes = list(running_processes)
+    for process in processes:
+        try:
+            process.terminate()
+        except OSError:
+            pass  # The process already exited
+    return len(processes)
+
+# Function to run a command and hand its cleaned output to on_output while it runs
+def stream_command(command, on_output, on_status=None, timeout=None, prefix=''):
+    """Return (returncode, cleaned stderr), raise subprocess.TimeoutExpired after timeout seconds.
+
+    on_output receives batches of completed lines, on_status the spinner or progress bar winget is
+    currently redrawing. Both are called on the calling thread.
+    """
+    with timing.measure(timing.command_type(command), package_id_from_command(command)):
+        return stream_process(command, on_output, on_status, timeout, prefix)
+
+# Function doing the work of stream_command inside its timing run
+def stream_process(command, on_output, on_status, timeout, prefix):
+    started = time.time()
+    process = subprocess.Popen(process_command(command), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    timing.mark('spawn')
+    with process_lock:
+        running_processes.add(process)
+
+    # Kill the process if it runs longer than the timeout
+    timed_out = threading.Event()
+    def kill_on_timeout():
+        timed_out.set()
+        process.kill()
+    watchdog = threading.Timer(timeout, kill_on_timeout) if timeout else None
+    if watchdog:
+        watchdog.daemon = True
+        watchdog.start()
+    try:
+        # stderr is usually short, collect it on a helper thread so neither pipe can fill up
+        stderr_chunks = []
+        stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+        stderr_thread.start()
+
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        cleaner = OutputCleaner()
+        batch = []
+        logged = OutputTail()  # End of the output without the prefix for the command log
+        first_chunk = True
+        last_flush = time.monotonic()
+        last_status = None
+        while True:
+            chunk = process.stdout.read1(4096)
+            if not chunk:
+                break
+            if first_chunk:
+                timing.mark('first_byte')
+                first_chunk = False
+            lines, status = cleaner.feed(decoder.decode(chunk))
+            logged.extend(lines)
+            batch.extend(prefix + line for line in lines)
+            if on_status is not None and status is not None and status != last_status:
+                last_status = status
+                on_status(status)
+            now = time.monotonic()
+            if batch and (len(batch) >= output_batch_lines or now - last_flush >= output_batch_interval):
+                on_output('\n'.join(batch) + '\n')
+                batch = []
+                last_flush = now
+
+        lines, _ = cleaner.feed(decoder.decode(b'', final=True))
+        lines += cleaner.flush()
+        logged.extend(lines)
+        batch.extend(prefix + line for line in lines)
+        if batch:
+            on_output('\n'.join(batch) + '\n')
+
+        returncode = process.wait()
+        stderr_thread.join()
+        timing.mark('exit')
+    finally:
+        if watchdog:
+            watchdog.cancel()
+        with process_lock:
+            running_processes.discard(process)
+
+    stderr = b''.join(stderr_chunks).decode('utf-8', errors='replace')
+    stderr_lines = (OutputCleaner.last_segment(line) for line in stderr.split('\n'))
+    stderr_clean = '\n'.join(line for line in stderr_lines if line)
+    if command_log is not None:
+        command_log.record(command, started, '' if timed_out.is_set() else returncode,
+                           logged.text(), stderr_clean, timed_out.is_set())
+    if timed_out.is_set():
+        raise subprocess.TimeoutExpired(command, timeout)
+    return returncode, stderr_clean
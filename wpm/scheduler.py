@@ -0,0 +1,171 @@
+"""Parallel per-package upgrade jobs with timeouts, retries and serialized conflict groups."""
+import subprocess
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from wpm import inventory
+from wpm.depgraph import build_dependency_graph, lookup_workers, topological_waves
+from wpm.runner import cancel_event, stream_command
+from wpm.throttle import ConcurrencyController
+
+# Base delay before retrying a failed upgrade, doubled on every further attempt
+retry_backoff_seconds = 5
+
+# Installer technologies that wait for the system-wide Windows Installer mutex, running them in parallel gains nothing
+mutex_installer_types = {'msi', 'wix', 'burn'}
+
+# Held by every Windows Installer based upgrade in the process, whichever batch or queue runs it
+windows_installer_lock = threading.Lock()
+
+# Packages that share an updater which runs one instance at a time, by lowercase ID prefix
+known_conflicts = {
+    'microsoft.visualstudio.': 'visual-studio-installer',  # Editions and build tools share the VS Installer
+}
+
+# Function to pick the lock a package upgrade has to hold so conflicting installers run one at a time
+def conflict_group(package_id, installer_type=''):
+    if installer_type in mutex_installer_types:
+        return 'windows-installer'
+    key = package_id.lower()
+    for prefix, group in known_conflicts.items():
+        if key.startswith(prefix):
+            return group
+    return key  # Conflicts with nothing but another upgrade of the same package
+
+class ConflictGroups:
+    """Hands out one lock per conflict group, looking up installer types unless detect_installers is off.
+
+    The Windows Installer group shares windows_installer_lock with every other instance.
+    """
+
+    def __init__(self, detect_installers=True, cache=None):
+        self.detect_installers = detect_installers
+        self.cache = cache
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    def lock_for(self, package_id, version=None):
+        installer_type = ''
+        if self.detect_installers:
+            installer_type = inventory.get_package_details(package_id, version, self.cache)['installer_type']
+        group = conflict_group(package_id, installer_type)
+        if group == 'windows-installer':
+            return windows_installer_lock
+        with self.lock:
+            return self.locks.setdefault(group, threading.Lock())
+
+# Function to run upgrade jobs in parallel and collect a result row per package
+def run_upgrade_batch(jobs, concurrency, timeout, retries, log, adaptive=False, cache=None, ordered=False, versions=None,
+                      on_status=None):
+    """jobs are (package ID, command) pairs, log is called with output text from worker threads and
+    on_status with the spinner or progress bar a job's winget is currently redrawing.
+
+    concurrency is the maximum number of parallel jobs. With adaptive set the number follows the
+    system load and throughput. Windows Installer based packages always run one at a time. With
+    ordered set the packages run in waves so dependencies are upgraded before the packages that
+    need them; versions maps package IDs to the versions being installed.
+    Returns the result rows [ID, result, attempts, duration, return code] and the elapsed seconds.
+    """
+    controller = ConcurrencyController(concurrency, adaptive)
+    groups = ConflictGroups(cache=cache)
+    versions = versions or {}
+    commands = dict(jobs)
+
+    def run(package_id, group_lock):
+        gate = controller.gate(group_lock)
+        return run_upgrade_job(package_id, commands[package_id], timeout, retries, gate, log, on_status=on_status)
+
+    start = time.monotonic()
+    if ordered:
+        graph = build_dependency_graph(list(commands), versions, cache)
+        waves = topological_waves(graph)
+    else:
+        graph = {}
+        waves = [list(commands)]
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="upgrade") as pool, \
+            ThreadPoolExecutor(max_workers=lookup_workers, thread_name_prefix="show") as lookups:
+        for number, wave in enumerate(waves, 1):
+            if len(waves) > 1:
+                log(f"Wave {number} of {len(waves)}: {', '.join(wave)}\n")
+            for package_id in wave:
+                failed = [dependency for dependency in graph.get(package_id, ())
+                          if dependency in results and results[dependency][1] != "Updated"]
+                if failed:
+                    log(f"[{package_id}] Dependency not updated: {', '.join(failed)}\n")
+            results.update(run_wave(wave, pool, lookups, groups, controller, versions, run))
+    if adaptive:
+        log(f"Parallel jobs at the end of the batch: {controller.limit}\n")
+    return [results[package_id] for package_id in commands], time.monotonic() - start
+
+# Function to run the jobs of one wave, starting a job only when its conflict group is free
+def run_wave(wave, pool, lookups, groups, controller, versions, run):
+    """Jobs whose group is busy wait here instead of on a worker, so they never hold a slot that a
+    job of another group could use. Jobs start in wave order as far as their groups allow.
+    Returns {package ID: result row}.
+    """
+    pending = {package_id: lookups.submit(groups.lock_for, package_id, versions.get(package_id))
+               for package_id in wave}
+    running = {}  # Future -> (package ID, group lock)
+    busy = set()  # Group locks of the running jobs
+    results = {}
+    while pending or running:
+        controller.set_waiting(len(pending))
+        for package_id, lookup in list(pending.items()):
+            if len(running) >= controller.limit:
+                break
+            if not lookup.done() or lookup.result() in busy:
+                continue
+            group_lock = lookup.result()
+            del pending[package_id]
+            busy.add(group_lock)
+            running[pool.submit(run, package_id, group_lock)] = (package_id, group_lock)
+        done, _ = wait(list(running) + [lookup for lookup in pending.values() if not lookup.done()],
+                       return_when=FIRST_COMPLETED)
+        for future in done:
+            if future in running:
+                package_id, group_lock = running.pop(future)
+                busy.discard(group_lock)
+                results[package_id] = future.result()
+    return results
+
+# Function to upgrade one package with timeout and retry with exponential backoff, verb names the action in the log
+def run_upgrade_job(package_id, command, timeout, retries, group_lock, log, verb="Updating", on_status=None):
+    start = time.monotonic()
+    # Redraws of parallel jobs share one status line, the prefix tells them apart
+    status_callback = (lambda text: on_status(f"[{package_id}] {text}")) if on_status is not None else None
+    attempts = 0
+    status = "Cancelled"
+    returncode = ""
+    while attempts <= retries and not cancel_event.is_set():
+        if attempts:
+            # Wait before retrying, waking up early when the batch is cancelled
+            if cancel_event.wait(retry_backoff_seconds * 2 ** (attempts - 1)):
+                break
+        attempts += 1
+        with group_lock:
+            if cancel_event.is_set():
+                break
+            log(f"{verb} {package_id} (attempt {attempts})...\n")
+            try:
+                returncode, stderr_clean = stream_command(command, log, status_callback, timeout=timeout,
+                                                          prefix=f"[{package_id}] ")
+            except subprocess.TimeoutExpired:
+                status, returncode = "Timed out", ""
+                continue
+            except OSError as e:
+                # winget missing or not startable, the other jobs of the batch still run
+                log(f"[{package_id}] {e}\n")
+                status, returncode = "Failed", ""
+                continue
+        if stderr_clean:
+            log(f"[{package_id}] {stderr_clean}\n")
+        if returncode == 0:
+            status = "Updated"
+            break
+        status = "Failed"
+    if cancel_event.is_set() and status != "Updated":
+        status = "Cancelled"
+    return [package_id, status, attempts, f"{time.monotonic() - start:.1f}", returncode]
@@ -0,0 +1,50 @@
+"""User options shared by the GUI and headless callers."""
+import json
+import os
+
+# Function to get the per-user directory for the cache and other app data
+def app_data_dir():
+    base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    path = os.path.join(base, 'Windows-Package-Manager')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+class Settings:
+    """Options persisted as JSON in the app data directory, missing keys fall back to the defaults."""
+
+    defaults = {
+        'force': True,              # Pass --force to upgrade and uninstall
+        'accept_eula': True,        # Pass --accept-package-agreements to install and upgrade
+        'concurrency': 3,           # Parallel upgrades in a batch
+        'adaptive_concurrency': True, # Tune the parallel upgrades up to 'concurrency' to load and throughput
+        'order_by_dependencies': True, # Upgrade dependencies in an earlier wave than the packages using them
+        'timeout_minutes': 30,      # Per-package upgrade timeout
+        'retries': 1,               # Retries of a failed upgrade
+        'cache_ttl_minutes': 30,    # Lifetime of the cached package lists
+        'use_local_catalog': False, # Answer Install-window searches from the local catalog
+        'snapshot_dir': '',         # Folder of the inventory snapshots, e.g. a fleet share ('' = app data)
+    }
+
+    def __init__(self, path=None, **values):
+        self.path = path
+        self.__dict__.update(self.defaults)
+        self.__dict__.update(values)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or os.path.join(app_data_dir(), 'settings.json')
+        try:
+            with open(path, encoding='utf-8') as settings_file:
+                values = json.load(settings_file)
+        except (OSError, ValueError):
+            values = {}
+        return cls(path, **{key: value for key, value in values.items() if key in cls.defaults})
+
+    def save(self):
+        if self.path is None:
+            return
+        with open(self.path, 'w', encoding='utf-8') as settings_file:
+            json.dump(self.as_dict(), settings_file, indent=2)
+
+    def as_dict(self):
+        return {key: getattr(self, key) for key in self.defaults}
@@ -0,0 +1,73 @@
+"""Coalesces identical concurrent calls so only one winget process answers them all."""
+import functools
+import threading
+
+class Flight:
+    """One call in progress, the callers that join it wait on done."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.stale = False
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Runs at most one call per key at a time, later callers share its result.
+
+    invalidate() marks calls in progress as stale: later callers start a new call instead of
+    joining, and the callers of a stale call make it once more, so no caller gets data from
+    before the installed packages changed. A second stale result is returned as it is, calls
+    are not repeated for as long as invalidations keep coming in.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def invalidate(self, names=None):
+        """Marks the calls in progress as stale, only those of the named functions if names are given.
+
+        Keys made by coalesced() start with the function name, keys passed to run() directly are
+        only matched when names is None.
+        """
+        with self.lock:
+            for key, flight in self.flights.items():
+                if names is None or (isinstance(key, tuple) and key and key[0] in names):
+                    flight.stale = True
+
+    def run(self, key, function, *args, **kwargs):
+        retried = False
+        while True:
+            with self.lock:
+                flight = self.flights.get(key)
+                leader = flight is None or flight.stale
+                if leader:
+                    flight = self.flights[key] = Flight()
+
+            if leader:
+                try:
+                    flight.result = function(*args, **kwargs)
+                except BaseException as e:
+                    flight.error = e
+                finally:
+                    with self.lock:
+                        if self.flights.get(key) is flight:
+                            del self.flights[key]
+                    flight.done.set()
+            else:
+                flight.done.wait()
+
+            if flight.stale and not retried:
+                retried = True
+                continue  # Started before the packages changed, ask again once
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+    def coalesced(self, function):
+        """Decorator that coalesces calls to function with equal arguments."""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            key = (function.__name__, args, tuple(sorted(kwargs.items())))
+            return self.run(key, function, *args, **kwargs)
+        return wrapper
@@ -0,0 +1,235 @@
+"""Content-hashed snapshots of the installed packages, their diffs and plans to reach a target."""
+import hashlib
+import json
+import os
+import platform
+import re
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+from wpm.commands import build_install_command, build_uninstall_command, build_update_command
+from wpm.settings import app_data_dir
+from wpm.tables import version_sort_key
+
+# Characters kept in the per-machine folder names, so host names are safe on any file share
+machine_name_pattern = re.compile(r'[^A-Za-z0-9._-]+')
+
+# Held while a snapshot and its history line are written, stores are created per refresh
+save_lock = threading.Lock()
+
+# Function to get the folder the snapshots are saved to, a fleet share when snapshot_dir is set
+def snapshot_root(settings):
+    return settings.snapshot_dir or os.path.join(app_data_dir(), 'snapshots')
+
+# Function to get the folder name the snapshots of a machine are stored under
+def machine_name(name=None):
+    return machine_name_pattern.sub('_', name or platform.node() or 'unknown')
+
+# Function to reduce inventory rows to the installed state: [ID, version, name, source], sorted by ID
+def canonical_packages(packages):
+    # The available version depends on the catalog, not on the machine, and is left out
+    rows = {package[1].lower(): [package[1], package[2], package[0], package[4] if len(package) > 4 else '']
+            for package in packages if len(package) >= 3 and package[1]}
+    return [rows[key] for key in sorted(rows)]
+
+# Function to get the content hash of canonical package rows
+def content_hash(rows):
+    data = json.dumps(rows, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(data).hexdigest()[:16]
+
+class Snapshot:
+    """One inventory: rows are [ID, version, name, source] sorted by ID, hash identifies the content."""
+
+    def __init__(self, rows, machine='', snapshot_hash=None):
+        self.rows = rows
+        self.machine = machine
+        self.hash = snapshot_hash or content_hash(rows)
+        self.by_id = {row[0].lower(): row for row in rows}  # winget IDs ignore case
+
+    @classmethod
+    def from_packages(cls, packages, machine=''):
+        return cls(canonical_packages(packages), machine)
+
+    def as_dict(self):
+        return {'hash': self.hash, 'machine': self.machine, 'packages': self.rows}
+
+class SnapshotStore:
+    """Snapshots kept as <root>/<machine>/<hash>.json plus a history.jsonl of when each took effect.
+
+    Identical inventories share one file, and the history only grows when the inventory changed,
+    so a refresh that found nothing new writes nothing. root can be a share that many machines
+    save to. Loaded snapshots are kept in memory by hash, so comparing a fleet reads each
+    distinct inventory once.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.loaded = {}  # hash -> Snapshot
+
+    def machine_dir(self, machine):
+        return os.path.join(self.root, machine_name(machine))
+
+    def save(self, packages, machine=None):
+        """Store the inventory of machine (default: this one), return (snapshot, path, changed)."""
+        machine = machine_name(machine)
+        snapshot = Snapshot.from_packages(packages, machine)
+        directory = self.machine_dir(machine)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, snapshot.hash + '.json')
+        with save_lock:
+            if not os.path.exists(path):
+                # A temp name of its own, the GUI and the CLI may save from separate processes
+                fd, temp_file = tempfile.mkstemp(suffix='.tmp', dir=directory)
+                with open(fd, 'w', encoding='utf-8') as snapshot_file:
+                    json.dump(snapshot.as_dict(), snapshot_file, ensure_ascii=False, separators=(',', ':'))
+                try:
+                    os.replace(temp_file, path)
+                except OSError:
+                    os.remove(temp_file)
+                    if not os.path.exists(path):
+                        raise
+                    # Another process saved the same content first
+            history = self.history(machine)
+            changed = not history or history[-1]['hash'] != snapshot.hash
+            if changed:
+                entry = {'time': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'hash': snapshot.hash,
+                         'packages': len(snapshot.rows)}
+                with open(os.path.join(directory, 'history.jsonl'), 'a', encoding='utf-8') as history_file:
+                    history_file.write(json.dumps(entry) + '\n')
+            self.loaded[snapshot.hash] = snapshot
+        return snapshot, path, changed
+
+    def machines(self):
+        try:
+            return sorted(entry.name for entry in os.scandir(self.root) if entry.is_dir())
+        except OSError:
+            return []
+
+    def history(self, machine):
+        """Return the {'time', 'hash', 'packages'} entries of machine, oldest first."""
+        entries = []
+        try:
+            with open(os.path.join(self.machine_dir(machine), 'history.jsonl'), encoding='utf-8') as history_file:
+                for line in history_file:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue  # Partly written line
+        except OSError:
+            pass
+        return entries
+
+    def latest(self, machine, before=None):
+        """Return the hash in effect on machine before the ISO time before (default: now), or None."""
+        entries = [entry for entry in self.history(machine) if before is None or entry['time'] < before]
+        return entries[-1]['hash'] if entries else None
+
+    def load_file(self, path):
+        with open(path, encoding='utf-8') as snapshot_file:
+            data = json.load(snapshot_file)
+        snapshot = Snapshot(data['packages'], data.get('machine', ''), data.get('hash'))
+        self.loaded[snapshot.hash] = snapshot
+        return snapshot
+
+    def load(self, reference):
+        """Load a snapshot by file path, hash, machine name or machine@ISO-time.
+
+        Raises KeyError when nothing matches.
+        """
+        if os.path.isfile(reference):
+            return self.load_file(reference)
+        machine, _, before = reference.partition('@')
+        machines = self.machines()
+        if machine_name(machine) in machines:
+            snapshot_hash = self.latest(machine, before or None)
+            if snapshot_hash is None:
+                raise KeyError(f"No snapshot of {machine}" + (f" before {before}" if before else ""))
+            machines = [machine_name(machine)]
+        else:
+            snapshot_hash = reference
+        if snapshot_hash in self.loaded:
+            return self.loaded[snapshot_hash]
+        for name in machines:
+            path = os.path.join(self.root, name, snapshot_hash + '.json')
+            if os.path.isfile(path):
+                return self.load_file(path)
+        raise KeyError(f"Unknown snapshot: {reference}")
+
+# Function to save a freshly listed inventory to the configured folder, None when winget listed nothing
+def save_inventory(packages, settings):
+    if not packages:
+        return None  # winget failed, an empty snapshot would show every package as removed
+    return SnapshotStore(snapshot_root(settings)).save(packages)
+
+# Function to compare two snapshots by package ID
+def diff_snapshots(old, new):
+    """Return {'added', 'removed', 'changed'}: rows only in new, rows only in old, and
+    {'id', 'from', 'to'} for packages whose version differs.
+    """
+    if old.hash == new.hash:
+        return {'added': [], 'removed': [], 'changed': []}
+    added = [row for key, row in new.by_id.items() if key not in old.by_id]
+    removed = [row for key, row in old.by_id.items() if key not in new.by_id]
+    changed = [{'id': row[0], 'from': old.by_id[key][1], 'to': row[1]}
+               for key, row in new.by_id.items() if key in old.by_id and old.by_id[key][1] != row[1]]
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+# Function to compare the latest snapshot of every machine in a store with a target snapshot
+def compare_fleet(store, target, before=None):
+    """Machines with identical inventories share one diff. Returns {machine: diff or None}."""
+    diffs = {}  # hash -> diff
+    report = {}
+    for machine in store.machines():
+        snapshot_hash = store.latest(machine, before)
+        if snapshot_hash is None:
+            report[machine] = None
+            continue
+        if snapshot_hash not in diffs:
+            diffs[snapshot_hash] = diff_snapshots(store.load(snapshot_hash), target)
+        report[machine] = dict(diffs[snapshot_hash], hash=snapshot_hash)
+    return report
+
+# Function to check whether version is lower than installed, False when either is not a version number
+def is_downgrade(installed, version):
+    if not (installed[:1].isdigit() and version[:1].isdigit()):
+        return False  # "Unknown" or "< 1.2" as winget shows for some installers
+    return version_sort_key(version) < version_sort_key(installed)
+
+# Function to build the winget commands that bring the current inventory to the target
+def build_plan(current, target, settings, uninstall_extra=False):
+    """Return (steps, unmanaged). Each step is {'action', 'id', 'from', 'to', 'command'}.
+
+    Packages that already match need no step. Target packages without a winget source (apps
+    winget only found in Add/Remove Programs) cannot be installed by ID and are returned in
+    unmanaged instead. Packages missing from the target are uninstalled only with uninstall_extra.
+    """
+    diff = diff_snapshots(current, target)
+    steps = []
+    unmanaged = []
+    for package_id, version, _, source in diff['added']:
+        if not source:
+            unmanaged.append(package_id)
+            continue
+        pinned = version if version[:1].isdigit() else None  # No version to pin for "Unknown"
+        command = build_install_command(package_id, settings, pinned) + ['--exact', '--source', source]
+        steps.append({'action': 'install', 'id': package_id, 'from': None, 'to': version, 'command': command})
+    for change in diff['changed']:
+        package_id, source = change['id'], target.by_id[change['id'].lower()][3]
+        if not source:
+            unmanaged.append(package_id)
+            continue
+        if is_downgrade(change['from'], change['to']):
+            # winget upgrade never goes back, installing the older version over it does
+            command = build_install_command(package_id, settings, change['to']) + ['--exact', '--force']
+            action = 'downgrade'
+        else:
+            command = build_update_command(package_id, settings) + ['--version', change['to'], '--exact']
+            action = 'upgrade'
+        steps.append({'action': action, 'id': package_id, 'from': change['from'], 'to': change['to'],
+                      'command': command})
+    if uninstall_extra:
+        for package_id, version, _, _ in diff['removed']:
+            steps.append({'action': 'uninstall', 'id': package_id, 'from': version, 'to': None,
+                          'command': build_uninstall_command(package_id, settings) + ['--exact']})
+    return steps, unmanaged
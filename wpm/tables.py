@@ -0,0 +1,75 @@
+"""Column definitions, sort keys and the search index behind the package tables."""
+import re
+
+# Define columns for the main table
+columns = ["Name", "ID", "Version", "Available Version", "Source"]
+
+# Define columns for the install table
+columns_install = ["Name", "ID", "Version", "Match", "Source"]
+
+# Columns that hold version numbers and sort numerically
+version_columns = {"Version", "Available Version"}
+
+# Function to build a natural sort key so "10.0" sorts after "9.1"
+def version_sort_key(value):
+    parts = re.split(r'(\d+)', str(value))
+    # Numbers and text never compare directly, numbers sort before text at the same position
+    return [(0, int(part), '') if part.isdigit() else (1, 0, part.casefold()) for part in parts if part]
+
+# Function to build a case-insensitive sort key for text columns
+def text_sort_key(value):
+    return str(value).casefold()
+
+class SortCache:
+    """Row orders per column, computed once per data load and reused for every later click."""
+
+    def __init__(self, rows, columns):
+        self.rows = rows
+        self.columns = columns
+        self.orders = {}
+
+    def order(self, col, reverse=False):
+        """Return the row indices sorted by col, reversing the cached order instead of re-sorting."""
+        if col not in self.orders:
+            col_idx = self.columns.index(col)
+            key = version_sort_key if col in version_columns else text_sort_key
+            keys = [key(row[col_idx]) for row in self.rows]
+            self.orders[col] = sorted(range(len(self.rows)), key=keys.__getitem__)
+        order = self.orders[col]
+        return order[::-1] if reverse else order
+
+class SearchIndex:
+    """Pre-lowercased row texts with a trigram index for substring filtering of the main table."""
+
+    def __init__(self, rows):
+        # Columns are joined with a separator no query can contain, so matches never span columns
+        self.texts = ['\x00'.join(str(value) for value in row).lower() for row in rows]
+        self.trigrams = None
+        self.last_query = ''
+        self.last_result = list(range(len(self.texts)))
+
+    def build_trigrams(self):
+        trigrams = {}
+        for index, text in enumerate(self.texts):
+            for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+                if '\x00' not in gram:
+                    trigrams.setdefault(gram, []).append(index)
+        self.trigrams = trigrams  # Published in one assignment, readers see all or nothing
+
+    def search(self, query):
+        """Return the indices of the rows that have a column containing query, in row order."""
+        query = query.lower()
+        if not query:
+            result = list(range(len(self.texts)))
+        elif self.last_query and self.last_query in query:
+            # The new query extends the previous one, so only the previous matches can still match
+            result = [index for index in self.last_result if query in self.texts[index]]
+        elif len(query) >= 3 and self.trigrams is not None:
+            # Only rows containing the rarest trigram of the query are candidates
+            postings = [self.trigrams.get(query[i:i + 3], ()) for i in range(len(query) - 2)]
+            result = [index for index in min(postings, key=len) if query in self.texts[index]]
+        else:
+            result = [index for index, text in enumerate(self.texts) if query in text]
+        self.last_query = query
+        self.last_result = result
+        return result
@@ -0,0 +1,152 @@
+"""Adaptive limit for parallel winget jobs driven by system load and job throughput."""
+import os
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:  # Optional, /proc or the load average are used instead
+    psutil = None
+
+class LoadSampler:
+    """Reports CPU utilization from 0 to 1 since the previous sample, None when it cannot be measured."""
+
+    def __init__(self):
+        self.previous = None
+        if psutil is not None:
+            psutil.cpu_percent(interval=None)  # The first call only sets the reference point
+
+    def sample(self):
+        if psutil is not None:
+            return psutil.cpu_percent(interval=None) / 100
+        times = self.read_proc_stat()
+        if times is not None:
+            previous, self.previous = self.previous, times
+            if previous is None:
+                return None
+            busy = times[0] - previous[0]
+            total = times[1] - previous[1]
+            return busy / total if total > 0 else None
+        try:
+            return min(1.0, os.getloadavg()[0] / (os.cpu_count() or 1))
+        except (AttributeError, OSError):
+            return None  # Windows without psutil
+
+    @staticmethod
+    def read_proc_stat():
+        # First line: cpu user nice system idle iowait irq softirq steal ...
+        try:
+            with open('/proc/stat', encoding='ascii') as stat_file:
+                values = [int(value) for value in stat_file.readline().split()[1:]]
+        except (OSError, ValueError):
+            return None
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        total = sum(values[:8])
+        return total - idle, total
+
+class ConcurrencyController:
+    """Hill-climbs the number of parallel jobs between 1 and maximum.
+
+    The limit grows while the CPU has headroom and jobs are waiting, and shrinks when the CPU is
+    saturated or when the completion rate at the current limit fell below the rate measured one
+    step lower, i.e. when running more jobs at once made the batch slower. With adaptive off the
+    limit stays at maximum.
+    """
+
+    # CPU utilization above which the limit shrinks and below which it may grow
+    high_load = 0.85
+    low_load = 0.6
+    # A limit has to run this long and finish this many jobs before its rate is compared
+    min_window = 10.0
+    min_jobs = 2
+
+    def __init__(self, maximum, adaptive=True, sampler=None):
+        self.maximum = max(1, maximum)
+        self.adaptive = adaptive
+        self.sampler = sampler or LoadSampler()
+        self.limit = min(self.maximum, 2) if adaptive else self.maximum
+        self.active = 0
+        self.waiting = 0
+        self.rates = {}  # Jobs per second measured at each limit
+        self.completed = 0
+        self.changed_at = time.monotonic()
+        self.condition = threading.Condition()
+
+    def set_maximum(self, maximum, adaptive):
+        """Apply a changed setting, a fixed limit follows the maximum directly."""
+        with self.condition:
+            self.maximum = max(1, maximum)
+            self.adaptive = adaptive
+            self.limit = min(self.limit, self.maximum) if adaptive else self.maximum
+            self.condition.notify_all()
+
+    def acquire(self):
+        with self.condition:
+            self.waiting += 1
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.waiting -= 1
+            self.active += 1
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+        self.job_finished()
+
+    def job_finished(self):
+        """Count a completed job and adjust the limit, for callers that track running jobs themselves."""
+        with self.condition:
+            self.completed += 1
+            self.adjust()
+
+    def set_waiting(self, waiting):
+        with self.condition:
+            self.waiting = waiting
+
+    def adjust(self):
+        # Called with the condition held
+        if not self.adaptive:
+            return
+        now = time.monotonic()
+        elapsed = now - self.changed_at
+        if elapsed < self.min_window or self.completed < self.min_jobs:
+            return
+        rate = self.completed / elapsed
+        self.rates[self.limit] = rate
+        load = self.sampler.sample()
+        limit = self.limit
+        if load is not None and load > self.high_load:
+            limit -= 1
+        elif limit - 1 in self.rates and rate < self.rates[limit - 1] * 0.9:
+            limit -= 1  # More parallel jobs made the batch slower
+        elif self.waiting and (load is None or load < self.low_load) and limit + 1 not in self.rates:
+            limit += 1
+        elif self.waiting and limit + 1 in self.rates and self.rates[limit + 1] > rate * 1.1:
+            limit += 1
+        limit = max(1, min(self.maximum, limit))
+        if limit != self.limit:
+            self.limit = limit
+            self.completed = 0
+            self.changed_at = now
+            self.condition.notify_all()
+
+    def gate(self, group_lock):
+        """Return a lock-like object that holds the conflict group lock and then a job slot."""
+        return JobGate(self, group_lock)
+
+class JobGate:
+    """Context manager for run_upgrade_job: a job waits for its conflict group before taking a slot."""
+
+    def __init__(self, controller, group_lock):
+        self.controller = controller
+        self.group_lock = group_lock
+
+    def __enter__(self):
+        self.group_lock.acquire()
+        self.controller.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.controller.release()
+        self.group_lock.release()
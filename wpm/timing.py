@@ -0,0 +1,139 @@
+"""Per-phase timers for winget invocations with a bounded history and optional cProfile output."""
+import cProfile
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Runs kept per command type
+history_size = 200
+
+# Finished runs by command type, newest last
+history = {}
+history_lock = threading.Lock()
+
+# Directory that receives a .prof file per measured run, None disables profiling
+profile_dir = None
+
+# The run measured on the current thread and the runs collected by capture()
+local = threading.local()
+
+class Run:
+    """Timings of one command: phases are consecutive intervals named by mark()."""
+
+    def __init__(self, kind, label):
+        self.kind = kind
+        self.label = label
+        self.started = time.time()
+        self.start = self.last = time.perf_counter()
+        self.phases = {}
+        self.total = None
+        self.profile = None
+
+    def mark(self, phase):
+        # Time since the previous mark is booked to this phase
+        now = time.perf_counter()
+        self.add(phase, now - self.last)
+        self.last = now
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def as_dict(self):
+        return {'kind': self.kind, 'label': self.label, 'started': round(self.started, 3),
+                'total': None if self.total is None else round(self.total, 4),
+                'phases': {phase: round(seconds, 4) for phase, seconds in self.phases.items()},
+                'profile': self.profile}
+
+# Function to get the command type a winget command line is grouped under
+def command_type(command):
+    kind = command[1] if len(command) > 1 else command[0]
+    return 'versions' if kind == 'show' and '--versions' in command else kind
+
+# Function to get the q-th percentile (0-100) of a list of numbers, nearest-rank method
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    # The rank is the smallest one that covers q percent of the values, 1 to n
+    rank = min(len(ordered), max(1, math.ceil(q * len(ordered) / 100)))
+    return ordered[rank - 1]
+
+# Function to book a phase on the run measured on this thread, if any
+def mark(phase):
+    run = getattr(local, 'run', None)
+    if run is not None:
+        run.mark(phase)
+
+# Function to measure a block as one run, nested runs are recorded separately
+@contextmanager
+def measure(kind, label=''):
+    run = Run(kind, label)
+    outer = getattr(local, 'run', None)
+    local.run = run
+
+    profiler = None
+    if profile_dir is not None and outer is None:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            profiler = None  # Another thread is already profiling
+    try:
+        yield run
+    finally:
+        run.total = time.perf_counter() - run.start
+        local.run = outer
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(profile_dir, exist_ok=True)
+            run.profile = os.path.join(profile_dir, f"{kind}-{int(run.started * 1000)}.prof")
+            profiler.dump_stats(run.profile)
+        with history_lock:
+            history.setdefault(kind, deque(maxlen=history_size)).append(run)
+        captured = getattr(local, 'captured', None)
+        if captured is not None and outer is None:
+            captured.append(run)
+
+# Function to collect the top-level runs finished on this thread inside the block
+@contextmanager
+def capture():
+    outer = getattr(local, 'captured', None)
+    local.captured = runs = []
+    try:
+        yield runs
+    finally:
+        local.captured = outer
+
+# Function to summarize the history as p50/p95 of the total and each phase per command type
+def stats():
+    with history_lock:
+        runs_by_kind = {kind: list(runs) for kind, runs in history.items()}
+    summary = {}
+    for kind, runs in sorted(runs_by_kind.items()):
+        totals = [run.total for run in runs]
+        phases = {}
+        for run in runs:
+            for phase, seconds in run.phases.items():
+                phases.setdefault(phase, []).append(seconds)
+        slowest = sorted(runs, key=lambda run: run.total, reverse=True)[:5]
+        summary[kind] = {
+            'runs': len(runs),
+            'p50': round(percentile(totals, 50), 4),
+            'p95': round(percentile(totals, 95), 4),
+            'phases': {phase: {'p50': round(percentile(values, 50), 4), 'p95': round(percentile(values, 95), 4)}
+                       for phase, values in phases.items()},
+            'slowest': [{'label': run.label, 'total': round(run.total, 3)} for run in slowest],
+        }
+    return summary
+
+# Function to write the summary and the full run history as JSON
+def export(path):
+    with history_lock:
+        runs = [run.as_dict() for kind_runs in history.values() for run in kind_runs]
+    with open(path, 'w', encoding='utf-8') as export_file:
+        json.dump({'stats': stats(), 'runs': sorted(runs, key=lambda run: run['started'])},
+                  export_file, indent=2)